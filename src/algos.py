@@ -1,10 +1,62 @@
 #!/usr/bin/env python3
 
-from pprint import pprint
-import networkx as nx
+from multiprocessing import get_all_start_methods, get_context
+from multiprocessing.connection import wait
+import os
 import numpy as np
-from utils import d, w, print_wd
-from structures import MyTuple
+from circuit import Circuit, RetimedView, as_circuit, gather
+from constraints import PeriodSweep, PrunedConstraints, bellman_ford, circuit_constraints
+from paths import all_pairs_wd
+from profiling import count, profiling, timed
+from utils import print_wd
+
+
+def _as_output(g, c, a):
+    """
+    Express a per-vertex result in the same form as the input of a public algorithm.
+
+    :param g: The graph originally passed to the algorithm.
+    :param c: Its compact representation.
+    :param a: An array indexed like ``c``.
+    :return: ``a`` itself if ``g`` is a :class:`circuit.Circuit` (or a view of one), a ``dict`` keyed by the vertices of
+        ``g`` otherwise.
+    """
+    if isinstance(g, (Circuit, RetimedView)):
+        return a
+    return c.mapping(a)
+
+
+@timed('cp')
+def _cp(c, weight=None):
+    """
+    Compute :math:`\Delta(v)` for every vertex of a compact circuit.
+
+    The topological sort of :math:`G_0` is performed level by level (Kahn's algorithm), so that each level is processed
+    with a constant number of vectorized operations over the CSR edge arrays.
+
+    :param c: A :class:`circuit.Circuit`.
+    :param weight: Optional register counts to be used instead of ``c.weight``.
+    :return: The ``int64`` array of the :math:`\Delta(v)`.
+    """
+    weight = c.weight if weight is None else weight
+    n = c.number_of_nodes()
+    zero = weight == 0
+    delta = c.delay.astype(np.int64)
+    in_degree = np.bincount(c.dst[zero], minlength=n)
+    frontier = np.flatnonzero(in_degree == 0)
+    visited = 0
+    while frontier.size > 0:
+        visited += frontier.size
+        edges = gather(c.indptr, frontier)
+        edges = edges[zero[edges]]
+        heads = c.dst[edges]
+        np.maximum.at(delta, heads, delta[c.src[edges]] + c.delay[heads])
+        np.subtract.at(in_degree, heads, 1)
+        heads = np.unique(heads)
+        frontier = heads[in_degree[heads] == 0]
+    if visited < n:
+        raise ValueError('The sub-graph of the edges with zero registers is not acyclic')
+    return delta
 
 
 def cp(g, return_delta=False):
@@ -17,40 +69,121 @@ def cp(g, return_delta=False):
     | Space complexity | :math:`O(V + E)` |
     +------------------+------------------+
 
-    :param g: A NetworkX (Multi)DiGraph representing a synchronous circuit.
+    :param g: A NetworkX (Multi)DiGraph, a :class:`circuit.Circuit` or a :class:`circuit.RetimedView` representing a
+        synchronous circuit.
     :param return_delta: Whether to return the computed :math:`\Delta` or not (used in other algorithms).
     :return: The clock period of the given circuit.
     """
+    c = as_circuit(g)
 
     # STEP 1
     # Let G0 be the sub-graph of G that contains precisely those edges e with register count w(e) = 0.
-    zero_edges = list(filter(lambda e: w(g, e) == 0, g.edges))
-    g0 = nx.MultiDiGraph()
-    g0.add_nodes_from(g.nodes(data=True))
-    g0.add_edges_from(zero_edges)
-    delta = dict()
-
     # STEP 2
     # By condition W2, G0 is acyclic. Perform a topological sort on G0, totally ordering its vertices so that if there
     # is an edge from vertex u to vertex v in G0, then u precedes v in the total order. Go though the vertices in the
     # order defined by the topological sort.
-    for v in nx.topological_sort(g0):       # O(V + E)
-        # STEP 3
-        # On visiting each vertex v, compute the quantity delta(v) as follows:
-        #   a. If there is no incoming edge to v, set delta(v) <- d(v).
-        #   b. Otherwise, set delta(v) <- d(v) + max { delta(u) : u -e-> v and w(e) = 0 }.
-        delta[v] = d(g0, v)
-        if g0.in_degree(v) > 0:
-            delta[v] += max(list(map(lambda e: delta[e[0]], g0.in_edges(v))))
+    # STEP 3
+    # On visiting each vertex v, compute the quantity delta(v) as follows:
+    #   a. If there is no incoming edge to v, set delta(v) <- d(v).
+    #   b. Otherwise, set delta(v) <- d(v) + max { delta(u) : u -e-> v and w(e) = 0 }.
+    delta = _cp(c)      # O(V + E)
 
     # STEP 4
     # The clock period is max { delta(v) }.
+    clock = int(delta.max())
     if return_delta:
-        return max(delta.values()), delta
-    return max(delta.values())
+        return clock, _as_output(g, c, delta)
+    return clock
+
+
+class IncrementalCP:
+    """
+    Incremental version of *Algorithm CP*, meant for circuits whose retiming changes a few vertices at a time (as in
+    *Algorithm FEAS*).
 
+    The retimed register counts, the sub-graph :math:`G_0` (as a mask over the edges) and :math:`\Delta` are kept
+    between calls. When some vertices are retimed, only the edges entering or leaving :math:`G_0` are considered, and
+    :math:`\Delta` is propagated, in a topological order of :math:`G_0` restricted to it, only through the downstream
+    cone of their heads. The cost of an update is therefore proportional to the size of that cone.
+    """
 
-def wd(g, show=False):
+    def __init__(self, c, weight=None):
+        """
+        :param c: A :class:`circuit.Circuit`.
+        :param weight: The initial (retimed) register counts, ``c.weight`` by default. They are copied.
+        """
+        self.circuit = c
+        self.weight = np.array(c.weight if weight is None else weight, dtype=np.int64)
+        self.zero = self.weight == 0
+        self.delta = _cp(c, self.weight)
+
+    def clock(self):
+        """
+        :return: The clock period of the retimed circuit.
+        """
+        return int(self.delta.max())
+
+    def increment(self, vertices):
+        """
+        Set :math:`r(v) \leftarrow r(v) + 1` for each of the given vertices, and update :math:`\Delta`.
+
+        :param vertices: The indices of the vertices, without repetitions.
+        :return: The updated :math:`\Delta`.
+        """
+        c = self.circuit
+        in_edges = c.in_order[gather(c.in_indptr, vertices)]
+        out_edges = gather(c.indptr, vertices)
+        self.weight[in_edges] += 1
+        self.weight[out_edges] -= 1
+        edges = np.concatenate((in_edges, out_edges))
+        zero = self.weight[edges] == 0
+        changed = edges[zero != self.zero[edges]]
+        self.zero[edges] = zero
+        return self._propagate(np.unique(c.dst[changed]))
+
+    def _propagate(self, seeds):
+        c = self.circuit
+        n = c.number_of_nodes()
+
+        # The downstream cone of the seeds in G0.
+        cone = np.zeros(n, dtype=bool)
+        cone[seeds] = True
+        frontier = seeds
+        while frontier.size > 0:
+            edges = gather(c.indptr, frontier)
+            heads = c.dst[edges[self.zero[edges]]]
+            frontier = np.unique(heads[~cone[heads]])
+            cone[frontier] = True
+        vertices = np.flatnonzero(cone)
+
+        # Restart each vertex of the cone from the edges of G0 coming from outside of it, whose Delta is up to date.
+        edges = c.in_order[gather(c.in_indptr, vertices)]
+        edges = edges[self.zero[edges]]
+        outer = edges[~cone[c.src[edges]]]
+        inner = edges[cone[c.src[edges]]]
+        self.delta[vertices] = c.delay[vertices]
+        heads = c.dst[outer]
+        np.maximum.at(self.delta, heads, self.delta[c.src[outer]] + c.delay[heads])
+
+        # Kahn's algorithm on the edges of G0 internal to the cone.
+        in_degree = np.bincount(c.dst[inner], minlength=n)
+        frontier = vertices[in_degree[vertices] == 0]
+        visited = 0
+        while frontier.size > 0:
+            visited += frontier.size
+            edges = gather(c.indptr, frontier)
+            edges = edges[self.zero[edges]]
+            heads = c.dst[edges]
+            np.maximum.at(self.delta, heads, self.delta[c.src[edges]] + c.delay[heads])
+            np.subtract.at(in_degree, heads, 1)
+            heads = np.unique(heads)
+            frontier = heads[in_degree[heads] == 0]
+        if visited < vertices.size:
+            raise ValueError('The sub-graph of the edges with zero registers is not acyclic')
+        return self.delta
+
+
+def wd(g, show=False, method='floyd-warshall', cache=None):
     """
     Given a synchronous circuit :math:`G`, this algorithm computes :math:`W(u, v)` and :math:`D(u, v)` for all
     :math:`u,v \in V` such that :math:`u` is connected to :math:`v` in :math:`G`.
@@ -61,67 +194,89 @@ def wd(g, show=False):
     | Space complexity | :math:`O(V^2)` |
     +------------------+----------------+
 
-    :param g: A NetworkX (Multi)DiGraph representing a synchronous circuit.
+    :param g: A NetworkX (Multi)DiGraph or a :class:`circuit.Circuit` representing a synchronous circuit.
     :param show: Print the matrices.
+    :param method: The all-pairs shortest-paths engine, either ``'floyd-warshall'`` or ``'johnson'``
+        (see :func:`paths.all_pairs_wd`).
+    :param cache: An optional :class:`cache.WDCache` consulted before computing the matrices.
     :return: Matrices W and D in the form ``dict<(u,v), int>``.
     """
+    c = as_circuit(g)
 
-    # STEP 1
-    # Weight each edge (u,?) in E with the ordered pair (w(e), -d(u)).
-    g = g.copy()
-    for e in g.edges:
-        g.edges[e]['weight'] = MyTuple((w(g, e), -d(g, e[0])))
+    # The matrices are computed by one of the engines in :mod:`paths`, which follow the three steps of the algorithm
+    # on NumPy arrays.
+    W, D = _label_wd(c, *_all_pairs_wd(c, method, cache))
+    if show:
+        _show_wd(W, D)
+    return W, D
 
-    # STEP 2
-    # Using the weighting from Step 1, compute the weight of the shortest path joining each connected pair of vertices
-    # by solving an all-pairs shortest-paths algorithm -- Floyd-Warshall.
-    # In the all-pairs algorithm, add two weights by performing component-wise addition, and compare weights using
-    # lexicographic ordering.
-    sp = nx.floyd_warshall(g)   # O(V^2)
-    for u in sp:
-        for v in sp[u]:
-            if sp[u][v] == 0:
-                sp[u][v] = MyTuple((0, 0))
 
-    # STEP 3
-    # For each shortest path weight (x, y) between two vertices u and v, set W(u, v) <- x and D(u, v) <- d(v) - y.
-    W = {(u, v): sp[u][v][0] for u in g.nodes for v in g.nodes if sp[u][v] != np.inf}
-    D = {(u, v): d(g, v) - sp[u][v][1] for u in g.nodes for v in g.nodes if sp[u][v] != np.inf}
-    if show:
-        print('Matrix W')
-        print_wd(W)
-        print('Matrix D')
-        print_wd(D)
+def _all_pairs_wd(c, method, cache=None):
+    if cache is not None:
+        return cache.all_pairs_wd(c, method)
+    return all_pairs_wd(c, method)
+
+
+def _label_wd(c, W, D, reach):
+    """
+    Convert the dense matrices W and D into dictionaries keyed by the original vertex identifiers.
+    """
+    u, v = np.nonzero(reach)
+    pairs = [(c.nodes[i], c.nodes[j]) for i, j in zip(u.tolist(), v.tolist())]
+    W = dict(zip(pairs, W[u, v].tolist()))
+    D = dict(zip(pairs, D[u, v].tolist()))
     return W, D
 
 
-def retime(g, r):
+def _show_wd(W, D):
+    print('Matrix W')
+    print_wd(W)
+    print('Matrix D')
+    print_wd(D)
+
+
+@timed('retime')
+def retime(g, r, view=False):
     """
     Compute the retimed graph.
 
-    :param g: A NetworkX (Multi)DiGraph representing a synchronous circuit.
+    :param g: A NetworkX (Multi)DiGraph, a :class:`circuit.Circuit` or a :class:`circuit.RetimedView` representing a
+        synchronous circuit.
     :param r: The retiming function :math:`r: V \mapsto Z` to be applied.
+    :param view: Whether to return a :class:`circuit.RetimedView` of ``g`` instead of a copy of the graph, which is
+        always the case when ``g`` is a view itself.
     :return: The retimed graph.
     """
+    if isinstance(g, RetimedView):
+        return g.retime(r)
+    if view:
+        return RetimedView(as_circuit(g), r)
+    count('graph_copies')
+    if isinstance(g, Circuit):
+        r = g.vector(r)
+        return g.with_weight(g.weight + r[g.dst] - r[g.src])
     gr = g.copy()
     for e in gr.edges:
         gr.edges[e]['weight'] = gr.edges[e]['weight'] + r[e[1]] - r[e[0]]
     return gr
 
 
-def __binary_search(arr, f, g):
+def __binary_search(arr, f, g, warm_start=False):
     """
     Perform the binary search in order to find the minimum feasible value of ``c`` inside ``arr``.
 
     :param arr: The array on which to perform the binary search.
     :param f: Function to be applied to ``g`` and ``arr[mid]`` (``check_th7`` or ``feas``).
-    :param g: A NetworkX (Multi)DiGraph representing a synchronous circuit.
+    :param g: A NetworkX (Multi)DiGraph or a :class:`circuit.Circuit` representing a synchronous circuit.
+    :param warm_start: Whether to pass to ``f``, as a third argument, the result of the last feasible probe. All the
+        following probes test smaller values of ``c``.
     :return: The minimum clock period and the corresponding retiming function.
     """
     def bs_rec(low, high, prev_mid=None, prev_x=None):
         if high >= low:
             mid = (high + low) // 2
-            x = f(g, arr[mid])
+            count('probes')
+            x = f(g, arr[mid], prev_x) if warm_start else f(g, arr[mid])
             if x is None:
                 return bs_rec(mid+1, high, prev_mid, prev_x)
             else:
@@ -131,7 +286,262 @@ def __binary_search(arr, f, g):
     return bs_rec(0, len(arr)-1)
 
 
-def opt1(g, show_wd=False):
+def _probe_worker(conn, f, g):
+    """
+    Probe the clock periods received from the search (run in a worker process), sending back, for each one, the result
+    of ``f`` and the profiling counters it increased, which would be lost in this process otherwise.
+    """
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            request = None
+        if request is None:
+            return
+        period, prev_x = request
+        with profiling() as p:
+            x = f(g, period, prev_x) if prev_x is not None else f(g, period)
+        conn.send((x, p.counters))
+
+
+class _ProbePool:
+    """
+    Worker processes forked once for a whole k-ary search, which share ``g`` and whatever ``f`` refers to (e.g.
+    matrices :math:`W` and :math:`D`) with the searching process instead of receiving a copy, and only receive the
+    periods to be probed. A running probe cannot be interrupted otherwise, so cancelling it terminates its worker, which
+    is replaced by a fresh fork when the next probe needs it.
+    """
+
+    def __init__(self, f, g, k):
+        self.context = get_context('fork')
+        self.f, self.g = f, g
+        self.workers = {}
+        self.idle = [self._spawn() for _ in range(k)]
+
+    def _spawn(self):
+        conn, child = self.context.Pipe()
+        process = self.context.Process(target=_probe_worker, args=(child, self.f, self.g), daemon=True)
+        process.start()
+        child.close()
+        self.workers[conn] = process
+        return conn
+
+    def submit(self, period, prev_x):
+        """
+        :return: The connection to the worker probing ``period``, which becomes readable once it is done.
+        """
+        conn = self.idle.pop() if self.idle else self._spawn()
+        conn.send((period, prev_x))
+        return conn
+
+    def result(self, conn, period):
+        """
+        Collect the result of a probe, adding its counters to the active profile, and make the worker idle again.
+        """
+        try:
+            x, counters = conn.recv()
+        except EOFError:
+            raise RuntimeError(f'The probe of c = {period} failed (exit code {self.workers[conn].exitcode})') from None
+        for name, n in counters.items():
+            count(name, n)
+        self.idle.append(conn)
+        return x
+
+    def cancel(self, conn):
+        process = self.workers.pop(conn)
+        process.terminate()
+        process.join()
+        conn.close()
+
+    def close(self):
+        # The idle workers are told to stop (the later forks hold copies of their connections, so closing them would
+        # not be enough), while any other one is still running a probe.
+        for conn in list(self.workers):
+            if conn in self.idle:
+                conn.send(None)
+                conn.close()
+                self.workers.pop(conn).join()
+            else:
+                self.cancel(conn)
+        self.idle.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _kary_round(pool, arr, probes, infeasible, feasible, prev_x):
+    """
+    Run one round of the k-ary search, cancelling the probes that cannot move the interval any more: as soon as a probe
+    is found feasible, those of larger values, and as soon as one is found infeasible, those of smaller values.
+
+    :param pool: The :class:`_ProbePool`.
+    :param arr: The array on which the search is performed.
+    :param probes: The indices of the values of ``c`` to be probed.
+    :param infeasible: The largest index known to be infeasible.
+    :param feasible: The smallest index known to be feasible.
+    :param prev_x: The retiming passed to the probes as a warm start, if any.
+    :return: The new ``infeasible`` and ``feasible`` indices, and the result of the probe of the latter (``None`` if no
+        probe of this round was found feasible).
+    """
+    running = {}
+    for i in probes:
+        count('probes')
+        running[pool.submit(arr[i], prev_x)] = i
+    best_x = None
+    try:
+        while running:
+            for conn in wait(list(running)):
+                if conn not in running:
+                    continue
+                i = running.pop(conn)
+                x = pool.result(conn, arr[i])
+                if x is None:
+                    infeasible = max(infeasible, i)
+                elif i < feasible:
+                    feasible, best_x = i, x
+                for other in [c for c, j in running.items() if j < infeasible or j > feasible]:
+                    pool.cancel(other)
+                    del running[other]
+                    count('cancelled_probes')
+    finally:
+        for conn in running:
+            pool.cancel(conn)
+    return infeasible, feasible, best_x
+
+
+def __kary_search(arr, f, g, processes=None, warm_start=False):
+    """
+    Perform a parallel k-ary search in order to find the minimum feasible value of ``c`` inside ``arr``.
+
+    Each round probes :math:`k` values of ``c`` evenly spread over the current interval, on a pool of :math:`k` forked
+    worker processes kept for the whole search (see :class:`_ProbePool`). The probes that cannot move the interval any
+    more are cancelled (see :func:`_kary_round`), and the interval then shrinks to the one between the largest
+    infeasible and the smallest feasible probe, so the number of rounds is :math:`O(\log_{k+1} |arr|)` instead of
+    :math:`O(\log_2 |arr|)`.
+
+    :param arr: The array on which to perform the search.
+    :param f: Function to be applied to ``g`` and ``arr[i]`` (``check_th7`` or ``feas``).
+    :param g: A NetworkX (Multi)DiGraph or a :class:`circuit.Circuit` representing a synchronous circuit.
+    :param processes: The number :math:`k` of probes per round (``None`` for one per core).
+    :param warm_start: Whether to pass to ``f``, as a third argument, the result of the smallest feasible probe so far.
+        All the following probes test smaller values of ``c``.
+    :return: The minimum clock period and the corresponding retiming function.
+    """
+    if 'fork' not in get_all_start_methods():
+        return __binary_search(arr, f, g, warm_start)
+    k = processes or os.cpu_count()
+    low, high = 0, len(arr) - 1
+    best, best_x = None, None
+    with _ProbePool(f, g, k) as pool:
+        while low <= high:
+            probes = np.unique(np.linspace(low, high, min(k, high - low + 1) + 2).round().astype(int)[1:-1])
+            if probes.size == 0:
+                probes = np.array([low])
+            infeasible, feasible, x = _kary_round(pool, arr, probes.tolist(), low - 1, high + 1,
+                                                  best_x if warm_start else None)
+            if x is not None:
+                best, best_x = feasible, x
+            low, high = infeasible + 1, feasible - 1
+    return arr[best], best_x
+
+
+def _period_sweep(c, constraints, D_range):
+    """
+    Set up a :class:`constraints.PeriodSweep` at the largest candidate clock period, for which the zero retiming is a
+    solution.
+
+    :param c: A :class:`circuit.Circuit`.
+    :param constraints: The :class:`constraints.PrunedConstraints` of the candidate periods.
+    :param D_range: The candidate clock periods, sorted, the largest one being the clock period of ``c``.
+    :return: The sweep.
+    """
+    sweep = PeriodSweep(constraints, *circuit_constraints(c))
+    sweep.advance(D_range[-1])
+    return sweep
+
+
+def _candidate_periods(c, W, D, reach):
+    """
+    Sort the elements in the range of :math:`D` that may be the minimum clock period, i.e. the ones between the largest
+    delay and the clock period of the circuit, and prune the constraints of Theorem 7 for them.
+
+    :param c: A :class:`circuit.Circuit`.
+    :param W: Matrix :math:`W`.
+    :param D: Matrix :math:`D`.
+    :param reach: The reachability mask.
+    :return: The candidate periods and their :class:`constraints.PrunedConstraints`.
+    """
+    clock = _cp(c).max(initial=0)
+    constraints = PrunedConstraints(W, D, reach, c.delay, high=clock)
+    D_range = np.unique(D[reach])
+    return D_range[(D_range >= constraints.low) & (D_range <= clock)], constraints
+
+
+@timed('sweep')
+def _sweep_search(c, constraints, D_range):
+    """
+    Perform the binary search for the minimum feasible clock period with a single :class:`constraints.PeriodSweep`:
+    every probe only inserts the constraints between the smallest feasible period found so far and the probed one, and
+    relaxes them from the retiming found for the former.
+
+    :param c: A :class:`circuit.Circuit`.
+    :param constraints: The :class:`constraints.PrunedConstraints` of the candidate periods.
+    :param D_range: The candidate clock periods, sorted, the largest one being the clock period of ``c``.
+    :return: The minimum clock period and the corresponding retiming function.
+    """
+    sweep = _period_sweep(c, constraints, D_range)
+    low, high = 0, len(D_range) - 1
+    while low < high:
+        mid = (low + high) // 2
+        count('probes')
+        if sweep.advance(D_range[mid]) is None:
+            low = mid + 1
+        else:
+            high = mid
+    return D_range[high], sweep.x
+
+
+def feasibility_frontier(g, wd_method='floyd-warshall', matrices=None, cache=None):
+    """
+    Find all the clock periods achievable by retiming a synchronous circuit :math:`G`, together with a retiming
+    achieving each one.
+
+    The candidate periods, i.e. the elements in the range of :math:`D`, are checked from the clock period of :math:`G`
+    downward by a single incremental solver of the constraints of Theorem 7 (see :class:`constraints.PeriodSweep`), so
+    that checking a period only costs the insertion of its new constraints and the relaxations they cause, rather than
+    building all of them and running Bellman-Ford from scratch.
+
+    +------------------+---------------------------------------+
+    | Time complexity  | :math:`O(V^3)` plus the relaxations   |
+    +------------------+---------------------------------------+
+    | Space complexity | :math:`O(V^2)` plus the retimings     |
+    +------------------+---------------------------------------+
+
+    :param g: A NetworkX (Multi)DiGraph or a :class:`circuit.Circuit` representing a synchronous circuit.
+    :param wd_method: The engine used by *Algorithm WD* (see :func:`paths.all_pairs_wd`).
+    :param matrices: Precomputed ``W``, ``D`` and reachability mask, which replace *Algorithm WD*.
+    :param cache: An optional :class:`cache.WDCache` consulted before computing W and D.
+    :return: A ``dict`` mapping the feasible clock periods, in decreasing order, to the retiming functions, the last
+        one being the minimum clock period.
+    """
+    c = as_circuit(g)
+    W, D, reach = _all_pairs_wd(c, wd_method, cache) if matrices is None else matrices
+    D_range, constraints = _candidate_periods(c, W, D, reach)
+    sweep = _period_sweep(c, constraints, D_range)
+    frontier = {}
+    for period in D_range[::-1].tolist():
+        # The feasible periods are contiguous, so the first infeasible one ends the frontier.
+        if period != sweep.period and sweep.advance(period) is None:
+            break
+        frontier[period] = _as_output(g, c, sweep.x.copy())
+    return frontier
+
+
+def opt1(g, show_wd=False, wd_method='floyd-warshall', return_retiming=False, matrices=None, cache=None,
+         search_processes=1, sweep=False, view=False):
     """
     Given a synchronous circuit :math:`G`, this algorithm determines a retiming :math:`r` such that the clock period of
     :math:`G_r` is as small as possible.
@@ -142,95 +552,142 @@ def opt1(g, show_wd=False):
     | Space complexity | :math:`O(V^2)`        |
     +------------------+-----------------------+
 
-    :param g: A NetworkX (Multi)DiGraph representing a synchronous circuit.
+    :param g: A NetworkX (Multi)DiGraph or a :class:`circuit.Circuit` representing a synchronous circuit.
     :param show_wd: Print matrices W and D.
+    :param wd_method: The engine used by *Algorithm WD* (see :func:`paths.all_pairs_wd`).
+    :param return_retiming: Whether to return the retiming function as well.
+    :param matrices: Precomputed ``W``, ``D`` and reachability mask (e.g. memory-mapped by :func:`storage.load_binary`),
+        which replace Step 1.
+    :param cache: An optional :class:`cache.WDCache` consulted before computing W and D.
+    :param search_processes: The number of candidate clock periods probed in parallel by each round of the search
+        (``1`` for the sequential binary search, ``None`` for one per core).
+    :param sweep: Whether to probe the candidate clock periods with a single incremental solver of the constraints
+        (see :class:`constraints.PeriodSweep`) instead of building them and running Bellman-Ford from scratch.
+    :param view: Whether to return the retimed graph as a :class:`circuit.RetimedView` of the circuit rather than as a
+        copy of ``g``.
     :return: The retimed graph having the smallest possible clock period.
     """
+    c = as_circuit(g)
 
     # STEP 1
     # Compute W and D using Algorithm WD.
-    W, D = wd(g, show=show_wd)
+    W, D, reach = _all_pairs_wd(c, wd_method, cache) if matrices is None else matrices
+    if show_wd:
+        _show_wd(*_label_wd(c, W, D, reach))
 
     # STEP 2
-    # Sort the elements in the range of D.
-    D_range = np.unique(list(D.values()))
-    D_range.sort()
-
-    def check_th7(g, c):        # O(V^3)
-        bfg = nx.MultiDiGraph()
-        bfg.add_weighted_edges_from([(e[1], e[0], w(g, e)) for e in g.edges])
-        bfg.add_weighted_edges_from([(v, u, W[u, v]-1)
-                                     for u in g.nodes for v in g.nodes
-                                     if (u, v) in W and (u, v) in D and
-                                     D[u, v] > c and not (D[u, v] - d(g, v) > c or D[u, v] - d(g, u) > c)])
-        root = 'root'
-        bfg.add_weighted_edges_from([(root, n, 0) for n in bfg.nodes])
-        try:
-            return nx.single_source_bellman_ford_path_length(bfg, root)
-        except nx.exception.NetworkXUnbounded:
-            return None
+    # Sort the elements in the range of D, keeping the ones between the largest delay and the clock period of G, and
+    # prune the constraints of Theorem 7 once for all of them.
+    D_range, constraints = _candidate_periods(c, W, D, reach)
+    tails, heads, weights = circuit_constraints(c)
+
+    def check_th7(c, period):        # O(V^3)
+        th7 = constraints.at(period)
+        return bellman_ford(c.number_of_nodes(),
+                            np.concatenate((tails, th7[0])),
+                            np.concatenate((heads, th7[1])),
+                            np.concatenate((weights, th7[2])))
 
     # STEP 3
     # Binary search among the elements D(u, v) for the minimum achievable clock period. To test whether each potential
     # clock period c is feasible, apply the Bellman-Ford algorithm to determine whether the condition in Theorem 7
     # can be satisfied.
-    clock, r = __binary_search(D_range, check_th7, g)
+    if sweep:
+        clock, r = _sweep_search(c, constraints, D_range)
+    elif search_processes == 1:
+        clock, r = __binary_search(D_range, check_th7, c)
+    else:
+        clock, r = __kary_search(D_range, check_th7, c, search_processes)
 
     # STEP 4
     # For the minimum achievable clock period found in Step 3, use the values for the r(v) found by the Bellman-Ford
     # algorithm as the optimal retiming.
-    return retime(g, r)
+    r = _as_output(g, c, r)
+    gr = RetimedView(c, r) if view else retime(g, r)
+    if return_retiming:
+        return gr, r
+    return gr
 
 
-def feas(g, c):
+@timed('feas')
+def _feas(c, period, r=None):
     """
-    Given a synchronous circuit :math:`G` and a desired clock period :math:`c`, this algorithm produces a retiming
-    :math:`r` of :math:`G` such that :math:`G_r` is a synchronous circuit with clock period not greater than :math:`c`,
-    if such retiming exists.
+    Run *Algorithm FEAS* on a compact circuit, updating the retimed register counts in place on the edge arrays.
 
-    +------------------+------------------+
-    | Time complexity  | :math:`O(VE)`    |
-    +------------------+------------------+
-    | Space complexity | :math:`O(V + E)` |
-    +------------------+------------------+
+    A warm start ``r`` must not exceed, vertex by vertex, the retiming that FEAS would find starting from zero, which
+    is the case for the result of FEAS on the same circuit with a larger clock period: the retimings found by FEAS only
+    grow as the period decreases.
 
-    :param g: A NetworkX (Multi)DiGraph representing a synchronous circuit.
-    :param c: The desired clock period.
-    :return: The retiming function or ``None`` if ``c`` is not feasible.
+    :param c: A :class:`circuit.Circuit`.
+    :param period: The desired clock period.
+    :param r: The retiming to start from (zero by default). It is not modified.
+    :return: The retiming as an ``int64`` array, or ``None`` if ``period`` is not feasible.
     """
 
     # STEP 1
     # For each vertex v, set r(v) <- 0.
-    r = {v: 0 for v in g.nodes}
+    if r is None:
+        r = np.zeros(c.number_of_nodes(), dtype=np.int64)
+        timing = IncrementalCP(c)
+    else:
+        r = np.array(r, dtype=np.int64)
+        timing = IncrementalCP(c, c.weight + r[c.dst] - r[c.src])
 
     # STEP 2
     # Repeat |V| - 1 times.
-    gr = None
-    for _ in range(g.number_of_nodes() - 1):
+    for _ in range(c.number_of_nodes() - 1):
+        count('feas_iterations')
         # STEP 2.1
-        # Compute graph Gr with the existing values of r.
-        gr = retime(g, r)
+        # Gr is kept up to date in place by Step 2.3, so it never needs to be rebuilt.
 
         # STEP 2.2
-        # Run Algorithm CP on the graph Gr to determine delta(v) for each vertex v.
-        _, delta = cp(gr, return_delta=True)
+        # Algorithm CP has been run on the graph Gr to determine delta(v) for each vertex v, incrementally with
+        # respect to the previous iteration.
+        delta = timing.delta
 
         # STEP 2.3
-        # For each v such that delta(v) > c, set r(v) <- r(v) + 1
-        for v in delta.keys():
-            if delta[v] > c:
-                r[v] += 1
+        # For each v such that delta(v) > c, set r(v) <- r(v) + 1. If there is no such v, Gr has already a clock period
+        # not greater than c.
+        late = np.flatnonzero(delta > period)
+        if late.size == 0:
+            return r
+        r[late] += 1
+        timing.increment(late)
 
     # STEP 3
     # Run Algorithm CP on the circuit Gr. If we have that cp(gr) > c, then no feasible retiming exists.
     # Otherwise, r is the desired retiming.
-    clock = cp(gr)
-    if clock > c:
+    if timing.clock() > period:
         return None
     return r
 
 
-def opt2(g, show_wd=False):
+def feas(g, c, r=None):
+    """
+    Given a synchronous circuit :math:`G` and a desired clock period :math:`c`, this algorithm produces a retiming
+    :math:`r` of :math:`G` such that :math:`G_r` is a synchronous circuit with clock period not greater than :math:`c`,
+    if such retiming exists.
+
+    +------------------+------------------+
+    | Time complexity  | :math:`O(VE)`    |
+    +------------------+------------------+
+    | Space complexity | :math:`O(V + E)` |
+    +------------------+------------------+
+
+    :param g: A NetworkX (Multi)DiGraph or a :class:`circuit.Circuit` representing a synchronous circuit.
+    :param c: The desired clock period.
+    :param r: The retiming function to start from (zero by default), e.g. the one found for a larger clock period.
+    :return: The retiming function or ``None`` if ``c`` is not feasible.
+    """
+    circuit = as_circuit(g)
+    r = _feas(circuit, c, None if r is None else circuit.vector(r))
+    if r is None:
+        return None
+    return _as_output(g, circuit, r)
+
+
+def opt2(g, show_wd=False, wd_method='floyd-warshall', return_retiming=False, matrices=None, cache=None,
+         search_processes=1, view=False):
     """
     Given a synchronous circuit :math:`G`, this algorithm determines a retiming :math:`r` such that the clock period of
     :math:`G_r` is as smallas possible.
@@ -241,26 +698,44 @@ def opt2(g, show_wd=False):
     | Space complexity | :math:`O(V^2)`       |
     +------------------+----------------------+
 
-    :param g: A NetworkX (Multi)DiGraph representing a synchronous circuit.
+    :param g: A NetworkX (Multi)DiGraph or a :class:`circuit.Circuit` representing a synchronous circuit.
     :param show_wd: Print matrices W and D.
+    :param wd_method: The engine used by *Algorithm WD* (see :func:`paths.all_pairs_wd`).
+    :param return_retiming: Whether to return the retiming function as well.
+    :param matrices: Precomputed ``W``, ``D`` and reachability mask (e.g. memory-mapped by :func:`storage.load_binary`),
+        which replace Step 1.
+    :param cache: An optional :class:`cache.WDCache` consulted before computing W and D.
+    :param search_processes: The number of candidate clock periods probed in parallel by each round of the search
+        (``1`` for the sequential binary search, ``None`` for one per core).
+    :param view: Whether to return the retimed graph as a :class:`circuit.RetimedView` of the circuit rather than as a
+        copy of ``g``.
     :return: The retimed graph having the smallest possible clock period.
     """
+    c = as_circuit(g)
 
     # STEP 1
     # Compute W and D using Algorithm WD.
-    W, D = wd(g, show=show_wd)
+    W, D, reach = _all_pairs_wd(c, wd_method, cache) if matrices is None else matrices
+    if show_wd:
+        _show_wd(*_label_wd(c, W, D, reach))
 
     # STEP 2
     # Sort the elements in the range of D.
-    D_range = np.unique(list(D.values()))
-    D_range.sort()
+    D_range = np.unique(D[reach])
 
     # STEP 3
     # Binary search among the elements D(u, v) for the minimum achievable clock period. To test whether each potential
-    # clock period c is feasible, apply Algorithm FEAS.
-    clock, r = __binary_search(D_range, feas, g)
+    # clock period c is feasible, apply Algorithm FEAS, warm-started from the retiming of the last feasible probe.
+    if search_processes == 1:
+        clock, r = __binary_search(D_range, _feas, c, warm_start=True)
+    else:
+        clock, r = __kary_search(D_range, _feas, c, search_processes, warm_start=True)
 
     # STEP 4
     # For the minimum achievable clock period found in Step 3, use the values for the r(v) found by Algorithm FEAS
     # as the optimal retiming.
-    return retime(g, r)
+    r = _as_output(g, c, r)
+    gr = RetimedView(c, r) if view else retime(g, r)
+    if return_retiming:
+        return gr, r
+    return gr
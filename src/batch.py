@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+from glob import glob
+from multiprocessing import Pool
+import json
+import os
+import resource
+import sys
+import time
+from algos import cp, opt1, opt2
+from bounded import opt_bounded
+from scc import opt_scc
+from utils import load_graph
+
+ALGORITHMS = {
+    'opt1': opt1,
+    'opt2': opt2,
+}
+
+
+def collect_files(inputs):
+    """
+    Expand the inputs of a batch into a list of DOT files.
+
+    :param inputs: Directories (all their ``*.dot`` files are taken), glob patterns or plain paths. Paths matching no
+        file are kept as they are, so that they are reported as errors.
+    :return: The sorted list of files, without repetitions.
+    """
+    files = set()
+    for i in inputs:
+        if os.path.isdir(i):
+            files.update(glob(os.path.join(i, '*.dot')))
+        else:
+            files.update(glob(i) or [i])
+    return sorted(files)
+
+
+def retime_file(path, algorithms=('opt1', 'opt2'), wd_method='floyd-warshall', memory_budget=None, cache=None,
+                scc=False):
+    """
+    Load a circuit and retime it with the given algorithms.
+
+    :param path: The DOT file from which the graph is loaded.
+    :param algorithms: The names of the algorithms to run (``'opt1'`` and/or ``'opt2'``).
+    :param wd_method: The engine used by *Algorithm WD*.
+    :param memory_budget: If not ``None``, run the memory-bounded versions of the algorithms with this budget (bytes).
+    :param cache: An optional :class:`cache.WDCache` consulted before computing matrices W and D.
+    :param scc: Whether to retime each strongly connected component on its own (see :func:`scc.opt_scc`).
+    :return: A JSON-serializable ``dict`` with the original clock period, the clock period, retiming function and
+        wall time of each algorithm, and the peak resident set size of the process. Errors are reported in the
+        ``error`` field instead of being raised.
+    """
+    record = {'file': path}
+    try:
+        start = time.perf_counter()
+        g = load_graph(path)
+        record['load_time'] = time.perf_counter() - start
+        record['nodes'] = g.number_of_nodes()
+        record['edges'] = g.number_of_edges()
+        record['clock_period'] = cp(g)
+        for name in algorithms:
+            start = time.perf_counter()
+            if memory_budget is not None:
+                gr, r = opt_bounded(g, name, memory_budget, return_retiming=True)
+            elif scc:
+                # The files are already spread across the worker processes.
+                gr, r = opt_scc(g, name, processes=1, wd_method=wd_method, return_retiming=True)
+            else:
+                gr, r = ALGORITHMS[name](g, wd_method=wd_method, return_retiming=True, cache=cache, view=True)
+            record[name] = {
+                'clock_period': cp(gr),
+                'time': time.perf_counter() - start,
+                'retiming': {str(v): int(x) for v, x in r.items()},
+            }
+    except Exception as e:
+        record['error'] = f'{type(e).__name__}: {e}'
+    record['peak_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return record
+
+
+def _retime_file(args):
+    return retime_file(*args)
+
+
+def run_batch(files, output=None, algorithms=('opt1', 'opt2'), processes=None, wd_method='floyd-warshall',
+              memory_budget=None, cache=None, scc=False):
+    """
+    Retime many circuits across a pool of worker processes, writing one JSON Lines record per circuit (see
+    :func:`retime_file`) as soon as it is ready.
+
+    Every worker process handles a single circuit, so that the peak resident set size of each record refers to that
+    circuit only.
+
+    :param files: The DOT files to be retimed.
+    :param output: The path of the JSON Lines file (standard output by default).
+    :param algorithms: The names of the algorithms to run (``'opt1'`` and/or ``'opt2'``).
+    :param processes: The number of worker processes (``None`` for one per core).
+    :param wd_method: The engine used by *Algorithm WD*.
+    :param memory_budget: If not ``None``, run the memory-bounded versions of the algorithms with this budget (bytes).
+    :param cache: An optional :class:`cache.WDCache`, shared by all the worker processes.
+    :param scc: Whether to retime each strongly connected component on its own (see :func:`scc.opt_scc`).
+    :return: The number of circuits that could not be retimed.
+    """
+    errors = 0
+    stream = open(output, 'w') if output is not None else sys.stdout
+    try:
+        with Pool(processes, maxtasksperchild=1) as pool:
+            tasks = [(f, tuple(algorithms), wd_method, memory_budget, cache, scc) for f in files]
+            for record in pool.imap_unordered(_retime_file, tasks):
+                errors += 'error' in record
+                stream.write(json.dumps(record) + '\n')
+                stream.flush()
+    finally:
+        if output is not None:
+            stream.close()
+    return errors
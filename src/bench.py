@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+
+from datetime import datetime, timezone
+from multiprocessing import Pool
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from algos import _cp, _feas, opt1, opt2
+from circuit import Circuit
+from generators import gen_correlator, gen_fir, gen_fsm, gen_iir, gen_pipeline, gen_random_circuit, gen_systolic
+from paths import all_pairs_wd
+from profiling import profiling
+from utils import load_circuit, load_graph, save_graph
+
+
+FAMILIES = {
+    'random': lambda n, seed: gen_random_circuit(n, round(1.4 * n), seed=seed, output='circuit'),
+    'correlator': lambda n, seed: Circuit.from_nx(gen_correlator(max(1, (n - 2) // 2))),
+    'pipeline': lambda n, seed: gen_pipeline(max(1, (n - 1) // 8), 8, seed=seed, output='circuit'),
+    'fir': lambda n, seed: gen_fir(max(1, (n - 1) // 2), seed=seed, output='circuit'),
+    'iir': lambda n, seed: gen_iir(max(1, (n - 3) // 4), seed=seed, output='circuit'),
+    'systolic': lambda n, seed: gen_systolic(*[max(1, int(np.sqrt(n - 1)))] * 2, seed=seed, output='circuit'),
+    'fsm': lambda n, seed: gen_fsm(max(2, n - 1), seed=seed, output='circuit'),
+}
+
+
+def _bench_cp(c):
+    _cp(c)
+
+
+def _bench_wd(c):
+    all_pairs_wd(c)
+
+
+def _bench_feas(c):
+    # A period halfway between the largest delay and the clock period, which is usually not feasible and therefore
+    # exercises all of the V - 1 iterations.
+    period = (int(c.delay.max()) + int(_cp(c).max())) // 2
+    _feas(c, period)
+
+
+def _bench_io(c):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'circuit.dot')
+        phases = {}
+        start = time.perf_counter()
+        save_graph(c.to_nx(), path)
+        phases['save'] = time.perf_counter() - start
+        start = time.perf_counter()
+        load_graph(path)
+        phases['load'] = time.perf_counter() - start
+        start = time.perf_counter()
+        load_circuit(path)
+        phases['load_circuit'] = time.perf_counter() - start
+    return phases
+
+
+BENCHMARKS = {
+    'cp': (_bench_cp, [1000, 10000, 100000]),
+    'wd': (_bench_wd, [100, 300, 1000]),
+    'feas': (_bench_feas, [1000, 10000, 100000]),
+    'opt1': (opt1, [100, 300, 1000]),
+    'opt2': (opt2, [100, 300, 1000]),
+    'io': (_bench_io, [1000, 10000, 100000]),
+}
+
+
+def _run_case(args):
+    """
+    Run one benchmark case, in a dedicated worker process so that its peak resident set size is not polluted by the
+    other cases.
+
+    Every run is profiled (see :mod:`profiling`): the phases and the counters reported are the ones of the fastest run.
+    """
+    benchmark, family, n, repeat, seed = args
+    f = BENCHMARKS[benchmark][0]
+    start = time.perf_counter()
+    c = FAMILIES[family](n, seed)
+    setup = time.perf_counter() - start
+    times = []
+    best = None
+    for _ in range(repeat):
+        with profiling() as p:
+            start = time.perf_counter()
+            x = f(c)
+            times.append(time.perf_counter() - start)
+        phases = {k: v['time'] for k, v in p.phases.items()}
+        if isinstance(x, dict):
+            phases.update(x)
+        if best is None or times[-1] < min(times[:-1]):
+            best = phases, p.counters
+    return {
+        'benchmark': benchmark,
+        'family': family,
+        'nodes': c.number_of_nodes(),
+        'edges': c.number_of_edges(),
+        'size': n,
+        'time': min(times),
+        'times': times,
+        'phases': dict(setup=setup, **best[0]),
+        'counters': best[1],
+        'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+# Commands whose cold start is timed: importing the retiming core, and the command-line interface.
+STARTUP = {
+    'core': ['-c', 'import algos, bounded, cache, storage, utils'],
+    'cli': ['main.py', '--help'],
+}
+
+
+def _run_probe(command, directory):
+    """
+    Run a startup command in a fresh interpreter.
+
+    :return: The elapsed time and the peak resident memory of that very process, in bytes (the maximum kept by
+        ``RUSAGE_CHILDREN`` also covers the earlier children, e.g. the workers of the benchmark pool).
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable] + command, cwd=directory, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+    return elapsed, usage.ru_maxrss * 1024
+
+
+def measure_startup(repeat=3):
+    """
+    Time the cold start of fresh interpreters running the commands of :data:`STARTUP`.
+
+    :param repeat: How many times each command is timed (the best time is reported).
+    :return: The results, in the same format as the ones of the other benchmarks, with ``'startup'`` as benchmark and
+        the name of the command as family.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for name, command in STARTUP.items():
+        times, peak_rss = zip(*(_run_probe(command, directory) for _ in range(repeat)))
+        results.append({
+            'benchmark': 'startup',
+            'family': name,
+            'nodes': 0,
+            'edges': 0,
+            'size': 0,
+            'time': min(times),
+            'times': list(times),
+            'phases': {},
+            'counters': {},
+            'peak_rss': max(peak_rss),
+        })
+    return results
+
+
+def run_benchmarks(benchmarks=None, families=('random',), sizes=None, repeat=3, seed=0, fit=False, log=None,
+                   startup=False):
+    """
+    Run the benchmark suite.
+
+    :param benchmarks: The names of the benchmarks to run (all of :data:`BENCHMARKS` by default).
+    :param families: The names of the circuit families (see :data:`FAMILIES`).
+    :param sizes: The numbers of vertices, overriding the defaults of each benchmark.
+    :param repeat: How many times each case is timed (the best time is reported).
+    :param seed: The seed of the random circuit families.
+    :param fit: Whether to fit the complexity class of each benchmark on the measured times (requires ``big_o``).
+    :param log: An optional function called with each result as soon as it is available.
+    :param startup: Whether to time the cold start of the core and of the command-line interface as well (see
+        :func:`measure_startup`).
+    :return: The report, as a JSON-serializable ``dict``.
+    """
+    cases = [(b, f, n, repeat, seed)
+             for b in (benchmarks or BENCHMARKS)
+             for f in families
+             for n in (sizes or BENCHMARKS[b][1])]
+    results = []
+    with Pool(1, maxtasksperchild=1) as pool:
+        for result in pool.imap(_run_case, cases):
+            results.append(result)
+            if log is not None:
+                log(result)
+    if startup:
+        for result in measure_startup(repeat):
+            results.append(result)
+            if log is not None:
+                log(result)
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpus': os.cpu_count(),
+            'seed': seed,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+    if fit:
+        report['fits'] = fit_complexity(results)
+    return report
+
+
+def fit_complexity(results):
+    """
+    Fit the complexity class of each benchmark and family on the measured times.
+
+    :param results: The ``results`` of a report.
+    :return: A ``dict`` mapping ``'benchmark/family'`` to the name of the best-fitting class.
+    """
+    from big_o import infer_big_o_class
+    fits = {}
+    for key in sorted({(r['benchmark'], r['family']) for r in results}):
+        cases = [r for r in results if (r['benchmark'], r['family']) == key]
+        if len(cases) >= 3:
+            best, _ = infer_big_o_class(np.array([r['nodes'] for r in cases]), np.array([r['time'] for r in cases]))
+            fits['/'.join(key)] = str(best)
+    return fits
+
+
+def compare(report, baseline, threshold=0.2):
+    """
+    Compare a report against a baseline report.
+
+    :param report: The new report.
+    :param baseline: The baseline report.
+    :param threshold: The relative slowdown above which a case is flagged as a regression.
+    :return: The list of regressions, each one a ``dict`` with the case, the baseline time, the new time and their
+        ratio. Cases missing from the baseline are ignored.
+    """
+    def key(r):
+        return r['benchmark'], r['family'], r['size']
+    reference = {key(r): r for r in baseline['results']}
+    regressions = []
+    for r in report['results']:
+        if key(r) in reference:
+            ratio = r['time'] / reference[key(r)]['time']
+            if ratio > 1 + threshold:
+                regressions.append({
+                    'benchmark': r['benchmark'],
+                    'family': r['family'],
+                    'size': r['size'],
+                    'baseline': reference[key(r)]['time'],
+                    'time': r['time'],
+                    'ratio': ratio,
+                })
+    return regressions
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
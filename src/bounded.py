@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+import numpy as np
+from algos import _as_output, _cp, _feas, retime
+from circuit import as_circuit
+from paths import _reweight, wd_rows
+
+
+class MemoryBudget:
+    """
+    Book-keeping of the memory held by the memory-bounded algorithms, on top of their :math:`O(V + E)` state.
+    """
+
+    def __init__(self, limit):
+        """
+        :param limit: The maximum number of bytes that can be held at once.
+        """
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+
+    def allocate(self, nbytes):
+        """
+        Reserve ``nbytes`` bytes.
+
+        :return: ``False`` (and nothing is reserved) if the budget would be exceeded.
+        """
+        if self.used + nbytes > self.limit:
+            return False
+        self.used += nbytes
+        self.peak = max(self.peak, self.used)
+        return True
+
+    def release(self, nbytes):
+        self.used -= nbytes
+
+
+def _stream_pass(c, period, x, budget, reweighted):
+    """
+    Relax, in place, the period constraints of every row of :math:`W` and :math:`D` as the rows are generated.
+
+    :param c: A :class:`circuit.Circuit`.
+    :param period: The clock period to be checked.
+    :param x: The current Bellman-Ford distances.
+    :param budget: The :class:`MemoryBudget` bounding the constraint buffer, or ``None`` not to buffer anything.
+    :param reweighted: The reweighting of the circuit used to generate the rows (see :func:`paths.wd_rows`).
+    :return: The buffered constraints ``(heads, tails, weights)``, meaning :math:`x(head) \leq x(tail) + weight`, and
+        their size in bytes, or ``None`` if they do not fit in the budget.
+    """
+    delay = c.delay.astype(np.int64)
+    buffer = [] if budget is not None else None
+    nbytes = 0
+    for u, W, D, reach in wd_rows(c, reweighted=reweighted):
+        v = np.flatnonzero(reach & (D > period) & (D - delay <= period) & (D - delay[u] <= period))
+        if v.size == 0:
+            continue
+        x[u] = min(x[u], (x[v] + W[v] - 1).min())
+        if buffer is not None:
+            if budget.allocate(v.size * 3 * 8):
+                nbytes += v.size * 3 * 8
+                buffer.append((np.full(v.size, u), v, W[v] - 1))
+            else:
+                budget.release(nbytes)
+                buffer = None
+    if buffer is None:
+        return None
+    if not buffer:
+        return np.zeros((3, 0), dtype=np.int64), nbytes
+    return tuple(np.concatenate(a) for a in zip(*buffer)), nbytes
+
+
+def _th7_streaming(c, period, budget, reweighted=None):
+    """
+    Check the condition of Theorem 7 without materializing :math:`W` and :math:`D`.
+
+    The Bellman-Ford algorithm runs in passes. Every pass relaxes the constraints of the circuit edges and then streams
+    the rows of :math:`W` and :math:`D` from :func:`paths.wd_rows`, relaxing the period constraints
+    :math:`r(u) - r(v) \leq W(u, v) - 1` of each row as it is generated. If all the period constraints fit in the
+    memory budget, they are buffered during the first pass and the following passes do not recompute the rows.
+
+    :param c: A :class:`circuit.Circuit`.
+    :param period: The clock period to be checked.
+    :param budget: The :class:`MemoryBudget` bounding the constraint buffer.
+    :param reweighted: The reweighting of the circuit used to generate the rows, which does not depend on the period
+        (computed by default).
+    :return: The retiming as an ``int64`` array, or ``None`` if ``period`` is not feasible.
+    """
+    n = c.number_of_nodes()
+    if c.delay.max() > period:
+        return None
+    if reweighted is None:
+        reweighted = _reweight(c)
+    x = np.zeros(n, dtype=np.int64)
+    buffered = None
+    try:
+        for i in range(n + 1):
+            before = x.copy()
+            np.minimum.at(x, c.src, x[c.dst] + c.weight)
+            if buffered is not None:
+                heads, tails, weights = buffered[0]
+                np.minimum.at(x, heads, x[tails] + weights)
+            else:
+                # Try to buffer the constraints only during the first pass: if they did not fit then, they never will.
+                buffered = _stream_pass(c, period, x, budget if i == 0 else None, reweighted)
+            if (x == before).all():
+                return x
+        return None
+    finally:
+        if buffered is not None:
+            budget.release(buffered[1])
+
+
+def opt_bounded(g, algorithm='opt1', memory_budget=64 << 20, return_retiming=False, return_stats=False):
+    """
+    Memory-bounded version of *Algorithms OPT1* and *OPT2*, which never materializes matrices :math:`W` and
+    :math:`D`. The binary search runs over the integer range :math:`[\max_v d(v), \Phi(G)]`, whose smallest feasible
+    value is an element of the range of :math:`D` as well.
+
+    +------------------+-------------------------------------------------+
+    | Space complexity | :math:`O(V + E)` plus at most ``memory_budget`` |
+    +------------------+-------------------------------------------------+
+
+    :param g: A NetworkX (Multi)DiGraph or a :class:`circuit.Circuit` representing a synchronous circuit.
+    :param algorithm: ``'opt1'`` to check the periods with Theorem 7 (streaming the rows of :math:`W` and :math:`D`),
+        ``'opt2'`` to check them with *Algorithm FEAS*, which needs no row at all.
+    :param memory_budget: The maximum number of bytes used to buffer period constraints between Bellman-Ford passes.
+    :param return_retiming: Whether to return the retiming function as well.
+    :param return_stats: Whether to return the memory statistics as well.
+    :return: The retimed graph having the smallest possible clock period, followed, if requested, by the retiming
+        function and by a ``dict`` with the budget and the peak number of bytes buffered. The resident set size is
+        left out, since the peak kept by the process also covers whatever ran before this call.
+    """
+    c = as_circuit(g)
+    budget = MemoryBudget(memory_budget)
+    if algorithm == 'opt1':
+        reweighted = _reweight(c)
+
+        def check(period):
+            return _th7_streaming(c, period, budget, reweighted)
+    elif algorithm == 'opt2':
+        def check(period):
+            return _feas(c, period)
+    else:
+        raise NotImplementedError(f'Unknown algorithm {algorithm!r}')
+
+    low = int(c.delay.max())
+    high = int(_cp(c).max())
+    r = np.zeros(c.number_of_nodes(), dtype=np.int64)
+    while low < high:
+        mid = (low + high) // 2
+        x = check(mid)
+        if x is None:
+            low = mid + 1
+        else:
+            high = mid
+            r = x
+
+    r = _as_output(g, c, r)
+    result = (retime(g, r),)
+    if return_retiming:
+        result += (r,)
+    if return_stats:
+        result += ({
+            'memory_budget': budget.limit,
+            'peak_buffered': budget.peak,
+        },)
+    return result if len(result) > 1 else result[0]
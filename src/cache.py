@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+from hashlib import sha256
+import os
+import tempfile
+import numpy as np
+from circuit import Circuit
+from paths import all_pairs_wd
+from storage import load_binary, save_binary
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(x):
+    """
+    Scramble 64-bit integers with the finalizer of SplitMix64.
+    """
+    x = np.asarray(x, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _combine(*xs):
+    h = np.uint64(0)
+    with np.errstate(over='ignore'):
+        for x in xs:
+            h = _mix(h * _GOLDEN + np.asarray(x, dtype=np.uint64))
+    return h
+
+
+def _refine(c, colors):
+    """
+    Refine a vertex coloring Weisfeiler-Lehman style until the number of colors stops growing: the new color of a vertex
+    combines its color with the multisets of the (register count, color) pairs of its out- and in-neighbors.
+    """
+    n = c.number_of_nodes()
+    count = np.unique(colors).size
+    while True:
+        out = np.zeros(n, dtype=np.uint64)
+        into = np.zeros(n, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            np.add.at(out, c.src, _combine(c.weight, colors[c.dst]))
+            np.add.at(into, c.dst, _combine(c.weight, colors[c.src]))
+        refined = _combine(colors, out, into)
+        refined_count = np.unique(refined).size
+        if refined_count == count:
+            return colors
+        colors, count = refined, refined_count
+
+
+def canonical_form(c):
+    """
+    Compute a hash of a circuit that does not depend on the identifiers or on the order of its vertices, together with
+    an ordering of the vertices derived from the same coloring.
+
+    The hash is computed from the stable Weisfeiler-Lehman coloring of the vertices (initially colored by their delay)
+    and from the multiset of the edges labelled with the colors of their endpoints and their register counts, hence it
+    is the same for isomorphic circuits. The ordering sorts the vertices by color, breaking the ties among vertices that
+    the refinement cannot tell apart by their original position: for circuits with such symmetries, isomorphic circuits
+    can get different orderings, which is why a cache hit must be verified (see :meth:`WDCache.get`).
+
+    +------------------+----------------------+
+    | Time complexity  | :math:`O(VE \log V)` |
+    +------------------+----------------------+
+    | Space complexity | :math:`O(V + E)`     |
+    +------------------+----------------------+
+
+    :param c: A :class:`circuit.Circuit`.
+    :return: The hexadecimal hash and the canonical order of the vertices (``order[i]`` is the index of the ``i``-th
+        vertex in canonical order).
+    """
+    colors = _refine(c, _mix(c.delay.astype(np.uint64)))
+    edges = np.sort(_combine(colors[c.src], colors[c.dst], c.weight))
+    h = sha256()
+    h.update(np.array([c.number_of_nodes(), c.number_of_edges()], dtype='<u8').tobytes())
+    h.update(np.sort(colors).astype('<u8').tobytes())
+    h.update(edges.astype('<u8').tobytes())
+    return h.hexdigest(), np.lexsort((np.arange(colors.size), colors))
+
+
+def _canonical_edges(c, position):
+    """
+    List the edges of a circuit as ``(src, dst, weight)`` rows, with the vertices renumbered according to ``position``
+    and the rows sorted, so that two circuits are equal iff their lists are.
+    """
+    edges = np.stack([position[c.src], position[c.dst], c.weight.astype(np.int64)], axis=1)
+    return edges[np.lexsort(edges.T[::-1])]
+
+
+class WDCache:
+    """
+    Persistent, content-addressed cache of matrices :math:`W` and :math:`D`.
+
+    Every entry is a file in the format of :mod:`storage`, named after the hash computed by :func:`canonical_form` and
+    holding the circuit and its matrices with the vertices in canonical order, so that relabeled or reordered copies of
+    the same circuit share an entry. When the total size of the entries exceeds the limit, the least recently used ones
+    (according to their modification time, which is refreshed on every hit) are evicted.
+    """
+
+    SUFFIX = '.wd'
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        """
+        :param directory: The directory holding the entries (created if missing).
+        :param max_bytes: The maximum total size of the entries.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(self.SUFFIX):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+        return entries
+
+    def get(self, c):
+        """
+        Look up the matrices of a circuit. The stored circuit is compared with the given one, once both are in canonical
+        order, so a hash collision or an ambiguous canonical order are reported as misses.
+
+        :param c: A :class:`circuit.Circuit`.
+        :return: ``W``, ``D`` and the reachability mask, indexed like ``c``, or ``None`` on a miss.
+        """
+        return self._get(c, *canonical_form(c))
+
+    def _get(self, c, key, order):
+        matrices = self._lookup(c, key, order)
+        if matrices is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return matrices
+
+    def _lookup(self, c, key, order):
+        path = self._path(key)
+        try:
+            stored, matrices = load_binary(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        position = np.empty_like(order)
+        position[order] = np.arange(order.size)
+        if matrices is None or stored.number_of_nodes() != c.number_of_nodes() \
+                or stored.number_of_edges() != c.number_of_edges() \
+                or (stored.delay != c.delay[order]).any() \
+                or (_canonical_edges(stored, np.arange(order.size)) != _canonical_edges(c, position)).any():
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        if (order == np.arange(order.size)).all():
+            return tuple(np.asarray(m) for m in matrices)
+        grid = np.ix_(position, position)
+        return tuple(np.asarray(m)[grid] for m in matrices)
+
+    def put(self, c, matrices):
+        """
+        Store the matrices of a circuit, then evict the least recently used entries if the cache is too large.
+
+        :param c: A :class:`circuit.Circuit`.
+        :param matrices: ``W``, ``D`` and the reachability mask, indexed like ``c``.
+        """
+        self._put(c, matrices, *canonical_form(c))
+
+    def _put(self, c, matrices, key, order):
+        position = np.empty_like(order)
+        position[order] = np.arange(order.size)
+        canonical = Circuit(range(order.size), c.delay[order], position[c.src], position[c.dst], c.weight)
+        grid = np.ix_(order, order)
+        # Write to a temporary file first, so that concurrent readers never see a partial entry.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            save_binary(tmp, canonical, tuple(np.asarray(m)[grid] for m in matrices))
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def all_pairs_wd(self, c, method='floyd-warshall', **kwargs):
+        """
+        Drop-in replacement of :func:`paths.all_pairs_wd` that consults the cache first and fills it on a miss.
+        """
+        key, order = canonical_form(c)
+        matrices = self._get(c, key, order)
+        if matrices is None:
+            matrices = all_pairs_wd(c, method, **kwargs)
+            self._put(c, matrices, key, order)
+        return matrices
+
+    def stats(self):
+        """
+        :return: A ``dict`` with the number of hits, misses and evictions of this instance, and the number and total
+            size of the entries in the cache.
+        """
+        entries = self._entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+
+import numpy as np
+from profiling import timed
+
+
+class Circuit:
+    """
+    Compact, integer-indexed representation of a synchronous circuit.
+
+    Vertices are mapped to the indices :math:`0, \dots, V-1` (``nodes[i]`` is the original identifier of vertex ``i``),
+    while edges are stored in CSR order, i.e. sorted by source vertex, so that the out-edges of vertex ``v`` are the
+    ones in ``range(indptr[v], indptr[v+1])``. The in-edges of ``v`` are ``in_order[in_indptr[v]:in_indptr[v+1]]``
+    (CSC view). Delays and register counts are kept in ``int32`` arrays.
+
+    A circuit should be converted from and to NetworkX only once, at the boundary, by means of :meth:`from_nx` and
+    :meth:`to_nx`.
+    """
+
+    def __init__(self, nodes, delay, src, dst, weight, keys=None, multigraph=True):
+        """
+        :param nodes: The list of original vertex identifiers.
+        :param delay: The propagation delay :math:`d(v)` of each vertex, in the same order as ``nodes``.
+        :param src: The index of the source vertex of each edge.
+        :param dst: The index of the destination vertex of each edge.
+        :param weight: The register count :math:`w(e)` of each edge.
+        :param keys: The original edge keys (used to rebuild a MultiDiGraph), in the same order as the edges.
+        :param multigraph: Whether the circuit has been built from (and should be converted back to) a MultiDiGraph.
+        """
+        self.nodes = list(nodes)
+        self.index = {v: i for i, v in enumerate(self.nodes)}
+        self.delay = np.asarray(delay, dtype=np.int32)
+        src = np.asarray(src, dtype=np.int32)
+        dst = np.asarray(dst, dtype=np.int32)
+        weight = np.asarray(weight, dtype=np.int32)
+        n = len(self.nodes)
+        order = np.argsort(src, kind='stable')
+        self.src = src[order]
+        self.dst = dst[order]
+        self.weight = weight[order]
+        self.keys = [keys[i] for i in order] if keys is not None else None
+        self.multigraph = multigraph
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.src, minlength=n), out=self.indptr[1:])
+        self.in_order = np.argsort(self.dst, kind='stable')
+        self.in_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.dst, minlength=n), out=self.in_indptr[1:])
+
+    @classmethod
+    @timed('from_nx')
+    def from_nx(cls, g):
+        """
+        Build the compact representation of a NetworkX graph.
+
+        +------------------+------------------+
+        | Time complexity  | :math:`O(V + E)` |
+        +------------------+------------------+
+        | Space complexity | :math:`O(V + E)` |
+        +------------------+------------------+
+
+        :param g: A NetworkX (Multi)DiGraph representing a synchronous circuit.
+        :return: The corresponding :class:`Circuit`.
+        """
+        nodes = list(g.nodes)
+        index = {v: i for i, v in enumerate(nodes)}
+        delay = [g.nodes[v]['weight'] for v in nodes]
+        multigraph = g.is_multigraph()
+        if multigraph:
+            edges = list(g.edges(keys=True, data='weight'))
+            keys = [e[2] for e in edges]
+            edges = [(e[0], e[1], e[3]) for e in edges]
+        else:
+            edges = list(g.edges(data='weight'))
+            keys = None
+        src = [index[e[0]] for e in edges]
+        dst = [index[e[1]] for e in edges]
+        weight = [e[2] for e in edges]
+        return cls(nodes, delay, src, dst, weight, keys=keys, multigraph=multigraph)
+
+    def to_nx(self, weight=None):
+        """
+        Convert the circuit back to a NetworkX graph.
+
+        :param weight: Optional register counts to be used instead of the ones of the circuit (e.g. after a retiming).
+        :return: A NetworkX (Multi)DiGraph with ``weight`` attributes on both vertices and edges.
+        """
+        import networkx as nx
+        weight = self.weight if weight is None else weight
+        g = nx.MultiDiGraph() if self.multigraph else nx.DiGraph()
+        g.add_nodes_from((v, {'weight': int(x)}) for v, x in zip(self.nodes, self.delay.tolist()))
+        src = [self.nodes[i] for i in self.src.tolist()]
+        dst = [self.nodes[i] for i in self.dst.tolist()]
+        if self.multigraph and self.keys is not None:
+            g.add_edges_from((u, v, k, {'weight': x}) for u, v, k, x in zip(src, dst, self.keys, weight.tolist()))
+        else:
+            g.add_edges_from((u, v, {'weight': x}) for u, v, x in zip(src, dst, weight.tolist()))
+        return g
+
+    def with_weight(self, weight):
+        """
+        Build a circuit sharing vertices, delays and topology with this one, but with different register counts.
+
+        :param weight: The new register counts, in CSR edge order.
+        :return: The new :class:`Circuit`.
+        """
+        c = Circuit.__new__(Circuit)
+        c.__dict__.update(self.__dict__)
+        c.__dict__.pop('_lightest', None)
+        c.weight = np.asarray(weight, dtype=np.int32)
+        return c
+
+    def lightest_edges(self):
+        """
+        Index the smallest register count over the parallel edges of each ordered pair of vertices. The index is built
+        on the first call, in :math:`O(E)` time, and kept by the circuit, whose arrays are never modified in place.
+
+        :return: A ``dict`` mapping the pairs ``(u, v)`` of vertex indices joined by an edge to that register count.
+        """
+        lightest = getattr(self, '_lightest', None)
+        if lightest is None:
+            lightest = {}
+            for u, v, x in zip(self.src.tolist(), self.dst.tolist(), self.weight.tolist()):
+                if x < lightest.get((u, v), x + 1):
+                    lightest[u, v] = x
+            self._lightest = lightest
+        return lightest
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        return len(self.src)
+
+    def out_edges(self, v):
+        """
+        :param v: The index of a vertex.
+        :return: The indices of the edges leaving ``v``.
+        """
+        return np.arange(self.indptr[v], self.indptr[v+1])
+
+    def in_edges(self, v):
+        """
+        :param v: The index of a vertex.
+        :return: The indices of the edges entering ``v``.
+        """
+        return self.in_order[self.in_indptr[v]:self.in_indptr[v+1]]
+
+    def vector(self, f, default=0):
+        """
+        Convert a function defined on the vertices into an integer array indexed like the circuit.
+
+        :param f: A ``dict`` keyed by the original vertex identifiers, or an array already indexed like the circuit.
+        :param default: The value used for the vertices missing from ``f``.
+        :return: The ``int64`` array.
+        """
+        if isinstance(f, dict):
+            return np.array([f.get(v, default) for v in self.nodes], dtype=np.int64)
+        return np.asarray(f, dtype=np.int64)
+
+    def mapping(self, a):
+        """
+        Inverse of :meth:`vector`.
+
+        :param a: An array indexed like the circuit.
+        :return: A ``dict`` keyed by the original vertex identifiers.
+        """
+        return dict(zip(self.nodes, np.asarray(a).tolist()))
+
+
+class RetimedView:
+    """
+    Retimed circuit :math:`G_r` as a reference to a base :class:`Circuit` plus the retiming :math:`r`, without copying
+    the graph: the register counts :math:`w_r(e) = w(e) + r(v) - r(u)` of the edges :math:`u \\xrightarrow{e} v` are
+    computed on access, one edge at a time with :meth:`weight_of` or in bulk with :attr:`weight`.
+
+    The algorithms accept a view wherever they accept a :class:`Circuit` (see :func:`as_circuit`), and it becomes a
+    real graph only on request, with :meth:`circuit` or :meth:`to_nx`.
+    """
+
+    def __init__(self, base, r):
+        """
+        :param base: The :class:`Circuit` to be retimed.
+        :param r: The retiming, as a ``dict`` keyed by the original vertex identifiers or an array indexed like
+            ``base``.
+        """
+        self.base = base
+        self.r = base.vector(r)
+
+    @property
+    def nodes(self):
+        return self.base.nodes
+
+    @property
+    def index(self):
+        return self.base.index
+
+    @property
+    def delay(self):
+        return self.base.delay
+
+    @property
+    def weight(self):
+        """
+        The register counts :math:`w_r(e)` of all the edges, in CSR edge order, computed with vectorized operations.
+        """
+        return (self.base.weight + self.r[self.base.dst] - self.r[self.base.src]).astype(np.int32)
+
+    def weight_of(self, e):
+        """
+        :param e: The index of an edge of the base circuit.
+        :return: Its register count :math:`w_r(e)`.
+        """
+        return int(self.base.weight[e] + self.r[self.base.dst[e]] - self.r[self.base.src[e]])
+
+    def number_of_nodes(self):
+        return self.base.number_of_nodes()
+
+    def number_of_edges(self):
+        return self.base.number_of_edges()
+
+    def vector(self, f, default=0):
+        return self.base.vector(f, default)
+
+    def mapping(self, a):
+        return self.base.mapping(a)
+
+    def retime(self, r):
+        """
+        :param r: A further retiming, in any form accepted by :meth:`Circuit.vector`.
+        :return: The view of the base circuit retimed by the sum of the two retimings.
+        """
+        return RetimedView(self.base, self.r + self.base.vector(r))
+
+    def circuit(self):
+        """
+        :return: A :class:`Circuit` with the retimed register counts, sharing vertices, delays and topology with the
+            base one.
+        """
+        return self.base.with_weight(self.weight)
+
+    def to_nx(self):
+        """
+        :return: The retimed circuit as a NetworkX (Multi)DiGraph.
+        """
+        return self.base.to_nx(self.weight)
+
+
+def as_circuit(g):
+    """
+    Return ``g`` itself if it is already a :class:`Circuit`, its compact representation otherwise.
+
+    :param g: A NetworkX (Multi)DiGraph, a :class:`Circuit` or a :class:`RetimedView`.
+    :return: A :class:`Circuit`.
+    """
+    if isinstance(g, Circuit):
+        return g
+    if isinstance(g, RetimedView):
+        return g.circuit()
+    return Circuit.from_nx(g)
+
+
+def gather(indptr, vertices):
+    """
+    Collect the edges of a set of vertices from a CSR (or CSC) index pointer array, without Python-level loops.
+
+    :param indptr: The index pointer array (``Circuit.indptr`` or ``Circuit.in_indptr``).
+    :param vertices: The indices of the vertices.
+    :return: The positions, inside the corresponding edge arrays, of the edges of the given vertices.
+    """
+    starts = indptr[vertices]
+    lengths = indptr[np.asarray(vertices) + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return offsets + np.arange(total)
+
+
+def zero_weight_cycle(c, weight=None):
+    """
+    Look for a cycle of :math:`G_0`, the sub-graph of the edges with no registers, by peeling it level by level with
+    Kahn's algorithm. The vertices left over all have a zero-weight in-edge coming from another left-over vertex, so
+    walking backwards along such edges from any of them eventually closes a cycle.
+
+    +------------------+------------------+
+    | Time complexity  | :math:`O(V + E)` |
+    +------------------+------------------+
+    | Space complexity | :math:`O(V + E)` |
+    +------------------+------------------+
+
+    :param c: A :class:`Circuit`.
+    :param weight: Optional register counts to be used instead of ``c.weight``.
+    :return: The indices of the vertices of a zero-weight cycle, in the order of its edges, or ``None`` if :math:`G_0`
+        is acyclic.
+    """
+    weight = c.weight if weight is None else weight
+    n = c.number_of_nodes()
+    zero = weight == 0
+    in_degree = np.bincount(c.dst[zero], minlength=n)
+    frontier = np.flatnonzero(in_degree == 0)
+    while frontier.size > 0:
+        edges = gather(c.indptr, frontier)
+        heads = c.dst[edges[zero[edges]]]
+        np.subtract.at(in_degree, heads, 1)
+        heads = np.unique(heads)
+        frontier = heads[in_degree[heads] == 0]
+    left = in_degree > 0
+    if not left.any():
+        return None
+    predecessor = np.full(n, -1, dtype=np.int64)
+    edges = np.flatnonzero(zero & left[c.src] & left[c.dst])
+    predecessor[c.dst[edges]] = c.src[edges]
+    position = {}
+    walk = []
+    v = int(np.flatnonzero(left)[0])
+    while v not in position:
+        position[v] = len(walk)
+        walk.append(v)
+        v = int(predecessor[v])
+    return walk[position[v]:][::-1]
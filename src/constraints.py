@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+import numpy as np
+from circuit import gather
+from profiling import count, timed
+
+
+def circuit_constraints(c):
+    """
+    Build the constraints :math:`r(u) - r(v) \leq w(e)` of the edges :math:`u \\xrightarrow{e} v` of a circuit, which
+    make :math:`w_r(e) \geq 0`.
+
+    :param c: A :class:`circuit.Circuit`.
+    :return: The arrays ``(tails, heads, weights)`` of the edges of the constraint graph: every edge asks for
+        :math:`x(head) \leq x(tail) + weight`, where :math:`x` is the retiming.
+    """
+    return c.dst.astype(np.int64), c.src.astype(np.int64), c.weight.astype(np.int64)
+
+
+@timed('constraints')
+def th7_constraints(W, D, reach, delay, period):
+    """
+    Build, with vectorized masks, the constraints :math:`r(u) - r(v) \leq W(u, v) - 1` of Theorem 7 for all the pairs
+    with :math:`D(u, v) > c`. The pairs for which :math:`D(u, v) - d(v) > c` or :math:`D(u, v) - d(u) > c` are left
+    out, as their constraints are implied by the ones of shorter paths.
+
+    +------------------+----------------+
+    | Time complexity  | :math:`O(V^2)` |
+    +------------------+----------------+
+    | Space complexity | :math:`O(V^2)` |
+    +------------------+----------------+
+
+    :param W: Matrix :math:`W` as a dense array.
+    :param D: Matrix :math:`D` as a dense array.
+    :param reach: The reachability mask returned together with ``W`` and ``D``.
+    :param delay: The propagation delays :math:`d(v)`.
+    :param period: The clock period :math:`c`.
+    :return: The arrays ``(tails, heads, weights)`` of the edges of the constraint graph.
+    """
+    delay = np.asarray(delay, dtype=np.int64)
+    mask = reach & (D > period) & (D - delay[None, :] <= period) & (D - delay[:, None] <= period)
+    u, v = np.nonzero(mask)
+    return v, u, W[u, v] - 1
+
+
+class PrunedConstraints:
+    """
+    The constraints :math:`r(u) - r(v) \leq W(u, v) - 1` of Theorem 7 of all the clock periods in a range, pruned once
+    for all of them so that every period only scans the pairs that may matter.
+
+    The constraint of the pair :math:`(u, v)` is needed for the periods :math:`c` with :math:`D(u, v) > c`, but, as in
+    :func:`th7_constraints`, it is implied by the constraint of a shorter path plus a circuit edge when
+    :math:`D(u, v) - d(v) > c` or :math:`D(u, v) - d(u) > c`: it only matters in the window
+    :math:`D(u, v) - \min(d(u), d(v)) \leq c < D(u, v)`. The pairs whose window is empty (e.g. with a vertex without
+    delay, like the host) or misses the range are removed once and for all, and the windows of the others are kept, so
+    that selecting the constraints of a period only takes two comparisons per remaining pair. No clock period below the
+    largest delay is feasible, which is the lower end of the range, and the pairs on the diagonal only matter there.
+
+    +------------------+----------------+
+    | Time complexity  | :math:`O(V^2)` |
+    +------------------+----------------+
+    | Space complexity | :math:`O(V^2)` |
+    +------------------+----------------+
+    """
+
+    @timed('prune')
+    def __init__(self, W, D, reach, delay, high=None):
+        """
+        :param W: Matrix :math:`W` as a dense array.
+        :param D: Matrix :math:`D` as a dense array.
+        :param reach: The reachability mask returned together with ``W`` and ``D``.
+        :param delay: The propagation delays :math:`d(v)`.
+        :param high: The largest clock period to be checked (no limit by default), e.g. the clock period of the
+            circuit, for which the zero retiming is a solution.
+        """
+        self.delay = np.asarray(delay, dtype=np.int64)
+        n = self.delay.size
+        self.low = int(self.delay.max(initial=0))
+        u, v = np.nonzero(reach & ~np.eye(n, dtype=bool))
+        self.total = u.size
+        end = np.asarray(D[u, v], dtype=np.int64)
+        start = end - np.minimum(self.delay[u], self.delay[v])
+        keep = (start < end) & (end > self.low)
+        if high is not None:
+            keep &= start <= high
+        self.heads, self.tails, self.start, self.end = u[keep], v[keep], start[keep], end[keep]
+        self.weights = np.asarray(W[self.heads, self.tails], dtype=np.int64) - 1
+        self.removed = self.total - self.heads.size
+        count('pruned_constraints', self.removed)
+
+    def __len__(self):
+        return self.heads.size
+
+    @timed('constraints')
+    def at(self, period):
+        """
+        Select the constraints of a clock period.
+
+        :param period: The clock period :math:`c`, not smaller than :attr:`low` (and not larger than the range).
+        :return: The arrays ``(tails, heads, weights)`` of the edges of the constraint graph.
+        """
+        active = np.flatnonzero((self.start <= period) & (self.end > period))
+        return self.tails[active], self.heads[active], self.weights[active]
+
+
+def _has_cycle(parent):
+    """
+    Check, by pointer doubling, whether the predecessor graph of the Bellman-Ford algorithm contains a cycle.
+
+    :param parent: The predecessor of each vertex, ``-1`` for the vertices attached to the root.
+    :return: Whether there is a cycle.
+    """
+    n = parent.size
+    ancestor = parent.copy()
+    for _ in range(max(1, int(n).bit_length())):
+        attached = ancestor >= 0
+        ancestor[attached] = ancestor[ancestor[attached]]
+    return bool((ancestor >= 0).any())
+
+
+@timed('bellman_ford')
+def bellman_ford(n, tails, heads, weights):
+    """
+    Solve a system of difference constraints :math:`x(head) \leq x(tail) + weight` with the Bellman-Ford algorithm,
+    starting from a virtual root connected to every vertex with weight 0.
+
+    The relaxations are SPFA-like: each round only scans the edges leaving the vertices updated in the previous round,
+    and is carried out with vectorized operations over the edges sorted by tail. Negative cycles are detected early by
+    looking for a cycle in the predecessor graph whenever the number of rounds reaches a power of two, rather than
+    waiting for the :math:`V`-th round.
+
+    +------------------+------------------+
+    | Time complexity  | :math:`O(VE)`    |
+    +------------------+------------------+
+    | Space complexity | :math:`O(V + E)` |
+    +------------------+------------------+
+
+    :param n: The number of vertices.
+    :param tails: The tails of the edges of the constraint graph.
+    :param heads: The heads of the edges of the constraint graph.
+    :param weights: The weights of the edges of the constraint graph.
+    :return: The solution :math:`x` as an ``int64`` array, or ``None`` if the constraints contain a negative cycle.
+    """
+    order = np.argsort(tails, kind='stable')
+    tails = np.asarray(tails, dtype=np.int64)[order]
+    heads = np.asarray(heads, dtype=np.int64)[order]
+    weights = np.asarray(weights, dtype=np.int64)[order]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tails, minlength=n), out=indptr[1:])
+
+    x = np.zeros(n, dtype=np.int64)
+    parent = np.full(n, -1, dtype=np.int64)
+    return x if _relax([(indptr, tails, heads, weights)], x, parent, np.arange(n)) else None
+
+
+def _relax(graphs, x, parent, active):
+    """
+    Run the rounds of relaxations of :func:`bellman_ford` from a set of vertices, updating ``x`` and ``parent`` in
+    place.
+
+    :param graphs: The edges of the constraint graph, as a list of blocks ``(indptr, tails, heads, weights)`` each
+        sorted by tail.
+    :param x: The current solution.
+    :param parent: The predecessor of each vertex.
+    :param active: The vertices whose outgoing edges are to be relaxed first.
+    :return: Whether no negative cycle was found.
+    """
+    n = x.size
+    rounds = 0
+    while active.size > 0:
+        rounds += 1
+        count('bellman_ford_rounds')
+        if rounds > n:
+            return False
+        sources, updated, candidates = [], [], []
+        for indptr, tails, heads, weights in graphs:
+            edges = gather(indptr, active)
+            count('relaxations', edges.size)
+            candidate = x[tails[edges]] + weights[edges]
+            better = candidate < x[heads[edges]]
+            edges = edges[better]
+            sources.append(tails[edges])
+            updated.append(heads[edges])
+            candidates.append(candidate[better])
+        candidate = np.concatenate(candidates)
+        if candidate.size == 0:
+            break
+        sources, updated = np.concatenate(sources), np.concatenate(updated)
+        np.minimum.at(x, updated, candidate)
+        best = candidate == x[updated]
+        parent[updated[best]] = sources[best]
+        active = np.unique(updated)
+        if rounds & (rounds - 1) == 0 and _has_cycle(parent):
+            return False
+    return True
+
+
+class PeriodSweep:
+    """
+    Incremental solver of the constraints of Theorem 7 for decreasing clock periods.
+
+    The pairs with :math:`D(u, v) > c` only grow as the clock period :math:`c` decreases, so the sweep walks the
+    candidate periods downward, inserting the constraints of the pairs as they become active, and keeps a solution
+    :math:`x` of the constraints inserted so far. After every insertion, the relaxations of :func:`bellman_ford` restart
+    from the current solution and only from the tails of the violated constraints, so that the work depends on the
+    number of new constraints and on how much the solution moves, rather than on the total number of constraints. The
+    pairs of a :class:`PrunedConstraints` are inserted when their window starts, and left in afterwards, when they are
+    implied by the constraints of shorter paths.
+
+    The constraints are kept in blocks sorted by tail, whose sizes at least double from the last one to the first one:
+    the block of the new constraints is merged with the last ones as long as they are not larger than twice its size,
+    so every constraint is merged :math:`O(\log E)` times, and every round of relaxations scans :math:`O(\log E)`
+    blocks. Since the previous solution satisfies all the older constraints, any negative cycle goes through a new
+    constraint, and is detected as in :func:`bellman_ford`. The insertions made for an infeasible period are then
+    undone, so the sweep stays at the last feasible period and can go on with a larger one among those still to be
+    checked, e.g. in a binary search.
+
+    +------------------+------------------------------------------+
+    | Time complexity  | :math:`O(P \log P)` plus the relaxations |
+    +------------------+------------------------------------------+
+    | Space complexity | :math:`O(V + P)`                         |
+    +------------------+------------------------------------------+
+
+    where :math:`P` is the number of pairs of the :class:`PrunedConstraints`.
+    """
+
+    def __init__(self, constraints, tails, heads, weights):
+        """
+        :param constraints: The :class:`PrunedConstraints` of the range of periods to be swept.
+        :param tails: The tails of the constraints that hold for every period (see :func:`circuit_constraints`).
+        :param heads: The heads of those constraints.
+        :param weights: The weights of those constraints, which must be satisfied by the zero solution.
+        """
+        order = np.argsort(-constraints.end)
+        self._tails, self._heads, self._weights = (a[order] for a in (constraints.tails, constraints.heads,
+                                                                      constraints.weights))
+        self._start, self._end = constraints.start[order], constraints.end[order]
+        self._low = constraints.low
+        n = constraints.delay.size
+        self.x = np.zeros(n, dtype=np.int64)
+        self.parent = np.full(n, -1, dtype=np.int64)
+        self.period = None
+        self._blocks = [self._block(tails, heads, weights)]
+        self._inserted = 0
+
+    def _block(self, tails, heads, weights):
+        order = np.argsort(tails, kind='stable')
+        tails = np.asarray(tails, dtype=np.int64)[order]
+        n = self.x.size
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tails, minlength=n), out=indptr[1:])
+        return indptr, tails, np.asarray(heads, dtype=np.int64)[order], np.asarray(weights, dtype=np.int64)[order]
+
+    def advance(self, period):
+        """
+        Lower the clock period, inserting the constraints that become active.
+
+        :param period: The new clock period, smaller than the last feasible one.
+        :return: The solution :math:`x`, i.e. a retiming with clock period at most ``period``, which is updated in place
+            by the following calls, or ``None`` if ``period`` is not feasible, in which case the sweep is left as it
+            was.
+        """
+        if self.period is not None and period >= self.period:
+            raise ValueError(f'The clock period should decrease, {period} is not smaller than {self.period}')
+        count('sweep_steps')
+        if period < self._low:
+            return None
+        # The pairs are sorted by decreasing D(u, v), so the ones with D(u, v) > c are a prefix.
+        end = int(np.searchsorted(-self._end, -period, side='left'))
+        new = self._inserted + np.flatnonzero(self._start[self._inserted:end] <= period)
+        tails, heads, weights = self._tails[new], self._heads[new], self._weights[new]
+        count('sweep_constraints', tails.size)
+        violated = self.x[tails] + weights < self.x[heads]
+        active = np.unique(tails[violated])
+
+        blocks = self._blocks
+        if tails.size > 0:
+            blocks = blocks.copy()
+            while len(blocks) > 1 and blocks[-1][1].size <= 2 * tails.size:
+                _, *last = blocks.pop()
+                tails, heads, weights = (np.concatenate(a) for a in zip(last, (tails, heads, weights)))
+            blocks.append(self._block(tails, heads, weights))
+        x, parent = self.x, self.parent
+        if active.size > 0:
+            x, parent = x.copy(), parent.copy()
+            if not _relax(blocks, x, parent, active):
+                return None
+        self._blocks = blocks
+        self._inserted = end
+        self.x, self.parent = x, parent
+        self.period = period
+        return x
@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 
-import networkx as nx
 import numpy as np
-from utils import add_weighted_node, check_if_synchronous_circuit, save_graph
+from circuit import Circuit
+from storage import save_binary
+from utils import add_weighted_node, save_graph
 
 
 def gen_provided_correlator(n, save=False):
@@ -13,7 +14,7 @@ def gen_provided_correlator(n, save=False):
     :param save: Whether to save the generated graph or not.
     :return: The generated graph.
     """
-
+    import networkx as nx
     g = nx.MultiDiGraph()
     add_weighted_node(g, 'h', 0)
     add_weighted_node(g, 'd0', 3)
@@ -68,6 +69,7 @@ def gen_correlator(k, save=False):
     :param save: Whether to save the generated graph or not.
     :return: The generated graph.
     """
+    import networkx as nx
     assert k >= 1, 'k should be greater than or equal to 1'
     g = nx.DiGraph()
     add_weighted_node(g, 'h', 0)
@@ -86,23 +88,268 @@ def gen_correlator(k, save=False):
     return g
 
 
-def gen_random_circuit(V=8, E=11, save=False):
+def gen_random_circuit(V=8, E=11, save=False, seed=None, output='nx', binary=False):
     """
-    Generate a random synchronous circuit.
+    Generate a random synchronous circuit with :math:`V` vertices and :math:`E` distinct edges, without self-loops.
+    :math:`E` is clamped to the :math:`V(V-1)` edges of the complete digraph.
+
+    The edges are drawn uniformly among the :math:`V(V-1)` ordered pairs, and all the delays (between 1 and 9, except
+    for the host vertex 0, whose delay is 0) and register counts (between 0 and 9) are drawn at once. Condition W2 holds
+    by construction, since every edge going backwards in a random order of the vertices gets at least one register,
+    so that every cycle has at least one register: no validation and no retries are needed.
+
+    +------------------+-------------------------+
+    | Time complexity  | :math:`O(V + E \log E)` |
+    +------------------+-------------------------+
+    | Space complexity | :math:`O(V + E)`        |
+    +------------------+-------------------------+
 
     :param V: The number of nodes.
-    :param E: The number of edges.
+    :param E: The number of edges, at most :math:`V(V-1)`.
+    :param save: If different from ``None`` or ``False``, the path where to save the generated graph.
+    :param seed: The seed of the :class:`numpy.random.Generator` (or the generator itself), ``None`` for a fresh one.
+    :param output: ``'nx'`` to return a NetworkX DiGraph, ``'circuit'`` to return a :class:`circuit.Circuit`.
+    :param binary: Whether to save the graph in the binary format of :mod:`storage` rather than in DOT.
+    :return: The generated graph.
+    """
+    E = max(0, min(E, V * (V - 1)))
+    rng = np.random.default_rng(seed)
+    pair = rng.choice(V * (V - 1), E, replace=False) if E > 0 else np.zeros(0, dtype=np.int64)
+    src, dst = np.divmod(pair, V - 1) if V > 1 else (pair, pair)
+    dst += dst >= src
+    delay = rng.integers(1, 10, V)
+    delay[0] = 0
+    weight = rng.integers(0, 10, E)
+    order = rng.permutation(V)
+    weight[(order[src] > order[dst]) & (weight == 0)] = 1
+    return _emit(Circuit(range(V), delay, src, dst, weight, multigraph=False), save, output, binary)
+
+
+def _emit(c, save, output, binary):
+    """
+    Save a generated circuit if requested, and return it in the requested form.
+    """
+    if save:
+        if binary:
+            save_binary(save, c)
+        else:
+            save_graph(c.to_nx(), save)
+    if output == 'circuit':
+        return c
+    elif output == 'nx':
+        return c.to_nx()
+    raise NotImplementedError(f'Unknown output {output!r}')
+
+
+def _chain(first, length):
+    """
+    :return: The sources and the destinations of the edges of the chain ``first, first + 1, ..., first + length - 1``.
+    """
+    src = np.arange(first, first + length - 1)
+    return src, src + 1
+
+
+def gen_pipeline(stages, width=4, fanin=2, registers=0.5, save=False, seed=None, output='nx', binary=False):
+    """
+    Generate a deep pipelined datapath: ``stages`` stages of ``width`` operators each, where every operator takes
+    ``fanin`` distinct inputs from the previous stage. The host feeds the first stage through a register and collects
+    the outputs of the last one, and every stage boundary is cut by a rank of registers with probability
+    ``registers``, so that retiming has to balance stages of uneven depth.
+
+    The operators are named ``p<stage>_<i>`` and their delays are drawn between 1 and 9.
+
+    +------------------+--------------------------+
+    | Time complexity  | :math:`O(V \cdot width)` |
+    +------------------+--------------------------+
+    | Space complexity | :math:`O(V \cdot width)` |
+    +------------------+--------------------------+
+
+    :param stages: The number of stages.
+    :param width: The number of operators of every stage.
+    :param fanin: The number of inputs of every operator (at most ``width``).
+    :param registers: The probability of a rank of registers between two consecutive stages.
+    :param save: If different from ``None`` or ``False``, the path where to save the generated graph.
+    :param seed: The seed of the :class:`numpy.random.Generator` (or the generator itself), ``None`` for a fresh one.
+    :param output: ``'nx'`` to return a NetworkX DiGraph, ``'circuit'`` to return a :class:`circuit.Circuit`.
+    :param binary: Whether to save the graph in the binary format of :mod:`storage` rather than in DOT.
+    :return: The generated graph.
+    """
+    assert stages >= 1 and width >= 1, 'stages and width should be greater than or equal to 1'
+    rng = np.random.default_rng(seed)
+    fanin = min(fanin, width)
+    nodes = ['h'] + [f'p{s}_{i}' for s in range(stages) for i in range(width)]
+    delay = rng.integers(1, 10, len(nodes))
+    delay[0] = 0
+    # Every operator of stages 1 and up picks its inputs among the operators of the previous stage.
+    dst = np.repeat(np.arange(1 + width, len(nodes)), fanin)
+    picks = rng.random(((stages - 1) * width, width)).argsort(axis=1)[:, :fanin].ravel()
+    src = (dst - 1) // width * width + 1 - width + picks
+    cut = rng.random(stages) < registers
+    weight = cut[(dst - 1) // width].astype(np.int64)
+    first, last = np.arange(1, 1 + width), np.arange(len(nodes) - width, len(nodes))
+    src = np.concatenate([np.zeros(width, dtype=np.int64), src, last])
+    dst = np.concatenate([first, dst, np.zeros(width, dtype=np.int64)])
+    weight = np.concatenate([np.ones(width, dtype=np.int64), weight, np.zeros(width, dtype=np.int64)])
+    return _emit(Circuit(nodes, delay, src, dst, weight, multigraph=False), save, output, binary)
+
+
+def _operators(taps, rng):
+    """
+    Draw the delays of ``taps`` multipliers (between 5 and 8) and ``taps`` adders (between 2 and 3).
+    """
+    return rng.integers(5, 9, taps), rng.integers(2, 4, taps)
+
+
+def _filter(taps, order, rng):
+    """
+    Build the circuit of :func:`gen_fir` (``order == 0``) or of :func:`gen_iir`.
+    """
+    nodes = ['h'] + [f'm{i}' for i in range(taps)] + [f'a{i}' for i in range(taps)]
+    nodes += [f'f{j}' for j in range(1, order + 1)] + [f'c{j}' for j in range(1, order + 1)]
+    m, a, f, c = 1, 1 + taps, 1 + 2 * taps, 1 + 2 * taps + order
+    mul, add = _operators(taps, rng)
+    fmul, fadd = _operators(order, rng)
+    delay = np.concatenate([[0], mul, add, fmul, fadd])
+    i, j = np.arange(taps), np.arange(order)
+    chain_src, chain_dst = _chain(a, taps)
+    fchain_src, fchain_dst = _chain(c, order)
+    src = [np.zeros(taps, dtype=np.int64), m + i, chain_dst, [a],
+           np.full(order, a), f + j, fchain_dst, [c] * min(order, 1)]
+    dst = [m + i, a + i, chain_src, [0],
+           f + j, c + j, fchain_src, [a] * min(order, 1)]
+    weight = [i + 1, np.zeros(taps), np.zeros(taps - 1), [0],
+              j + 1, np.zeros(order), np.zeros(max(order - 1, 0)), [0] * min(order, 1)]
+    src, dst, weight = (np.concatenate(x).astype(np.int64) for x in (src, dst, weight))
+    return Circuit(nodes, delay, src, dst, weight, multigraph=False)
+
+
+def gen_fir(taps, save=False, seed=None, output='nx', binary=False):
+    """
+    Generate a direct-form FIR filter with ``taps`` taps: the host broadcasts the input samples, delayed by a growing
+    number of registers, to the multipliers ``m<i>``, whose products are summed by the chain of adders ``a<i>``, the
+    first of which returns the output to the host. Before retiming, the clock period is the delay of a multiplier plus
+    the one of the whole adder chain.
+
+    +------------------+----------------+
+    | Time complexity  | :math:`O(V)`   |
+    +------------------+----------------+
+    | Space complexity | :math:`O(V)`   |
+    +------------------+----------------+
+
+    :param taps: The number of taps.
+    :param save: If different from ``None`` or ``False``, the path where to save the generated graph.
+    :param seed: The seed of the :class:`numpy.random.Generator` (or the generator itself), ``None`` for a fresh one.
+    :param output: ``'nx'`` to return a NetworkX DiGraph, ``'circuit'`` to return a :class:`circuit.Circuit`.
+    :param binary: Whether to save the graph in the binary format of :mod:`storage` rather than in DOT.
+    :return: The generated graph.
+    """
+    assert taps >= 1, 'taps should be greater than or equal to 1'
+    rng = np.random.default_rng(seed)
+    return _emit(_filter(taps, 0, rng), save, output, binary)
+
+
+def gen_iir(order, save=False, seed=None, output='nx', binary=False):
+    """
+    Generate a direct-form I IIR filter of the given order: the feedforward section is the FIR filter of
+    :func:`gen_fir` with ``order + 1`` taps, and the output adder ``a0`` is fed back, through ``j`` registers, to the
+    multipliers ``f<j>`` (for :math:`1 \le j \le order`), whose products are summed by the chain of adders ``c<j>``
+    into ``a0``. Every feedback loop holds at least one register, and limits the clock period reachable by retiming.
+
+    +------------------+----------------+
+    | Time complexity  | :math:`O(V)`   |
+    +------------------+----------------+
+    | Space complexity | :math:`O(V)`   |
+    +------------------+----------------+
+
+    :param order: The order of the filter.
+    :param save: If different from ``None`` or ``False``, the path where to save the generated graph.
+    :param seed: The seed of the :class:`numpy.random.Generator` (or the generator itself), ``None`` for a fresh one.
+    :param output: ``'nx'`` to return a NetworkX DiGraph, ``'circuit'`` to return a :class:`circuit.Circuit`.
+    :param binary: Whether to save the graph in the binary format of :mod:`storage` rather than in DOT.
+    :return: The generated graph.
+    """
+    assert order >= 1, 'order should be greater than or equal to 1'
+    rng = np.random.default_rng(seed)
+    return _emit(_filter(order + 1, order, rng), save, output, binary)
+
+
+def gen_systolic(rows, cols, registers=0.5, save=False, seed=None, output='nx', binary=False):
+    """
+    Generate a ``rows`` by ``cols`` systolic array of processing elements ``pe<r>_<c>`` (with delays between 3 and 7),
+    each one passing its operands to its right and bottom neighbors. The host feeds the first row and the first column
+    through a register and collects the results of the last row and of the last column. Every link between processing
+    elements holds a register with probability ``registers``: with 1 the array is fully systolic, with 0 it is purely
+    combinational.
+
+    +------------------+----------------+
+    | Time complexity  | :math:`O(V)`   |
+    +------------------+----------------+
+    | Space complexity | :math:`O(V)`   |
+    +------------------+----------------+
+
+    :param rows: The number of rows.
+    :param cols: The number of columns.
+    :param registers: The probability of a register on a link between processing elements.
+    :param save: If different from ``None`` or ``False``, the path where to save the generated graph.
+    :param seed: The seed of the :class:`numpy.random.Generator` (or the generator itself), ``None`` for a fresh one.
+    :param output: ``'nx'`` to return a NetworkX DiGraph, ``'circuit'`` to return a :class:`circuit.Circuit`.
+    :param binary: Whether to save the graph in the binary format of :mod:`storage` rather than in DOT.
+    :return: The generated graph.
+    """
+    assert rows >= 1 and cols >= 1, 'rows and cols should be greater than or equal to 1'
+    rng = np.random.default_rng(seed)
+    nodes = ['h'] + [f'pe{r}_{c}' for r in range(rows) for c in range(cols)]
+    delay = np.concatenate([[0], rng.integers(3, 8, rows * cols)])
+    pe = 1 + np.arange(rows * cols).reshape(rows, cols)
+    right_src, right_dst = pe[:, :-1].ravel(), pe[:, 1:].ravel()
+    down_src, down_dst = pe[:-1, :].ravel(), pe[1:, :].ravel()
+    inner = right_src.size + down_src.size
+    inputs = np.union1d(pe[:, 0], pe[0, :])
+    outputs = np.union1d(pe[:, -1], pe[-1, :])
+    src = np.concatenate([right_src, down_src, np.zeros(inputs.size, dtype=np.int64), outputs])
+    dst = np.concatenate([right_dst, down_dst, inputs, np.zeros(outputs.size, dtype=np.int64)])
+    weight = np.concatenate([rng.random(inner) < registers, np.ones(inputs.size), np.zeros(outputs.size)])
+    return _emit(Circuit(nodes, delay, src, dst, weight, multigraph=False), save, output, binary)
+
+
+def gen_fsm(states, fanin=3, ports=None, save=False, seed=None, output='nx', binary=False):
+    """
+    Generate a feedback-heavy state machine: the next-state logic blocks ``s<i>`` (with delays between 1 and 9) each
+    take ``fanin`` inputs drawn uniformly among the other blocks, so that about half of the edges close a feedback
+    loop. The edges going backwards in a random order of the blocks are the state registers (one or two registers
+    each), the other ones are combinational, so every loop holds a register. The host drives ``ports`` random blocks
+    through a register and reads ``ports`` other random blocks.
+
+    +------------------+----------------------------------------------+
+    | Time complexity  | :math:`O(V \cdot fanin \log(V \cdot fanin))` |
+    +------------------+----------------------------------------------+
+    | Space complexity | :math:`O(V \cdot fanin)`                     |
+    +------------------+----------------------------------------------+
+
+    :param states: The number of next-state logic blocks.
+    :param fanin: The number of inputs of every block (duplicates are merged).
+    :param ports: The number of inputs and of outputs (by default one for every 8 blocks).
     :param save: If different from ``None`` or ``False``, the path where to save the generated graph.
+    :param seed: The seed of the :class:`numpy.random.Generator` (or the generator itself), ``None`` for a fresh one.
+    :param output: ``'nx'`` to return a NetworkX DiGraph, ``'circuit'`` to return a :class:`circuit.Circuit`.
+    :param binary: Whether to save the graph in the binary format of :mod:`storage` rather than in DOT.
     :return: The generated graph.
     """
-    while True:
-        g = nx.gnm_random_graph(V, E, directed=True)
-        for v in g.nodes:
-            g.nodes[v]['weight'] = np.random.randint(1, 10)
-        g.nodes[0]['weight'] = 0
-        for e in g.edges:
-            g.edges[e]['weight'] = np.random.randint(10)
-        if check_if_synchronous_circuit(g):
-            if save:
-                save_graph(g, save)
-            return g
+    assert states >= 2, 'states should be greater than or equal to 2'
+    rng = np.random.default_rng(seed)
+    ports = max(1, states // 8) if ports is None else ports
+    nodes = ['h'] + [f's{i}' for i in range(states)]
+    delay = np.concatenate([[0], rng.integers(1, 10, states)])
+    dst = np.repeat(np.arange(states), fanin)
+    src = rng.integers(0, states - 1, dst.size)
+    src += src >= dst
+    pair = np.unique(src * states + dst)
+    src, dst = np.divmod(pair, states)
+    order = rng.permutation(states)
+    weight = np.where(order[src] > order[dst], rng.integers(1, 3, src.size), 0)
+    inputs = rng.choice(states, ports, replace=False) + 1
+    outputs = rng.choice(states, ports, replace=False) + 1
+    src = np.concatenate([src + 1, np.zeros(ports, dtype=np.int64), outputs])
+    dst = np.concatenate([dst + 1, inputs, np.zeros(ports, dtype=np.int64)])
+    weight = np.concatenate([weight, np.ones(ports, dtype=np.int64), np.zeros(ports, dtype=np.int64)])
+    return _emit(Circuit(nodes, delay, src, dst, weight, multigraph=False), save, output, binary)
@@ -1,66 +1,28 @@
 #!/usr/bin/env python3
 
 from argparse import ArgumentParser
-from big_o import big_o
+import json
+import sys
 import numpy as np
-from tqdm import trange
-from algos import cp, wd, opt1, feas, opt2
+from algos import cp, feasibility_frontier, opt1, opt2
+from batch import ALGORITHMS, collect_files, run_batch
+from bench import BENCHMARKS, FAMILIES, compare, load_report, run_benchmarks, save_report
+from bounded import opt_bounded
+from cache import WDCache
 from generators import gen_random_circuit
+from profiling import profiling
+from scc import opt_scc
 from utils import load_graph, save_graph
 
 
-def check_time_complexity():
-    MIN_N = 10
-    MAX_N = 100
-    N_MEASURES = 46
-    N_TIMINGS = 3
-
-    def gen_random_circuit_nodes(n):
-        n_edges = round(n / 8 * 11)
-        # print(f'Generating circuit with {n} vertices and {n_edges} edges...')
-        return gen_random_circuit(n, n_edges)
-
-    def gen_random_circuit_edges(n):
-        n_nodes = round(n / 11 * 8)
-        # print(f'Generating circuit with {n_nodes} vertices and {n} edges...')
-        return gen_random_circuit(n_nodes, n)
-
-    print('Algorithm CP  -  Expected O(E)')
-    best, _ = big_o(cp, gen_random_circuit_edges,
-                    min_n=MIN_N, max_n=MAX_N,
-                    n_measures=N_MEASURES, n_timings=N_TIMINGS)
-    print(best, end='\n\n')
-
-    print('Algorithm WD  -  Expected O(V^3)')
-    best, _ = big_o(wd, gen_random_circuit_nodes,
-                    min_n=MIN_N, max_n=MAX_N,
-                    n_measures=N_MEASURES, n_timings=N_TIMINGS)
-    print(best, end='\n\n')
-
-    print('Algorithm OPT1  -  Expected O(V^3 log V)')
-    best, _ = big_o(opt1, gen_random_circuit_nodes,
-                    min_n=MIN_N, max_n=MAX_N,
-                    n_measures=N_MEASURES, n_timings=N_TIMINGS)
-    print(best, end='\n\n')
-
-    print('Algorithm FEAS  -  Expected O(VE)')
-    best, _ = big_o(lambda g: feas(g, np.inf), gen_random_circuit_nodes,
-                    min_n=MIN_N, max_n=MAX_N,
-                    n_measures=N_MEASURES, n_timings=N_TIMINGS)
-    print('NODES:', best)
-    best, _ = big_o(lambda g: feas(g, np.inf), gen_random_circuit_edges,
-                    min_n=MIN_N, max_n=MAX_N,
-                    n_measures=N_MEASURES, n_timings=N_TIMINGS)
-    print('EDGES:', best, end='\n\n')
-
-    print('Algorithm OPT2  -  Expected O(VE log V)')
-    best, _ = big_o(opt2, gen_random_circuit_nodes,
-                    min_n=MIN_N, max_n=MAX_N,
-                    n_measures=N_MEASURES, n_timings=N_TIMINGS)
-    print(best, end='\n\n')
+def print_benchmark(r):
+    phases = ', '.join(f'{k} {t:.4f} s' for k, t in r['phases'].items())
+    print(f'{r["benchmark"]:>5s} {r["family"]:>10s} V={r["nodes"]:<7d} E={r["edges"]:<7d} {r["time"]:.4f} s  '
+          f'peak RSS {r["peak_rss"] / 2**20:.1f} MiB  ({phases})')
 
 
 def random_test(n=10000):
+    from tqdm import trange
     for _ in trange(n):
         V = np.random.randint(5, 30)
         E = np.random.randint(5, 30)
@@ -71,46 +33,256 @@ def random_test(n=10000):
         assert cpr1 == cpr2 and cpr1 <= cpg and cpr2 <= cpg
 
 
-def run(g, save=None, show_wd=False):
+def print_memory_stats(stats):
+    print(f'Peak memory: {stats["peak_buffered"] / 2**20:.1f} MiB buffered out of a budget of '
+          f'{stats["memory_budget"] / 2**20:.1f} MiB')
+
+
+def print_cache_stats(cache):
+    stats = cache.stats()
+    print(f'W/D cache: {stats["hits"]} hits, {stats["misses"]} misses, {stats["evictions"]} evictions, '
+          f'{stats["entries"]} entries taking {stats["bytes"] / 2**20:.1f} MiB '
+          f'out of {stats["max_bytes"] / 2**20:.1f} MiB')
+
+
+def print_scc_stats(stats):
+    print(f'{stats["components"]} strongly connected components, {stats["nontrivial"]} of which with more than one '
+          f'vertex, the largest one with {stats["largest"]} vertices')
+
+
+def retime_with(g, algorithm, memory_budget=None, scc=False, **kwargs):
+    """
+    Run OPT1 or OPT2 on a graph, printing the statistics of the variant used.
+
+    :return: The retimed graph.
+    """
+    print(f'Running algorithm {algorithm.upper()}')
+    if memory_budget is not None:
+        gr, stats = opt_bounded(g, algorithm, memory_budget, return_stats=True)
+        print_memory_stats(stats)
+    elif scc:
+        gr, stats = opt_scc(g, algorithm, wd_method=kwargs['wd_method'], return_stats=True)
+        print_scc_stats(stats)
+    else:
+        gr = ALGORITHMS[algorithm](g, view=True, **kwargs)
+    return gr
+
+
+def run(g, save=None, show_wd=False, wd_method='floyd-warshall', memory_budget=None, cache=None, profile=False,
+        profile_json=None, search_processes=1, scc=False, sweep=False, frontier=False):
     cpg = cp(g)
     print(f'The original graph has a clock period of {cpg}')
-    print('Running algorithm OPT1')
-    g1 = opt1(g, show_wd=show_wd)
-    if save is not None:
-        path = save+'_opt1.dot'
-        save_graph(g1, path)
-        print(f'Output graph saved to {path}')
-    cpr1 = cp(g1)
-    print(f'The graph returned by OPT1 has a clock period of {cpr1}')
-    print('Running algorithm OPT2')
-    g2 = opt2(g, show_wd=show_wd)
-    if save is not None:
-        path = save+'_opt2.dot'
-        save_graph(g2, path)
-        print(f'Output graph saved to {path}')
-    cpr2 = cp(g2)
-    print(f'The graph returned by OPT2 has a clock period of {cpr2}')
+    if frontier:
+        periods = feasibility_frontier(g, wd_method=wd_method, cache=cache)
+        print(f'The clock periods achievable by retiming are {", ".join(map(str, periods))}')
+    profiles = {}
+    for algorithm in ['opt1', 'opt2']:
+        kwargs = {'sweep': sweep} if algorithm == 'opt1' else {}
+        with profiling() as profiles[algorithm]:
+            gr = retime_with(g, algorithm, memory_budget=memory_budget, scc=scc, show_wd=show_wd,
+                             wd_method=wd_method, cache=cache, search_processes=search_processes, **kwargs)
+        if save is not None:
+            path = f'{save}_{algorithm}.dot'
+            save_graph(gr, path)
+            print(f'Output graph saved to {path}')
+        print(f'The graph returned by {algorithm.upper()} has a clock period of {cp(gr)}')
+    if cache is not None:
+        print_cache_stats(cache)
+    if profile:
+        for name, p in profiles.items():
+            p.print(f'Profile of {name.upper()}')
+    if profile_json is not None:
+        with open(profile_json, 'w') as f:
+            json.dump({name: p.as_dict() for name, p in profiles.items()}, f, indent=2)
+        print(f'Profiles saved to {profile_json}')
 
 
-if __name__ == '__main__':
+def _run_options(args):
+    return {
+        'save': args.output,
+        'show_wd': args.show_wd,
+        'wd_method': args.wd_method,
+        'memory_budget': int(args.memory_budget * 2**20) if args.memory_budget is not None else None,
+        'cache': _cache(args),
+        'profile': args.profile,
+        'profile_json': args.profile_json,
+        'search_processes': args.search_jobs,
+        'scc': args.scc,
+        'sweep': args.sweep,
+        'frontier': args.frontier,
+    }
+
+
+def check_options(parser, args):
+    """
+    Reject the options that the memory-bounded and the per-component versions of OPT1 and OPT2 would ignore.
+    """
+    if 'command' not in args or args.command not in (random_command, file_command, batch_command):
+        return
+    variants = {'--memory-budget': args.memory_budget is not None, '--scc': args.scc}
+    options = {'--show-wd': args.show_wd, '--cache': args.cache is not None, '--search-jobs': args.search_jobs != 1,
+               '--sweep': args.sweep}
+    variants = [flag for flag, used in variants.items() if used]
+    options = [flag for flag, used in options.items() if used]
+    if len(variants) > 1 or (variants and options):
+        parser.error(f'{variants[0]} cannot be combined with {", ".join(variants[1:] + options)}')
+
+
+def _cache(args):
+    return WDCache(args.cache, int(args.cache_size * 2**20)) if args.cache is not None else None
+
+
+def random_command(args):
+    print(f'Generating random graph with {args.nodes} nodes and {args.edges} edges')
+    run(gen_random_circuit(args.nodes, args.edges, seed=args.seed), **_run_options(args))
+
+
+def file_command(args):
+    print(f'Loading graph from {args.file}')
+    run(load_graph(args.file), **_run_options(args))
+
+
+def batch_command(args):
+    files = collect_files(args.inputs)
+    memory_budget = int(args.memory_budget * 2**20) if args.memory_budget is not None else None
+    errors = run_batch(files, output=args.results, algorithms=args.algorithms, processes=args.jobs,
+                       wd_method=args.wd_method, memory_budget=memory_budget, cache=_cache(args), scc=args.scc)
+    if errors > 0:
+        print(f'ERROR: {errors} out of {len(files)} circuits could not be retimed', file=sys.stderr)
+        sys.exit(1)
+
+
+def serve_command(args):
+    from service import serve
+    serve(args.socket, port=args.port, processes=args.jobs, queue_size=args.queue_size,
+          max_bytes=int(args.wd_memory * 2**20), wd_method=args.wd_method, max_request=int(args.max_request * 2**20),
+          ready=lambda address: print(f'Listening on {address}', file=sys.stderr))
+
+
+def submit_command(args):
+    from service import job_from_file, submit
+    jobs = [job_from_file(f, algorithm=args.algorithm, period=args.period, id=f) for f in args.circuits]
+    errors = 0
+    for event in submit(jobs, args.socket, port=args.port):
+        errors += event['event'] == 'error'
+        print(json.dumps(event), flush=True)
+    if errors > 0:
+        sys.exit(1)
+
+
+def bench_command(args):
+    report = run_benchmarks(args.benchmarks, args.families, args.sizes, args.repeat, args.seed, args.fit,
+                            log=print_benchmark, startup=args.startup)
+    if args.fit:
+        for name, fit in report['fits'].items():
+            print(f'{name}: {fit}')
+    if args.report is not None:
+        save_report(report, args.report)
+    if args.history is not None:
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(report) + '\n')
+    if args.baseline is not None:
+        regressions = compare(report, load_report(args.baseline), args.threshold)
+        for r in regressions:
+            print(f'REGRESSION: {r["benchmark"]} on {r["family"]} with {r["size"]} vertices took {r["time"]:.4f} s '
+                  f'instead of {r["baseline"]:.4f} s ({r["ratio"]:.2f}x)', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+def build_parser():
     parser = ArgumentParser()
     parser.add_argument('--output', '-o', help='File where to save the output graphs (please omit the extension, it '
                                                'will be added automatically')
     parser.add_argument('--show-wd', action='store_true', help='Show matrices W and D')
+    parser.add_argument('--wd-method', choices=['floyd-warshall', 'johnson'], default='floyd-warshall',
+                        help='The engine used to compute matrices W and D (default floyd-warshall)')
+    parser.add_argument('--memory-budget', type=float, help='Run the memory-bounded versions of OPT1 and OPT2, which '
+                                                            'never store matrices W and D, with the given budget (MiB)')
+    parser.add_argument('--search-jobs', type=int, default=1, help='The number of clock periods probed in parallel by '
+                                                                   'each round of the search of OPT1 and OPT2 '
+                                                                   '(default 1, i.e. a sequential binary search)')
+    parser.add_argument('--profile', action='store_true', help='Profile OPT1 and OPT2, printing the time spent in each '
+                                                               'phase, the counters and the peak memory')
+    parser.add_argument('--profile-json', help='The JSON file where to save the profiles of OPT1 and OPT2')
+    parser.add_argument('--sweep', action='store_true', help='Probe the clock periods in OPT1 with a single '
+                                                             'incremental solver of the constraints')
+    parser.add_argument('--frontier', action='store_true', help='Print all the clock periods achievable by retiming')
+    parser.add_argument('--scc', action='store_true', help='Retime each strongly connected component on its own, '
+                                                           'in parallel, which gives the same clock period at a '
+                                                           'fraction of the cost when the circuit has many of them')
+    parser.add_argument('--cache', help='A directory where to cache matrices W and D across runs')
+    parser.add_argument('--cache-size', type=float, default=1024, help='The maximum size of the cache, beyond which '
+                                                                       'the least recently used entries are evicted '
+                                                                       '(MiB, default 1024)')
     subparsers = parser.add_subparsers()
     parser_random = subparsers.add_parser('random', help='Run the algorithms on a random graph')
+    parser_random.set_defaults(command=random_command)
     parser_random.add_argument('--nodes', '-n', type=int, default=8, help='The number of nodes (default 8)')
     parser_random.add_argument('--edges', '-e', type=int, default=11, help='The number of edges (default 11)')
+    parser_random.add_argument('--seed', type=int, help='The seed of the random graph')
     parser_file = subparsers.add_parser('file', help='Run the algorithms on a graph loaded from a provided DOT file')
+    parser_file.set_defaults(command=file_command)
     parser_file.add_argument('file', help='The DOT file from which the graph is loaded')
+    parser_batch = subparsers.add_parser('batch', help='Run the algorithms on many DOT files across a pool of worker '
+                                                       'processes, writing one JSON Lines record per file')
+    parser_batch.set_defaults(command=batch_command)
+    parser_batch.add_argument('inputs', nargs='+', help='Directories (all their DOT files are used) or glob patterns')
+    parser_batch.add_argument('--algorithms', '-a', nargs='+', choices=['opt1', 'opt2'], default=['opt1', 'opt2'],
+                              help='The algorithms to run (default opt1 opt2)')
+    parser_batch.add_argument('--jobs', '-j', type=int, help='The number of worker processes (default one per core)')
+    parser_batch.add_argument('--results', '-r', help='The JSON Lines file where to write the results (default '
+                                                      'standard output)')
+    parser_serve = subparsers.add_parser('serve', help='Run a retiming server, which queues the circuits submitted to '
+                                                       'it onto a pool of worker processes and keeps matrices W and D '
+                                                       'of the recent ones in memory')
+    parser_serve.set_defaults(command=serve_command)
+    parser_serve.add_argument('--socket', help='The Unix socket to listen on (default a TCP port on localhost)')
+    parser_serve.add_argument('--port', type=int, default=8421, help='The TCP port to listen on (default 8421)')
+    parser_serve.add_argument('--jobs', '-j', type=int, help='The number of worker processes (default one per core)')
+    parser_serve.add_argument('--queue-size', type=int, default=64, help='The maximum number of waiting circuits, '
+                                                                         'beyond which new ones are rejected '
+                                                                         '(default 64)')
+    parser_serve.add_argument('--wd-memory', type=float, default=256, help='The memory taken by the matrices W and D '
+                                                                           'kept for reuse (MiB, default 256)')
+    parser_serve.add_argument('--max-request', type=float, default=64, help='The maximum size of a submitted '
+                                                                            'circuit (MiB, default 64)')
+    parser_submit = subparsers.add_parser('submit', help='Submit DOT or binary circuit files to a retiming server, '
+                                                         'printing its progress and results as JSON Lines')
+    parser_submit.set_defaults(command=submit_command)
+    parser_submit.add_argument('circuits', nargs='+', help='The circuit files')
+    parser_submit.add_argument('--algorithm', '-a', choices=['opt1', 'opt2'], default='opt2',
+                               help='The algorithm to run (default opt2)')
+    parser_submit.add_argument('--period', '-c', type=int, help='A target clock period to be checked with FEAS '
+                                                                'instead of running an algorithm')
+    parser_submit.add_argument('--socket', help='The Unix socket of the server (default a TCP port on localhost)')
+    parser_submit.add_argument('--port', type=int, default=8421, help='The TCP port of the server (default 8421)')
+    parser_bench = subparsers.add_parser('bench', help='Run the benchmark suite on seeded circuit families')
+    parser_bench.set_defaults(command=bench_command)
+    parser_bench.add_argument('--benchmarks', '-b', nargs='+', choices=list(BENCHMARKS),
+                              help='The benchmarks to run (default all)')
+    parser_bench.add_argument('--families', '-f', nargs='+', choices=list(FAMILIES), default=['random'],
+                              help='The circuit families (default random)')
+    parser_bench.add_argument('--sizes', '-s', nargs='+', type=int, help='The numbers of vertices (default depending '
+                                                                         'on the benchmark)')
+    parser_bench.add_argument('--repeat', type=int, default=3, help='How many times each case is timed (default 3)')
+    parser_bench.add_argument('--seed', type=int, default=0, help='The seed of the random circuits (default 0)')
+    parser_bench.add_argument('--startup', action='store_true', help='Time the cold start of the core and of the '
+                                                                     'command-line interface as well')
+    parser_bench.add_argument('--fit', action='store_true', help='Fit the complexity class of each benchmark')
+    parser_bench.add_argument('--report', help='The JSON file where to save the report')
+    parser_bench.add_argument('--history', help='A JSON Lines file to which the report is appended')
+    parser_bench.add_argument('--baseline', help='A previous report to compare against')
+    parser_bench.add_argument('--threshold', type=float, default=0.2, help='The relative slowdown flagged as a '
+                                                                           'regression (default 0.2)')
+    return parser
+
+
+if __name__ == '__main__':
+    parser = build_parser()
     args = parser.parse_args()
-    if 'nodes' in args and 'edges' in args:
-        print(f'Generating random graph with {args.nodes} nodes and {args.edges} edges')
-        g = gen_random_circuit(args.nodes, args.edges)
-        run(g, save=args.output, show_wd=args.show_wd)
-    elif 'file' in args:
-        print(f'Loading graph from {args.file}')
-        g = load_graph(args.file)
-        run(g, save=args.output, show_wd=args.show_wd)
+    check_options(parser, args)
+    if 'command' in args:
+        args.command(args)
     else:
         print('ERROR: unrecognized argument')
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappop, heappush
+import os
+import numpy as np
+from profiling import timed
+from shared import SharedArrays, shared_memory
+
+INF = np.iinfo(np.int64).max // 4
+
+
+def _scale(c, factor=1):
+    """
+    Compute the multiplier used to pack the ordered pair :math:`(w, -d)` into a single ``int64`` key
+    :math:`w \cdot M - d`, which preserves the lexicographic ordering as long as :math:`M` exceeds the total delay.
+
+    :param c: A :class:`circuit.Circuit`.
+    :param factor: How many times the total delay should fit into :math:`M`.
+    :return: The multiplier :math:`M`.
+    """
+    total_delay = int(c.delay.astype(np.int64).sum())
+    total_weight = int(c.weight.astype(np.int64).sum())
+    scale = factor * total_delay + 1
+    if (total_weight + 1) * scale >= INF // 2:
+        raise OverflowError('The circuit is too large to pack (w, -d) into an int64 key')
+    return scale
+
+
+def _unpack(c, key, scale):
+    """
+    Recover :math:`W(u, v)` and :math:`D(u, v)` from the packed shortest-path keys.
+
+    :param c: A :class:`circuit.Circuit`.
+    :param key: The packed keys, with ``INF`` for unreachable pairs. The last axis is indexed by the destination.
+    :param scale: The multiplier returned by :func:`_scale`.
+    :return: ``W``, ``D`` and the reachability mask.
+    """
+    # Adding the (possibly negative) key of a real path to INF yields values slightly below INF, but :func:`_scale`
+    # guarantees that the keys of real paths stay below INF / 2.
+    reach = key < INF // 2
+    key = np.where(reach, key, 0)
+    W = -(-key // scale)
+    D = c.delay.astype(np.int64) - (key - W * scale)
+    W[~reach] = 0
+    D[~reach] = 0
+    return W, D, reach
+
+
+def _min_plus(a, b, out, chunk):
+    """
+    Compute :math:`out \leftarrow \min(out, a \otimes b)`, where :math:`\otimes` is the min-plus matrix product.
+
+    :param a: A matrix of shape ``(m, k)``.
+    :param b: A matrix of shape ``(k, n)``.
+    :param out: A matrix of shape ``(m, n)``, updated in place.
+    :param chunk: The number of rows of ``a`` processed at once, bounding the temporary memory.
+    """
+    for i in range(0, a.shape[0], chunk):
+        t = a[i:i+chunk, :, None] + b[None, :, :]
+        np.minimum(out[i:i+chunk], t.min(axis=1), out=out[i:i+chunk])
+
+
+def wd_dense(c, block=16, max_temp=1 << 20):
+    """
+    Compute matrices :math:`W` and :math:`D` with a blocked min-plus Floyd-Warshall over dense NumPy matrices.
+
+    Each edge :math:`u \\xrightarrow{e} v` is weighted with the ordered pair :math:`(w(e), -d(u))` packed into one
+    ``int64`` key, so that component-wise sums and lexicographic comparisons become plain integer operations.
+
+    +------------------+----------------+
+    | Time complexity  | :math:`O(V^3)` |
+    +------------------+----------------+
+    | Space complexity | :math:`O(V^2)` |
+    +------------------+----------------+
+
+    :param c: A :class:`circuit.Circuit`.
+    :param block: The size of the diagonal blocks.
+    :param max_temp: The maximum number of elements of the temporary tensors used by the min-plus products.
+    :return: ``W`` and ``D`` as dense ``int64`` arrays indexed by vertex indices, and the boolean reachability mask
+        (``reach[u, v]`` is ``True`` iff :math:`u` is connected to :math:`v`).
+    """
+    n = c.number_of_nodes()
+    scale = _scale(c)
+
+    # STEP 1
+    # Weight each edge (u,?) in E with the ordered pair (w(e), -d(u)), packed into a single key.
+    key = np.full((n, n), INF, dtype=np.int64)
+    np.minimum.at(key, (c.src, c.dst), c.weight.astype(np.int64) * scale - c.delay[c.src])
+    np.fill_diagonal(key, 0)
+
+    # STEP 2
+    # Blocked Floyd-Warshall: close the diagonal block, then relax the row and column panels through it, and finally
+    # update the whole matrix with a min-plus product of the two panels.
+    for k0 in range(0, n, block):
+        k1 = min(k0 + block, n)
+        diagonal = key[k0:k1, k0:k1]
+        for k in range(k1 - k0):
+            np.minimum(diagonal, diagonal[:, k, None] + diagonal[None, k, :], out=diagonal)
+        chunk = max(1, max_temp // ((k1 - k0) * n))
+        rows = key[k0:k1, :].copy()
+        _min_plus(diagonal.copy(), rows, key[k0:k1, :], chunk)
+        cols = key[:, k0:k1].copy()
+        _min_plus(cols, diagonal.copy(), key[:, k0:k1], chunk)
+        _min_plus(key[:, k0:k1].copy(), key[k0:k1, :].copy(), key, chunk)
+
+    # STEP 3
+    # For each shortest path weight (x, y) between two vertices u and v, set W(u, v) <- x and D(u, v) <- d(v) - y.
+    return _unpack(c, key, scale)
+
+
+def _potential(c):
+    """
+    Compute the potential used to reweight the second component of the edge weights :math:`(w(e), -d(u))`.
+
+    Register counts are non-negative, so only the edges of :math:`G_0` can have a negative weight, and only in their
+    second component. Setting :math:`p(v) = d(v) - \Delta(v)` makes :math:`-d(u) + p(u) - p(v) \geq 0` on each of them.
+
+    :param c: A :class:`circuit.Circuit`.
+    :return: The ``int64`` array of the potentials.
+    """
+    from algos import _cp
+    return c.delay.astype(np.int64) - _cp(c)
+
+
+def _reweight(c):
+    """
+    Compute the reweighted, non-negative packed keys of the edges.
+
+    :param c: A :class:`circuit.Circuit`.
+    :return: The keys of the edges (in CSR order), the potential and the multiplier.
+    """
+    # The reweighted second component lies in [-2 * d_tot, d_tot], hence the factor 2 in the multiplier: the keys of
+    # the edges with w(e) > 0 stay positive and the lexicographic ordering is preserved.
+    scale = _scale(c, factor=2)
+    p = _potential(c)
+    key = c.weight.astype(np.int64) * scale - c.delay[c.src] + p[c.src] - p[c.dst]
+    return key, p, scale
+
+
+def _dijkstra(s, n, indptr, dst, key):
+    """
+    Single-source shortest paths with non-negative packed keys.
+
+    :return: The row of the distances from ``s``, with ``INF`` for the vertices not connected to ``s``.
+    """
+    dist = {s: 0}
+    heap = [(0, s)]
+    while heap:
+        k, u = heappop(heap)
+        if k > dist[u]:
+            continue
+        for e in range(indptr[u], indptr[u+1]):
+            v = dst[e]
+            x = k + key[e]
+            if x < dist.get(v, INF):
+                dist[v] = x
+                heappush(heap, (x, v))
+    row = np.full(n, INF, dtype=np.int64)
+    row[list(dist.keys())] = list(dist.values())
+    return row
+
+
+_worker = None
+_output = None
+
+
+def _init_worker(c, key, p, output):
+    """
+    Set up the state of a worker of :func:`wd_johnson`: the adjacency lists, the reweighted keys and the potential, and
+    the matrix of the packed keys to be filled in (either an array, the descriptor of a shared one, or ``None`` to send
+    the rows back).
+    """
+    global _worker, _output
+    _worker = (c.number_of_nodes(), c.indptr.tolist(), c.dst.tolist(), key.tolist(), p)
+    _output = output if output is None or isinstance(output, np.ndarray) else SharedArrays.attach(output)['key']
+
+
+def _key_row(s, n, indptr, dst, key, p):
+    """
+    Compute the (original, not reweighted) packed keys of the shortest paths leaving ``s``.
+    """
+    row = _dijkstra(s, n, indptr, dst, key)
+    reach = row < INF
+    row[reach] += p[reach] - p[s]
+    return row
+
+
+def _key_rows(sources):
+    if _output is None:
+        return [_key_row(s, *_worker) for s in sources]
+    for s in sources:
+        _output[s] = _key_row(s, *_worker)
+
+
+def wd_johnson(c, processes=None, chunk=64):
+    """
+    Compute matrices :math:`W` and :math:`D` with one lexicographic Dijkstra per source, after a potential-based
+    reweighting (Johnson's algorithm). The sources are spread across a pool of worker processes, which write the rows
+    of their sources straight into a matrix in shared memory rather than sending them back (unless
+    :mod:`multiprocessing.shared_memory` is missing, before Python 3.8).
+
+    +------------------+----------------------+
+    | Time complexity  | :math:`O(VE \log V)` |
+    +------------------+----------------------+
+    | Space complexity | :math:`O(V^2)`       |
+    +------------------+----------------------+
+
+    :param c: A :class:`circuit.Circuit`.
+    :param processes: The number of worker processes (``None`` for one per core, ``1`` to run in this process).
+    :param chunk: The number of sources handled by each task.
+    :return: ``W`` and ``D`` as dense ``int64`` arrays indexed by vertex indices, and the boolean reachability mask.
+    """
+    n = c.number_of_nodes()
+    key, p, scale = _reweight(c)
+    sources = [list(range(i, min(i + chunk, n))) for i in range(0, n, chunk)]
+    processes = processes or os.cpu_count()
+    if processes == 1 or len(sources) <= 1:
+        rows = np.empty((n, n), dtype=np.int64)
+        _init_worker(c, key, p, rows)
+        for s in sources:
+            _key_rows(s)
+        return _unpack(c, rows, scale)
+    if shared_memory is None:
+        rows = np.empty((n, n), dtype=np.int64)
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(c, key, p, None)) as pool:
+            for s, r in zip(sources, pool.map(_key_rows, sources)):
+                rows[s] = r
+        return _unpack(c, rows, scale)
+    with SharedArrays({'key': np.empty((n, n), dtype=np.int64)}) as rows:
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(c, key, p, rows.descriptor)) as pool:
+            list(pool.map(_key_rows, sources))
+        return _unpack(c, rows['key'], scale)
+
+
+def wd_rows(c, sources=None, reweighted=None):
+    """
+    Generate the rows of matrices :math:`W` and :math:`D` one source at a time, with the same per-source Dijkstra used
+    by :func:`wd_johnson`. Only :math:`O(V + E)` memory is used, whatever the number of rows consumed.
+
+    :param c: A :class:`circuit.Circuit`.
+    :param sources: The indices of the sources (all the vertices by default).
+    :param reweighted: The reweighting of the circuit given by :func:`_reweight`, to be reused when the rows are
+        generated more than once (computed by default).
+    :return: A generator of tuples ``(u, W[u], D[u], reach[u])``.
+    """
+    n = c.number_of_nodes()
+    key, p, scale = reweighted if reweighted is not None else _reweight(c)
+    state = (n, c.indptr.tolist(), c.dst.tolist(), key.tolist(), p)
+    for u in range(n) if sources is None else sources:
+        W, D, reach = _unpack(c, _key_row(u, *state), scale)
+        yield u, W, D, reach
+
+
+METHODS = {
+    'floyd-warshall': wd_dense,
+    'johnson': wd_johnson,
+}
+
+
+@timed('wd')
+def all_pairs_wd(c, method='floyd-warshall', **kwargs):
+    """
+    Compute matrices :math:`W` and :math:`D` with the chosen engine.
+
+    :param c: A :class:`circuit.Circuit`.
+    :param method: Either ``'floyd-warshall'`` (:func:`wd_dense`) or ``'johnson'`` (:func:`wd_johnson`).
+    :param kwargs: Further arguments for the engine.
+    :return: ``W``, ``D`` and the reachability mask.
+    """
+    if method not in METHODS:
+        raise NotImplementedError(f'Unknown WD method {method!r}, choose among {", ".join(METHODS)}')
+    return METHODS[method](c, **kwargs)
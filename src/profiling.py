@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+import json
+import resource
+import time
+
+_profile = None
+_disabled = nullcontext()
+
+
+def _peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Profile:
+    """
+    Phase timings and counters collected while a :func:`profiling` block is active.
+
+    Phases can be nested, in which case the time of the inner phases is included in the one of the outer phases. The
+    peak resident set size of the process is sampled at the end of every phase.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.peak_rss = 0
+        self.start = time.perf_counter()
+        self.total = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            phase = self.phases.setdefault(name, {'time': 0.0, 'calls': 0, 'peak_rss': 0})
+            phase['time'] += elapsed
+            phase['calls'] += 1
+            rss = _peak_rss()
+            phase['peak_rss'] = max(phase['peak_rss'], rss)
+            self.peak_rss = max(self.peak_rss, rss)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self):
+        """
+        :return: A JSON-serializable ``dict`` with the total time, the phases, the counters and the peak resident set
+            size.
+        """
+        total = self.total if self.total is not None else time.perf_counter() - self.start
+        return {
+            'total': total,
+            'phases': self.phases,
+            'counters': self.counters,
+            'peak_rss': self.peak_rss,
+        }
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def print(self, title=None):
+        d = self.as_dict()
+        if title is not None:
+            print(title)
+        print(f'  total {d["total"]:.4f} s, peak RSS {d["peak_rss"] / 2**20:.1f} MiB')
+        for name, p in sorted(d['phases'].items(), key=lambda x: -x[1]['time']):
+            print(f'  {name:<16s} {p["time"]:>10.4f} s  {p["calls"]:>7d} calls')
+        for name, n in sorted(d['counters'].items()):
+            print(f'  {name:<16s} {n:>12d}')
+
+
+@contextmanager
+def profiling():
+    """
+    Collect the phase timings and counters of the instrumented functions called inside the block.
+
+    Profiling is off by default: outside of a ``profiling()`` block, :func:`phase` and :func:`count` only check a
+    global variable.
+
+    :return: A context manager yielding the :class:`Profile`.
+    """
+    global _profile
+    previous = _profile
+    _profile = Profile()
+    try:
+        yield _profile
+    finally:
+        _profile.total = time.perf_counter() - _profile.start
+        _profile = previous
+
+
+def phase(name):
+    """
+    :param name: The name of the phase.
+    :return: A context manager timing its block as a phase of the active profile, if any.
+    """
+    if _profile is None:
+        return _disabled
+    return _profile.phase(name)
+
+
+def count(name, n=1):
+    """
+    Increase a counter of the active profile, if any.
+
+    :param name: The name of the counter.
+    :param n: The increment.
+    """
+    if _profile is not None:
+        _profile.count(name, n)
+
+
+def timed(name):
+    """
+    Decorator timing every call of a function as a phase of the active profile, if any.
+
+    :param name: The name of the phase.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if _profile is None:
+                return f(*args, **kwargs)
+            with _profile.phase(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
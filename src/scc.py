@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
+from algos import _as_output, opt1, opt2, retime
+from circuit import Circuit, as_circuit
+from profiling import timed
+
+ALGORITHMS = {
+    'opt1': opt1,
+    'opt2': opt2,
+}
+
+
+@timed('scc')
+def strongly_connected_components(c):
+    """
+    Find the strongly connected components of a circuit with Tarjan's algorithm, run iteratively over the CSR arrays.
+
+    +------------------+------------------+
+    | Time complexity  | :math:`O(V + E)` |
+    +------------------+------------------+
+    | Space complexity | :math:`O(V)`     |
+    +------------------+------------------+
+
+    :param c: A :class:`circuit.Circuit`.
+    :return: The component of each vertex, as an ``int64`` array, with the components numbered in a topological order
+        of the condensation (every edge joining two components goes from a lower to a higher number), and the number of
+        components.
+    """
+    n = c.number_of_nodes()
+    indptr = c.indptr.tolist()
+    dst = c.dst.tolist()
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack = []
+    labels = [0] * n
+    counter = 0
+    count = 0
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [[root, indptr[root]]]
+        while work:
+            frame = work[-1]
+            v, i = frame
+            if i < indptr[v + 1]:
+                frame[1] += 1
+                u = dst[i]
+                if index[u] == -1:
+                    index[u] = low[u] = counter
+                    counter += 1
+                    stack.append(u)
+                    on_stack[u] = True
+                    work.append([u, indptr[u]])
+                elif on_stack[u] and index[u] < low[v]:
+                    low[v] = index[u]
+                continue
+            work.pop()
+            if work and low[v] < low[work[-1][0]]:
+                low[work[-1][0]] = low[v]
+            if low[v] == index[v]:
+                while True:
+                    u = stack.pop()
+                    on_stack[u] = False
+                    labels[u] = count
+                    if u == v:
+                        break
+                count += 1
+    # Tarjan's algorithm completes the components in reverse topological order.
+    return count - 1 - np.array(labels, dtype=np.int64), count
+
+
+def split_components(c, labels, count):
+    """
+    Split a circuit into the subcircuits induced by its strongly connected components.
+
+    :param c: A :class:`circuit.Circuit`.
+    :param labels: The component of each vertex.
+    :param count: The number of components.
+    :return: The vertices of each component (as arrays of indices of ``c``) and the corresponding
+        :class:`circuit.Circuit`.
+    """
+    order = np.argsort(labels, kind='stable')
+    bounds = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=count), out=bounds[1:])
+    position = np.empty_like(order)
+    position[order] = np.arange(order.size) - bounds[labels[order]]
+    internal = np.flatnonzero(labels[c.src] == labels[c.dst])
+    internal = internal[np.argsort(labels[c.src[internal]], kind='stable')]
+    edge_bounds = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels[c.src[internal]], minlength=count), out=edge_bounds[1:])
+    members, circuits = [], []
+    for k in range(count):
+        vertices = order[bounds[k]:bounds[k + 1]]
+        edges = internal[edge_bounds[k]:edge_bounds[k + 1]]
+        keys = [c.keys[e] for e in edges] if c.keys is not None else None
+        members.append(vertices)
+        circuits.append(Circuit([c.nodes[v] for v in vertices], c.delay[vertices], position[c.src[edges]],
+                                position[c.dst[edges]], c.weight[edges], keys=keys, multigraph=c.multigraph))
+    return members, circuits
+
+
+def _retime_component(args):
+    sub, algorithm, wd_method = args
+    return ALGORITHMS[algorithm](sub, wd_method=wd_method, return_retiming=True)[1]
+
+
+@timed('offsets')
+def component_offsets(c, labels, count, r):
+    """
+    Compute, by a longest-path pass over the condensation, the constant to be added to the retiming of every component
+    so that every edge joining two components ends up with at least one register.
+
+    Adding a constant to the retiming of all the vertices of a component does not change the register counts of its
+    edges, and the condensation is acyclic, so such constants always exist: the edge :math:`e = (u, v)` from component
+    :math:`A` to component :math:`B` needs :math:`K_B - K_A \geq 1 - w(e) - r(v) + r(u)`.
+
+    +------------------+------------------+
+    | Time complexity  | :math:`O(V + E)` |
+    +------------------+------------------+
+    | Space complexity | :math:`O(V + E)` |
+    +------------------+------------------+
+
+    :param c: A :class:`circuit.Circuit`.
+    :param labels: The component of each vertex, numbered in topological order.
+    :param count: The number of components.
+    :param r: The retiming of every component on its own, indexed like ``c``.
+    :return: The ``int64`` array of the constants of the components.
+    """
+    offset = np.zeros(count, dtype=np.int64)
+    src_label, dst_label = labels[c.src], labels[c.dst]
+    cross = np.flatnonzero(src_label != dst_label)
+    cross = cross[np.argsort(src_label[cross], kind='stable')]
+    need = 1 - c.weight[cross].astype(np.int64) - r[c.dst[cross]] + r[c.src[cross]]
+    heads = src_label[cross]
+    tails = dst_label[cross]
+    # The edges are grouped by source component, in topological order: the constant of a component is final when its
+    # outgoing edges are reached, since all of its incoming edges come from earlier components.
+    starts = np.flatnonzero(np.diff(heads, prepend=-1))
+    ends = np.append(starts[1:], heads.size)
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        np.maximum.at(offset, tails[start:end], offset[heads[start]] + need[start:end])
+    return offset
+
+
+def opt_scc(g, algorithm='opt2', processes=None, wd_method='floyd-warshall', return_retiming=False,
+            return_stats=False):
+    """
+    Version of *Algorithms OPT1* and *OPT2* that retimes each strongly connected component on its own, across a pool of
+    worker processes, so that computing matrices :math:`W` and :math:`D` costs :math:`O(\sum_i V_i^3)` rather than
+    :math:`O(V^3)`.
+
+    The result is exact: the edges joining two components lie on no cycle, so the components can be shifted with
+    respect to each other (see :func:`component_offsets`) until every such edge holds a register, which cuts every
+    combinational path between components. The clock period is then the largest of the optimal clock periods of the
+    components, which is also a lower bound for the whole circuit, since a retiming of the circuit restricted to a
+    component is a retiming of the component. Circuits with a host vertex closing every path into a cycle consist of a
+    single component, and are retimed as a whole.
+
+    +------------------+---------------------------------+
+    | Time complexity  | :math:`O(\sum_i V_i^3 + E)`     |
+    +------------------+---------------------------------+
+    | Space complexity | :math:`O(\max_i V_i^2 + V + E)` |
+    +------------------+---------------------------------+
+
+    :param g: A NetworkX (Multi)DiGraph or a :class:`circuit.Circuit` representing a synchronous circuit.
+    :param algorithm: ``'opt1'`` or ``'opt2'``, the algorithm run on each component.
+    :param processes: The number of worker processes (``None`` for one per core, 1 to retime the components in this
+        process).
+    :param wd_method: The engine used by *Algorithm WD*.
+    :param return_retiming: Whether to return the retiming function as well.
+    :param return_stats: Whether to return statistics about the decomposition as well.
+    :return: The retimed graph having the smallest possible clock period, followed, if requested, by the retiming
+        function and by a ``dict`` with the number of components, of non-trivial ones (with more than one vertex) and
+        the number of vertices of the largest one.
+    """
+    if algorithm not in ALGORITHMS:
+        raise NotImplementedError(f'Unknown algorithm {algorithm!r}')
+    c = as_circuit(g)
+    labels, count = strongly_connected_components(c)
+    members, circuits = split_components(c, labels, count)
+    # A single vertex is optimally retimed by the zero retiming, whatever its self-loops.
+    tasks = [k for k in range(count) if len(members[k]) > 1]
+    tasks.sort(key=lambda k: -len(members[k]))
+    args = [(circuits[k], algorithm, wd_method) for k in tasks]
+    processes = processes or os.cpu_count()
+    if processes == 1 or len(tasks) <= 1:
+        results = map(_retime_component, args)
+    else:
+        with ProcessPoolExecutor(min(processes, len(tasks))) as pool:
+            results = list(pool.map(_retime_component, args))
+    r = np.zeros(c.number_of_nodes(), dtype=np.int64)
+    for k, x in zip(tasks, results):
+        r[members[k]] = x
+    r += component_offsets(c, labels, count, r)[labels]
+
+    r = _as_output(g, c, r)
+    result = (retime(g, r),)
+    if return_retiming:
+        result += (r,)
+    if return_stats:
+        result += ({
+            'components': count,
+            'nontrivial': len(tasks),
+            'largest': max((len(m) for m in members), default=0),
+        },)
+    return result if len(result) > 1 else result[0]
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from multiprocessing import get_all_start_methods, get_context
+import asyncio
+import base64
+import json
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+import numpy as np
+from algos import cp, feas, opt1, opt2, retime
+from paths import all_pairs_wd
+from shared import SharedArrays
+from storage import load_binary
+from utils import load_circuit
+
+ALGORITHMS = {
+    'opt1': opt1,
+    'opt2': opt2,
+}
+_TERMINAL = ('result', 'error')
+_FORMATS = ('dot', 'binary')
+
+
+def _load(job):
+    """
+    Load the circuit of a job (run in a worker process).
+
+    :return: The :class:`circuit.Circuit`, a hash of its content, identifying it across submissions, and its clock
+        period.
+    """
+    fd, path = tempfile.mkstemp(suffix='.' + job.get('format', 'dot'))
+    with os.fdopen(fd, 'wb') as f:
+        if job.get('format', 'dot') == 'binary':
+            f.write(base64.b64decode(job['data']))
+        else:
+            f.write(job['data'].encode())
+    try:
+        if job.get('format', 'dot') == 'binary':
+            c, _ = load_binary(path, mmap_mode=None)
+        else:
+            c = load_circuit(path)
+    finally:
+        os.remove(path)
+    h = sha256(json.dumps([c.nodes, c.keys]).encode())
+    for a in (c.delay, c.src, c.dst, c.weight):
+        h.update(np.ascontiguousarray(a).tobytes())
+    return c, h.hexdigest(), int(cp(c))
+
+
+def _wd(c, wd_method):
+    """
+    Compute the matrices :math:`W` and :math:`D` of a circuit (run in a worker process).
+    """
+    return all_pairs_wd(c, wd_method)
+
+
+def _retime(c, algorithm, period, descriptor, wd_method):
+    """
+    Retime a circuit (run in a worker process), either with the given algorithm, using the matrices :math:`W` and
+    :math:`D` shared by the server, or with *Algorithm FEAS* for a target clock period.
+
+    :return: A JSON-serializable ``dict`` with the clock period of the retimed circuit and the retiming, or with
+        ``feasible`` set to ``False`` if the target clock period cannot be reached.
+    """
+    start = time.perf_counter()
+    if period is not None:
+        r = feas(c, period)
+        if r is None:
+            return {'feasible': False, 'time': time.perf_counter() - start}
+        gr = retime(c, r, view=True)
+    else:
+        shared = SharedArrays.attach(descriptor)
+        try:
+            matrices = shared['W'], shared['D'], shared['reach']
+            gr, r = ALGORITHMS[algorithm](c, wd_method=wd_method, return_retiming=True, matrices=matrices, view=True)
+        finally:
+            shared.close()
+    return {
+        'feasible': True,
+        'clock_period': int(cp(gr)),
+        'retiming': {str(v): int(x) for v, x in zip(c.nodes, r)},
+        'time': time.perf_counter() - start,
+    }
+
+
+async def _read_request(reader):
+    """
+    Read the next request of a client, i.e. the next line.
+
+    :param reader: The :class:`asyncio.StreamReader` of the connection.
+    :return: The line, ``b''`` once the client is done, or ``None`` if the line is longer than the limit of the
+        reader, in which case it is skipped.
+    """
+    try:
+        return await reader.readuntil(b'\n')
+    except asyncio.IncompleteReadError as e:
+        return e.partial
+    except asyncio.LimitOverrunError as e:
+        consumed = e.consumed
+    while True:
+        # Drop what has been buffered so far, until the end of the line is found.
+        await reader.readexactly(consumed)
+        try:
+            await reader.readuntil(b'\n')
+            return None
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+
+
+def _parse_request(line, send):
+    """
+    Decode the request of a client, which should be a JSON object.
+
+    :param line: The request.
+    :param send: A function called with the ``error`` event about an invalid request.
+    :return: The ``dict`` of the request, or ``None`` if it is invalid.
+    """
+    try:
+        job = json.loads(line)
+    except ValueError as e:
+        send({'event': 'error', 'error': f'Invalid request: {e}'})
+        return None
+    if not isinstance(job, dict):
+        send({'event': 'error', 'error': 'Invalid request: a JSON object is expected'})
+        return None
+    return job
+
+
+class RetimingService:
+    """
+    Long-lived retiming server, which saves the callers the start-up of the interpreter and the reloading of their
+    circuits, and reuses the matrices :math:`W` and :math:`D` of recently seen circuits.
+
+    Clients send one JSON object per line, each describing a job:
+
+    * ``data``, the content of a DOT file, or of a file of :mod:`storage` encoded in base64 when ``format`` is
+      ``'binary'`` (the server never reads the files of its clients, since anyone able to connect could read any file
+      it has access to);
+    * ``algorithm`` (``'opt1'`` or ``'opt2'``, the default) or ``period`` (a target clock period, checked with
+      *Algorithm FEAS*);
+    * an optional ``id``, echoed in every event about the job.
+
+    Requests longer than ``max_request`` bytes are answered with an ``error`` event and skipped. The jobs are queued,
+    up to ``queue_size`` of them, and run ``processes`` at a time on a pool of worker processes.
+    The server streams back one JSON object per line for each step of a job: ``queued``, ``loaded`` (with the size and
+    clock period of the circuit), ``wd`` (telling whether the matrices were reused), then either ``result`` or
+    ``error``. The matrices live in shared memory (see :mod:`shared`), from which the workers read them without any
+    copy, and the least recently used ones are dropped beyond ``max_bytes``.
+    """
+
+    def __init__(self, processes=None, queue_size=64, max_bytes=256 << 20, wd_method='floyd-warshall',
+                 max_request=64 << 20):
+        """
+        :param processes: The number of worker processes (``None`` for one per core).
+        :param queue_size: The maximum number of jobs waiting to be run, beyond which new jobs are rejected.
+        :param max_bytes: The maximum total size of the matrices kept in memory.
+        :param wd_method: The engine used by *Algorithm WD*.
+        :param max_request: The maximum size of a request, i.e. of a line sent by a client.
+        """
+        self.processes = processes or os.cpu_count()
+        self.queue_size = queue_size
+        self.max_bytes = max_bytes
+        self.max_request = max_request
+        self.wd_method = wd_method
+        self.matrices = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._pins = {}
+        self._computing = {}
+        self._pool = None
+        self._futures = set()
+        self._queue = None
+        self._workers = []
+
+    async def start(self):
+        # Forked workers would inherit the sockets of the clients connected at that time, which would then never be
+        # closed: the workers are forked from a clean server process instead, where available.
+        context = get_context('forkserver') if 'forkserver' in get_all_start_methods() else None
+        self._pool = ProcessPoolExecutor(self.processes, mp_context=context)
+        self._queue = asyncio.Queue(self.queue_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.processes)]
+
+    async def stop(self):
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        # Cancel the calls still waiting for a worker process (shutdown only has cancel_futures since Python 3.9).
+        for future in list(self._futures):
+            future.cancel()
+        self._pool.shutdown()
+        for shared in self.matrices.values():
+            shared.close()
+        self.matrices.clear()
+
+    def submit(self, job, send):
+        """
+        Queue a job.
+
+        :param job: The ``dict`` describing the job.
+        :param send: A function called with every event about the job.
+        :return: Whether the job was accepted.
+        """
+        try:
+            self._queue.put_nowait((job, send))
+        except asyncio.QueueFull:
+            send({'event': 'error', 'error': 'The queue is full'})
+            return False
+        send({'event': 'queued', 'position': self._queue.qsize()})
+        return True
+
+    async def _worker(self):
+        while True:
+            job, send = await self._queue.get()
+            try:
+                await self._run(job, send)
+            except Exception as e:
+                send({'event': 'error', 'error': f'{type(e).__name__}: {e}'})
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, fn, *args):
+        """
+        Run a function on the pool of worker processes.
+
+        :return: An awaitable of its result.
+        """
+        future = self._pool.submit(fn, *args)
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        return asyncio.wrap_future(future)
+
+    async def _run(self, job, send):
+        loop = asyncio.get_running_loop()
+        algorithm = job.get('algorithm', 'opt2')
+        period = job.get('period')
+        if period is None and algorithm not in ALGORITHMS:
+            raise ValueError(f'Unknown algorithm {algorithm!r}')
+        if 'data' not in job:
+            raise ValueError('The job should carry the circuit in its data field')
+        c, key, clock_period = await self._execute(_load, job)
+        send({'event': 'loaded', 'nodes': c.number_of_nodes(), 'edges': c.number_of_edges(),
+              'clock_period': clock_period})
+        if period is not None:
+            result = await self._execute(_retime, c, algorithm, period, None, self.wd_method)
+            send({'event': 'result', **result})
+            return
+        # The matrices must not be evicted while a worker is about to attach to them.
+        self._pins[key] = self._pins.get(key, 0) + 1
+        try:
+            shared = self.matrices.get(key)
+            send({'event': 'wd', 'reused': shared is not None or key in self._computing})
+            if shared is not None:
+                self.hits += 1
+                self.matrices.move_to_end(key)
+            elif key in self._computing:
+                # The same circuit is being processed by another job: wait for its matrices.
+                self.hits += 1
+                shared = await asyncio.shield(self._computing[key])
+            else:
+                self.misses += 1
+                self._computing[key] = loop.create_future()
+                try:
+                    W, D, reach = await self._execute(_wd, c, self.wd_method)
+                    shared = self._remember(key, W, D, reach)
+                    self._computing[key].set_result(shared)
+                except BaseException as e:
+                    self._computing[key].set_exception(e)
+                    raise
+                finally:
+                    del self._computing[key]
+            result = await self._execute(_retime, c, algorithm, None, shared.descriptor, self.wd_method)
+        finally:
+            self._pins[key] -= 1
+            if self._pins[key] == 0:
+                del self._pins[key]
+            self._evict()
+        send({'event': 'result', **result})
+
+    def _remember(self, key, W, D, reach):
+        shared = self.matrices[key] = SharedArrays({'W': W, 'D': D, 'reach': reach})
+        self._evict()
+        return shared
+
+    def _size(self):
+        return sum(a.nbytes for shared in self.matrices.values() for a in shared.arrays.values())
+
+    def _evict(self):
+        size = self._size()
+        for key in list(self.matrices):
+            if size <= self.max_bytes:
+                break
+            if key not in self._pins:
+                shared = self.matrices.pop(key)
+                size -= sum(a.nbytes for a in shared.arrays.values())
+                shared.close()
+
+    def stats(self):
+        """
+        :return: A ``dict`` with the number of queued jobs, the hits and misses of the matrices kept in memory, their
+            number and total size.
+        """
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self.matrices),
+            'bytes': self._size(),
+            'max_bytes': self.max_bytes,
+        }
+
+    def _request(self, line, send):
+        """
+        Answer a request of a client.
+
+        :param line: The request.
+        :param send: A function called with every event about the request.
+        :return: An :class:`asyncio.Event` set once the job is over, or ``None`` if no job was queued.
+        """
+        if line is None:
+            send({'event': 'error', 'error': f'The request exceeds {self.max_request} bytes'})
+            return None
+        job = _parse_request(line, send)
+        if job is None:
+            return None
+
+        def tagged(event):
+            if job.get('id') is not None:
+                event['id'] = job['id']
+            send(event)
+
+        if job.get('format', 'dot') not in _FORMATS:
+            tagged({'event': 'error', 'error': f'Unknown format {job["format"]!r}'})
+            return None
+        if job.get('stats'):
+            tagged({'event': 'stats', **self.stats()})
+            return None
+        done = asyncio.Event()
+
+        def track(event):
+            tagged(event)
+            if event['event'] in _TERMINAL:
+                done.set()
+
+        return done if self.submit(job, track) else None
+
+    async def _handle(self, reader, writer):
+        jobs = []
+
+        def send(event):
+            writer.write(json.dumps(event).encode() + b'\n')
+
+        try:
+            while True:
+                line = await _read_request(reader)
+                if line == b'':
+                    break
+                done = self._request(line, send)
+                if done is not None:
+                    jobs.append(done)
+                await writer.drain()
+            # The client has sent all its jobs: wait for them before closing the connection.
+            for done in jobs:
+                await done.wait()
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, path=None, host='127.0.0.1', port=0, ready=None):
+        """
+        Serve until cancelled (``SIGINT`` and ``SIGTERM`` cancel the server when it runs in the main thread), on a Unix
+        socket if ``path`` is given, on a TCP port otherwise. On the way out, the worker processes are stopped and the
+        shared memory is released.
+
+        :param path: The path of the Unix socket.
+        :param host: The address to listen on.
+        :param port: The TCP port (0 to pick a free one).
+        :param ready: A function called with the address of the server once it is listening.
+        """
+        await self.start()
+        if threading.current_thread() is threading.main_thread():
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, asyncio.current_task().cancel)
+        try:
+            if path is not None:
+                server = await asyncio.start_unix_server(self._handle, path, limit=self.max_request)
+            else:
+                server = await asyncio.start_server(self._handle, host, port, limit=self.max_request)
+            async with server:
+                if ready is not None:
+                    ready(path if path is not None else server.sockets[0].getsockname()[:2])
+                await server.serve_forever()
+        finally:
+            await self.stop()
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+
+def serve(path=None, host='127.0.0.1', port=0, ready=None, **kwargs):
+    """
+    Run a :class:`RetimingService` until interrupted (see :meth:`RetimingService.serve`).
+    """
+    try:
+        asyncio.run(RetimingService(**kwargs).serve(path, host, port, ready))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+def job_from_file(path, **kwargs):
+    """
+    Build a job whose circuit is sent along with it, so that the server does not need to access the file.
+
+    :param path: A DOT file, or a binary file of :mod:`storage`.
+    :param kwargs: The other fields of the job (``algorithm``, ``period``, ``id``).
+    :return: The ``dict`` describing the job.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data.startswith(b'RETIME'):
+        return {'format': 'binary', 'data': base64.b64encode(data).decode(), **kwargs}
+    return {'format': 'dot', 'data': data.decode(), **kwargs}
+
+
+def submit(jobs, path=None, host='127.0.0.1', port=None):
+    """
+    Submit jobs to a running :class:`RetimingService` and stream back the events about them.
+
+    :param jobs: The ``dict`` describing the jobs (those without ``id`` are numbered).
+    :param path: The path of the Unix socket of the server.
+    :param host: The address of the server, if it listens on a TCP port.
+    :param port: The TCP port of the server.
+    :return: A generator of the events, in the order they are sent by the server.
+    """
+    if path is not None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+    else:
+        sock = socket.create_connection((host, port))
+    with sock, sock.makefile('rb') as f:
+        for i, job in enumerate(jobs):
+            sock.sendall(json.dumps({'id': i, **job}).encode() + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+        for line in f:
+            yield json.loads(line)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+import sys
+import weakref
+import numpy as np
+from circuit import Circuit
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+_CIRCUIT_ARRAYS = ('delay', 'src', 'dst', 'weight', 'indptr', 'in_order', 'in_indptr')
+
+
+def _open(name):
+    # Since Python 3.13 the segments attached by a worker can be left out of the resource tracker, which only has to
+    # clean up after the owner.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+# Closing a segment unmaps it under the NumPy views built on it, and SharedMemory closes itself when garbage collected:
+# the segments are therefore kept alive here until they are explicitly closed.
+_alive = set()
+
+
+def _unlink(segments):
+    for shm in segments:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedArrays:
+    """
+    NumPy arrays living in :mod:`multiprocessing.shared_memory` segments, which other processes attach to, by means
+    of the small picklable :attr:`descriptor`, without copying them.
+
+    The process that creates the arrays owns the segments and unlinks them when :meth:`close` is called, when the
+    object is garbage collected, or when the interpreter exits, whichever comes first. If the owner is killed, the
+    resource tracker of :mod:`multiprocessing` unlinks them. Attached processes never unlink anything. The memory is
+    unmapped by :meth:`close` only, after which the arrays must not be used any more.
+
+    Without :mod:`multiprocessing.shared_memory` (before Python 3.8), the descriptor carries copies of the arrays
+    instead, so that attached processes can read them but their writes stay private.
+    """
+
+    def __init__(self, arrays, meta=None):
+        """
+        :param arrays: A ``dict`` of the arrays to be copied into shared memory, keyed by name.
+        :param meta: Optional picklable data shipped together with the descriptor.
+        """
+        self._segments = []
+        self._finalizer = weakref.finalize(self, _unlink, self._segments)
+        self.arrays = {}
+        spec = {}
+        if shared_memory is None:
+            self.arrays = {name: np.array(a) for name, a in arrays.items()}
+            self.descriptor = {'arrays': self.arrays, 'meta': meta}
+            self.meta = meta
+            return
+        try:
+            for name, a in arrays.items():
+                a = np.asarray(a)
+                shm = shared_memory.SharedMemory(create=True, size=max(1, a.nbytes))
+                self._segments.append(shm)
+                _alive.add(shm)
+                view = np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)
+                view[...] = a
+                self.arrays[name] = view
+                spec[name] = (shm.name, a.dtype.str, a.shape)
+        except BaseException:
+            self.close()
+            raise
+        self.descriptor = {'arrays': spec, 'meta': meta}
+        self.meta = meta
+
+    @classmethod
+    def attach(cls, descriptor):
+        """
+        Attach to the arrays shared by another process.
+
+        :param descriptor: The :attr:`descriptor` of the owner.
+        :return: A :class:`SharedArrays` whose arrays are views of the shared segments.
+        """
+        self = cls.__new__(cls)
+        self._segments = []
+        self._finalizer = None
+        self.arrays = {}
+        self.descriptor = descriptor
+        self.meta = descriptor['meta']
+        if shared_memory is None:
+            self.arrays = dict(descriptor['arrays'])
+            return self
+        for name, (segment, dtype, shape) in descriptor['arrays'].items():
+            shm = _open(segment)
+            self._segments.append(shm)
+            _alive.add(shm)
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        return self
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def close(self):
+        """
+        Drop the views and detach from the segments, unlinking them if this process owns them.
+        """
+        self.arrays = {}
+        if self._finalizer is not None:
+            self._finalizer()
+        for shm in self._segments:
+            _alive.discard(shm)
+            shm.close()
+        self._segments.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def share_circuit(g, matrices=None):
+    """
+    Place a circuit, and optionally its matrices :math:`W` and :math:`D`, in shared memory.
+
+    :param g: A :class:`circuit.Circuit`.
+    :param matrices: Optional ``W``, ``D`` and reachability mask.
+    :return: The owning :class:`SharedArrays`, whose :attr:`~SharedArrays.descriptor` is meant for
+        :func:`attach_circuit`. The vertex identifiers and edge keys travel inside the descriptor.
+    """
+    arrays = {name: getattr(g, name) for name in _CIRCUIT_ARRAYS}
+    if matrices is not None:
+        arrays.update(zip(('W', 'D', 'reach'), matrices))
+    return SharedArrays(arrays, {'nodes': g.nodes, 'keys': g.keys, 'multigraph': g.multigraph})
+
+
+def attach_circuit(descriptor):
+    """
+    Attach to a circuit shared by :func:`share_circuit`, without copying its arrays.
+
+    :param descriptor: The descriptor of the shared circuit.
+    :return: The :class:`circuit.Circuit`, either the tuple ``(W, D, reach)`` or ``None``, and the
+        :class:`SharedArrays`, which must be kept alive as long as the circuit and the matrices are used.
+    """
+    shared = SharedArrays.attach(descriptor)
+    c = Circuit.__new__(Circuit)
+    c.nodes = shared.meta['nodes']
+    c.index = {v: i for i, v in enumerate(c.nodes)}
+    c.keys = shared.meta['keys']
+    c.multigraph = shared.meta['multigraph']
+    for name in _CIRCUIT_ARRAYS:
+        setattr(c, name, shared[name])
+    matrices = None
+    if 'W' in shared.arrays:
+        matrices = shared['W'], shared['D'], shared['reach']
+    return c, matrices, shared
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import json
+import numpy as np
+from circuit import Circuit, as_circuit
+
+MAGIC = b'RETIME\x00\x01'
+ALIGNMENT = 64
+_CIRCUIT_ARRAYS = ('delay', 'src', 'dst', 'weight', 'indptr', 'in_order', 'in_indptr')
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _narrow(a):
+    """
+    Cast an integer matrix to the smallest signed integer type holding all of its values.
+    """
+    if a.size == 0:
+        return a
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= a.min() and a.max() <= info.max:
+            return a.astype(dtype)
+    return a
+
+
+def save_binary(path, g, matrices=None):
+    """
+    Save a circuit, and optionally its matrices :math:`W` and :math:`D`, in a binary container that can be loaded back
+    with :func:`load_binary` without any parsing.
+
+    The file starts with the 8-byte magic string, the length of a JSON header (a little-endian ``uint64``) and the
+    header itself, which holds the vertex identifiers, the edge keys and the dtype, shape and offset of every array.
+    The arrays follow as raw C-ordered data, each one aligned to 64 bytes. :math:`W` and :math:`D` are stored with the
+    narrowest integer type holding them.
+
+    +------------------+------------------------+
+    | Time complexity  | :math:`O(V^2 + E)`     |
+    +------------------+------------------------+
+    | Space complexity | :math:`O(V + E)` extra |
+    +------------------+------------------------+
+
+    :param path: The file where to save the circuit.
+    :param g: A NetworkX (Multi)DiGraph or a :class:`circuit.Circuit` representing a synchronous circuit.
+    :param matrices: Optional ``W``, ``D`` and reachability mask, as returned by :func:`paths.all_pairs_wd`.
+    :raise TypeError: If a vertex identifier or an edge key is neither a string nor an integer.
+    """
+    c = as_circuit(g)
+    for x in c.nodes + (c.keys or []):
+        if not isinstance(x, (str, int)):
+            raise TypeError(f'Only strings and integers can be stored as vertex identifiers and edge keys, not {x!r}')
+    arrays = {name: np.ascontiguousarray(getattr(c, name)) for name in _CIRCUIT_ARRAYS}
+    if matrices is not None:
+        W, D, reach = matrices
+        arrays['W'] = np.ascontiguousarray(_narrow(np.asarray(W)))
+        arrays['D'] = np.ascontiguousarray(_narrow(np.asarray(D)))
+        arrays['reach'] = np.ascontiguousarray(reach, dtype=np.bool_)
+
+    header = {
+        'nodes': c.nodes,
+        'keys': c.keys,
+        'multigraph': c.multigraph,
+        'arrays': {},
+    }
+    # The offsets depend on the length of the header, which in turn depends on the offsets: reserve enough room for
+    # the header by computing the offsets relative to its end first.
+    offset = 0
+    for name, a in arrays.items():
+        offset = _align(offset)
+        header['arrays'][name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset}
+        offset += a.nbytes
+    start = _align(len(MAGIC) + 8 + len(json.dumps(header).encode()) + 32 * len(arrays))
+    for name in arrays:
+        header['arrays'][name]['offset'] += start
+    encoded = json.dumps(header).encode()
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array(len(encoded), dtype='<u8').tobytes())
+        f.write(encoded)
+        for name, a in arrays.items():
+            f.write(b'\x00' * (header['arrays'][name]['offset'] - f.tell()))
+            f.write(a.tobytes())
+
+
+def load_binary(path, mmap_mode='r'):
+    """
+    Load a circuit, and its matrices :math:`W` and :math:`D` if present, saved by :func:`save_binary`.
+
+    The arrays are memory-mapped rather than read, so loading takes :math:`O(V)` time (for the vertex identifiers)
+    whatever the size of the matrices, and several processes mapping the same file share a single copy of them in the
+    page cache.
+
+    :param path: The file to be loaded.
+    :param mmap_mode: The mode of :class:`numpy.memmap` (``'r'``, ``'r+'`` or ``'c'``), or ``None`` to read the arrays
+        into memory.
+    :return: The :class:`circuit.Circuit` and either the tuple ``(W, D, reach)`` or ``None``.
+    :raise ValueError: If the file is not a circuit saved by :func:`save_binary`.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a binary circuit file')
+        length = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+        header = json.loads(f.read(length))
+
+    def array(name):
+        spec = header['arrays'][name]
+        shape = tuple(spec['shape'])
+        if mmap_mode is None or 0 in shape:
+            with open(path, 'rb') as f:
+                f.seek(spec['offset'])
+                return np.fromfile(f, dtype=spec['dtype'], count=int(np.prod(shape))).reshape(shape)
+        return np.memmap(path, dtype=spec['dtype'], mode=mmap_mode, offset=spec['offset'], shape=shape)
+
+    c = Circuit.__new__(Circuit)
+    c.nodes = header['nodes']
+    c.index = {v: i for i, v in enumerate(c.nodes)}
+    c.keys = header['keys']
+    c.multigraph = header['multigraph']
+    for name in _CIRCUIT_ARRAYS:
+        setattr(c, name, array(name))
+    matrices = None
+    if 'W' in header['arrays']:
+        matrices = array('W'), array('D'), array('reach')
+    return c, matrices
@@ -1,12 +1,37 @@
 #!/usr/bin/env python3
 
+import contextlib
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
 import networkx as nx
 import numpy as np
-from unittest import TestCase
-from algos import cp, wd, opt1, feas, opt2
-from generators import gen_correlator, gen_random_circuit
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Process
+from unittest import TestCase, mock
+from algos import cp, wd, opt1, feas, feasibility_frontier, opt2, retime, IncrementalCP
+from batch import collect_files, run_batch
+from bench import compare, run_benchmarks
+import bounded
+from bounded import opt_bounded
+from cache import WDCache, canonical_form
+from circuit import Circuit, RetimedView
+from constraints import PeriodSweep, PrunedConstraints, bellman_ford, circuit_constraints, th7_constraints
+from generators import gen_correlator, gen_fir, gen_fsm, gen_iir, gen_pipeline, gen_random_circuit, gen_systolic
+from paths import all_pairs_wd, wd_dense, wd_johnson
+from profiling import profiling
+from scc import opt_scc, strongly_connected_components
+from service import job_from_file, serve, submit
+from shared import attach_circuit, share_circuit
+from storage import load_binary, save_binary
 from structures import MyTuple
-from utils import load_graph, check_if_synchronous_circuit, w_path, d_path, d, add_weighted_node
+from utils import load_graph, load_circuit, save_graph, check_if_synchronous_circuit, w_path, d_path, d, \
+    add_weighted_node, PathIndex
 
 
 def wd2numpy_correlator(m):
@@ -24,6 +49,16 @@ def wd2numpy_correlator(m):
     return np.array(lists)
 
 
+def shared_circuit_summary(descriptor):
+    """
+    Attach to a circuit shared by :func:`shared.share_circuit` and summarize it (run in a worker process).
+    """
+    c, (W, D, reach), shared = attach_circuit(descriptor)
+    summary = cp(c), c.number_of_edges(), int(W[reach].sum()), int(D[reach].sum())
+    shared.close()
+    return summary
+
+
 class Tests(TestCase):
 
     def test_correlator1_cp(self):
@@ -269,3 +304,700 @@ class Tests(TestCase):
         self.assertEqual(cp(gr), cp(g))
         gr = opt2(g)
         self.assertEqual(cp(gr), cp(g))
+
+    def test_circuit_roundtrip(self):
+        """
+        Check that converting a circuit to the compact representation and back preserves vertices, edges and weights.
+        """
+        g = load_graph('../graphs/correlator1.dot')
+        c = Circuit.from_nx(g)
+        self.assertEqual(c.number_of_nodes(), g.number_of_nodes())
+        self.assertEqual(c.number_of_edges(), g.number_of_edges())
+        self.assertTrue((np.diff(c.src) >= 0).all())
+        for v in range(c.number_of_nodes()):
+            self.assertTrue((c.src[c.out_edges(v)] == v).all())
+            self.assertTrue((c.dst[c.in_edges(v)] == v).all())
+        h = c.to_nx()
+        self.assertEqual(dict(h.nodes(data='weight')), dict(g.nodes(data='weight')))
+        self.assertEqual(sorted(h.edges(keys=True, data='weight')), sorted(g.edges(keys=True, data='weight')))
+
+    def test_circuit_algorithms(self):
+        """
+        Check that the algorithms give the same results on the compact representation and on NetworkX graphs.
+        """
+        for _ in range(10):
+            g = gen_random_circuit()
+            c = Circuit.from_nx(g)
+            self.assertEqual(cp(c), cp(g))
+            self.assertEqual(wd(c), wd(g))
+            self.assertEqual(cp(opt1(c)), cp(opt1(g)))
+            self.assertEqual(cp(opt2(c)), cp(opt2(g)))
+            r = feas(c, cp(opt2(g)))
+            self.assertIsNotNone(r)
+            self.assertEqual(feas(g, cp(opt2(g))), c.mapping(r))
+
+    def test_wd_dense_blocks(self):
+        """
+        Check that the blocked Floyd-Warshall engine does not depend on the block size.
+        """
+        for _ in range(10):
+            c = Circuit.from_nx(gen_random_circuit(12, 20))
+            W, D, reach = wd_dense(c, block=c.number_of_nodes())
+            for block in (1, 3, 5):
+                W_b, D_b, reach_b = wd_dense(c, block=block, max_temp=16)
+                self.assertTrue((reach == reach_b).all())
+                self.assertTrue((W == W_b).all())
+                self.assertTrue((D == D_b).all())
+
+    def test_wd_johnson(self):
+        """
+        Check that the Johnson engine, in process and with a pool of workers, with or without shared memory, agrees
+        with Floyd-Warshall.
+        """
+        graphs = [load_graph('../graphs/correlator1.dot'), gen_correlator(5)]
+        graphs += [gen_random_circuit(12, 20) for _ in range(10)]
+        for i, g in enumerate(graphs):
+            c = Circuit.from_nx(g)
+            W, D, reach = wd_dense(c)
+            W_j, D_j, reach_j = wd_johnson(c, processes=1 if i % 2 else 2, chunk=4)
+            self.assertTrue((reach == reach_j).all())
+            self.assertTrue((W == W_j).all())
+            self.assertTrue((D == D_j).all())
+        with mock.patch('paths.shared_memory', None):
+            for a, b in zip(wd_dense(c), wd_johnson(c, processes=2, chunk=4)):
+                self.assertTrue((a == b).all())
+        g = load_graph('../graphs/correlator1.dot')
+        self.assertEqual(cp(opt1(g, wd_method='johnson')), 13)
+
+    def test_opt_bounded(self):
+        """
+        Check that the memory-bounded versions of *Algorithms OPT1* and *OPT2* reach the same clock period as the
+        regular ones, both when the period constraints fit in the memory budget and when they do not.
+        """
+        graphs = [load_graph('../graphs/correlator1.dot'), load_graph('../graphs/correlator2.dot')]
+        graphs += [gen_random_circuit() for _ in range(10)]
+        for g in graphs:
+            clock = cp(opt1(g))
+            for algorithm in ('opt1', 'opt2'):
+                for budget in (0, 1 << 20):
+                    gr, stats = opt_bounded(g, algorithm, budget, return_stats=True)
+                    self.assertEqual(cp(gr), clock)
+                    self.assertTrue(check_if_synchronous_circuit(gr))
+                    self.assertLessEqual(stats['peak_buffered'], budget)
+        # The reweighting used to stream the rows does not depend on the probed period: it is computed once.
+        with mock.patch('bounded._reweight', wraps=bounded._reweight) as reweight:
+            self.assertEqual(cp(opt_bounded(graphs[0], 'opt1', 0)), 13)
+        self.assertEqual(reweight.call_count, 1)
+
+    def test_feas_warm_start(self):
+        """
+        Check that *Algorithm FEAS* warm-started from the retiming found for a larger clock period gives the same
+        answer as the cold start.
+        """
+        for _ in range(10):
+            g = gen_random_circuit()
+            W, D = wd(g)
+            r = None
+            for c in sorted(set(D.values()), reverse=True):
+                cold = feas(g, c)
+                warm = feas(g, c, r)
+                self.assertEqual(cold is None, warm is None)
+                if warm is not None:
+                    self.assertLessEqual(cp(retime(g, warm)), c)
+                    r = cold
+
+    def test_incremental_cp(self):
+        """
+        Check that the incremental *Algorithm CP* computes the same :math:`\Delta` as a full run after each retiming
+        step.
+        """
+        for _ in range(10):
+            g = gen_random_circuit(12, 20)
+            c = Circuit.from_nx(g)
+            timing = IncrementalCP(c)
+            r = np.zeros(c.number_of_nodes(), dtype=np.int64)
+            for v in np.random.permutation(c.number_of_nodes())[:6]:
+                r[v] += 1
+                gr = retime(c, r)
+                if (gr.weight < 0).any():
+                    break
+                timing.increment([v])
+                _, delta = cp(gr, return_delta=True)
+                self.assertTrue((timing.delta == delta).all())
+                self.assertEqual(timing.clock(), cp(gr))
+
+    def test_bellman_ford(self):
+        """
+        Check the array-based Bellman-Ford algorithm against the one of NetworkX, with and without negative cycles.
+        """
+        rng = np.random.default_rng(0)
+        for _ in range(200):
+            n = int(rng.integers(2, 15))
+            m = int(rng.integers(1, 40))
+            tails, heads, weights = rng.integers(0, n, m), rng.integers(0, n, m), rng.integers(-3, 6, m)
+            g = nx.MultiDiGraph()
+            g.add_nodes_from(range(n))
+            g.add_weighted_edges_from(zip(tails.tolist(), heads.tolist(), weights.tolist()))
+            g.add_weighted_edges_from([('root', v, 0) for v in range(n)])
+            x = bellman_ford(n, tails, heads, weights)
+            try:
+                expected = nx.single_source_bellman_ford_path_length(g, 'root')
+            except nx.exception.NetworkXUnbounded:
+                self.assertIsNone(x)
+                continue
+            self.assertEqual(x.tolist(), [expected[v] for v in range(n)])
+
+    def test_batch(self):
+        """
+        Check that the batch mode writes one JSON Lines record per circuit, reporting missing files as errors.
+        """
+        files = collect_files(['../graphs', 'missing.dot'])
+        self.assertEqual(files, ['../graphs/correlator1.dot', '../graphs/correlator2.dot', 'missing.dot'])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'results.jsonl')
+            errors = run_batch(files, output=path, processes=2)
+            with open(path) as f:
+                records = {r['file']: r for r in map(json.loads, f)}
+        self.assertEqual(errors, 1)
+        self.assertIn('error', records['missing.dot'])
+        for file, clock in (('../graphs/correlator1.dot', 24), ('../graphs/correlator2.dot', 17)):
+            record = records[file]
+            self.assertEqual(record['clock_period'], clock)
+            for algorithm in ('opt1', 'opt2'):
+                self.assertEqual(record[algorithm]['clock_period'], 13)
+                self.assertEqual(set(record[algorithm]['retiming']), set(load_graph(file).nodes))
+
+    def test_benchmarks(self):
+        """
+        Check that the benchmark suite produces one result per case and flags the regressions against a baseline.
+        """
+        report = run_benchmarks(['cp', 'opt2'], families=['random', 'correlator'], sizes=[20, 40], repeat=1)
+        self.assertEqual(len(report['results']), 8)
+        for r in report['results']:
+            self.assertGreater(r['time'], 0)
+            self.assertGreater(r['peak_rss'], 0)
+            self.assertIn('setup', r['phases'])
+            if r['benchmark'] == 'cp':
+                self.assertIn('cp', r['phases'])
+            else:
+                self.assertIn('feas', r['phases'])
+                self.assertGreater(r['counters']['probes'], 0)
+        startup = run_benchmarks(['cp'], sizes=[20], repeat=1, startup=True)['results'][1:]
+        self.assertEqual([r['family'] for r in startup], ['core', 'cli'])
+        for r in startup:
+            self.assertGreater(r['peak_rss'], 0)
+        self.assertEqual(compare(report, report), [])
+        slower = {'results': [dict(r, time=r['time'] * 2) for r in report['results']]}
+        self.assertEqual(len(compare(slower, report, threshold=0.5)), 8)
+        self.assertEqual(compare(slower, report, threshold=1.5), [])
+
+    def test_load_graph(self):
+        """
+        Check that the DOT parser agrees with pydot, both on the files written by save_graph and on the ones it
+        hands over to pydot.
+        """
+        from networkx.drawing.nx_pydot import read_dot
+
+        def weighted(attributes):
+            return dict(attributes, weight=int(attributes['weight']))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            files = ['../graphs/correlator1.dot', '../graphs/correlator2.dot']
+            for i, g in enumerate([gen_correlator(3), nx.MultiDiGraph(gen_correlator(4)), gen_random_circuit(20, 30)]):
+                files.append(os.path.join(tmp, f'{i}.dot'))
+                save_graph(g, files[-1])
+            files.append(os.path.join(tmp, 'attributes.dot'))
+            with open(files[-1], 'w') as f:
+                f.write('digraph {\nnode [shape=box];\na [weight=1];\nb [weight=2, label="b"];\n'
+                        'a -> b [weight=3];\n}\n')
+            for file in files:
+                g = load_graph(file)
+                h = read_dot(file)
+                self.assertEqual(type(g), type(h))
+                self.assertEqual(list(g.nodes), list(h.nodes))
+                self.assertEqual(list(g.nodes(data=True)), [(v, weighted(a)) for v, a in h.nodes(data=True)])
+                if g.is_multigraph():
+                    self.assertEqual(list(g.edges(keys=True, data=True)),
+                                     [(u, v, k, weighted(a)) for u, v, k, a in h.edges(keys=True, data=True)])
+                else:
+                    self.assertEqual(list(g.edges(data=True)), [(u, v, weighted(a)) for u, v, a in h.edges(data=True)])
+                c = load_circuit(file)
+                self.assertEqual(cp(c), cp(g))
+                self.assertEqual(sorted(c.to_nx().edges(data='weight')), sorted(g.edges(data='weight')))
+
+    def test_binary_storage(self):
+        """
+        Check that circuits and their matrices W and D survive a round trip through the binary format, both
+        memory-mapped and read into memory, and that OPT1 and OPT2 accept the stored matrices.
+        """
+        graphs = [load_graph('../graphs/correlator1.dot'), nx.DiGraph(gen_correlator(4)), gen_random_circuit(12, 20)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'circuit.bin')
+            for g in graphs:
+                c = Circuit.from_nx(g)
+                matrices = all_pairs_wd(c)
+                save_binary(path, g, matrices)
+                for mmap_mode in ['r', None]:
+                    h, stored = load_binary(path, mmap_mode)
+                    self.assertEqual(h.nodes, c.nodes)
+                    self.assertEqual(h.keys, c.keys)
+                    for name in ['delay', 'src', 'dst', 'weight', 'indptr', 'in_order', 'in_indptr']:
+                        self.assertTrue((getattr(h, name) == getattr(c, name)).all())
+                    for a, b in zip(stored, matrices):
+                        self.assertTrue((a == b).all())
+                    self.assertEqual(cp(opt1(h, matrices=stored)), cp(opt1(g)))
+                    self.assertEqual(cp(opt2(h, matrices=stored)), cp(opt2(g)))
+                save_binary(path, c)
+                self.assertIsNone(load_binary(path)[1])
+                self.assertEqual(sorted(load_binary(path)[0].to_nx().edges(data='weight')),
+                                 sorted(g.edges(data='weight')))
+
+    def test_wd_cache(self):
+        """
+        Check that the W/D cache is shared by relabeled and reordered copies of a circuit, returns the same matrices
+        as Algorithm WD and evicts the least recently used entries.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = WDCache(tmp)
+            for g in [load_graph('../graphs/correlator2.dot'), gen_random_circuit(20, 30)]:
+                c = Circuit.from_nx(g)
+                order = np.random.permutation(c.number_of_nodes())
+                position = np.argsort(order)
+                h = Circuit([f'v{v}' for v in order], c.delay[order], position[c.src], position[c.dst], c.weight)
+                self.assertEqual(canonical_form(c)[0], canonical_form(h)[0])
+                self.assertEqual(wd(g, cache=cache), wd(g))
+                hits = cache.hits
+                for a, b in zip(cache.all_pairs_wd(h), all_pairs_wd(h)):
+                    self.assertTrue((a == b).all())
+                self.assertEqual(cache.hits, hits + 1)
+                self.assertEqual(cp(opt1(g, cache=cache)), cp(opt1(g)))
+                self.assertEqual(cp(opt2(g, cache=cache)), cp(opt2(g)))
+            self.assertEqual(cache.stats()['entries'], 2)
+            self.assertNotEqual(canonical_form(Circuit.from_nx(gen_correlator(3)))[0],
+                                canonical_form(Circuit.from_nx(gen_correlator(4)))[0])
+            cache = WDCache(tmp, max_bytes=cache.stats()['bytes'])
+            cache.all_pairs_wd(Circuit.from_nx(gen_correlator(3)))
+            self.assertGreater(cache.evictions, 0)
+            self.assertLessEqual(cache.stats()['bytes'], cache.max_bytes)
+            self.assertIsNotNone(cache.get(Circuit.from_nx(gen_correlator(3))))
+
+    def test_synchronous_circuit_cycle(self):
+        """
+        Check that the validation reports a zero-weight cycle when condition W2 is violated, and that it scales to
+        circuits with a dense feedback structure.
+        """
+        g = load_graph('../graphs/correlator1.dot')
+        self.assertEqual(check_if_synchronous_circuit(g, return_cycle=True), (True, None))
+        g.add_edge('p2', 'd3', weight=0)
+        g.add_edge('d3', 'p2', weight=0)
+        self.assertFalse(check_if_synchronous_circuit(g))
+        valid, cycle = check_if_synchronous_circuit(g, return_cycle=True)
+        self.assertFalse(valid)
+        self.assertEqual(sorted(cycle), ['d3', 'p2'])
+        g.nodes['h']['weight'] = -1
+        self.assertEqual(check_if_synchronous_circuit(g, return_cycle=True), (False, None))
+        g = nx.complete_graph(300, create_using=nx.DiGraph)
+        nx.set_node_attributes(g, 1, 'weight')
+        nx.set_edge_attributes(g, {(u, v): int(u > v) for u, v in g.edges}, 'weight')
+        self.assertTrue(check_if_synchronous_circuit(g))
+        g.edges[0, 299]['weight'] = 0
+        g.edges[299, 0]['weight'] = 0
+        valid, cycle = check_if_synchronous_circuit(g, return_cycle=True)
+        self.assertFalse(valid)
+        for u, v in zip(cycle, cycle[1:] + cycle[:1]):
+            self.assertEqual(g.edges[u, v]['weight'], 0)
+
+    def test_gen_random_circuit(self):
+        """
+        Check that the random circuits are synchronous by construction, have the requested size (up to :math:`V(V-1)`
+        edges) and are reproducible.
+        """
+        for V, E in [(1, 0), (2, 2), (6, 30), (50, 70), (1000, 5000)]:
+            g = gen_random_circuit(V, E, seed=V)
+            self.assertEqual(g.number_of_nodes(), V)
+            self.assertEqual(g.number_of_edges(), E)
+            self.assertTrue(all(u != v for u, v in g.edges))
+            self.assertTrue(check_if_synchronous_circuit(g))
+            self.assertEqual(d(g, 0), 0)
+            c = gen_random_circuit(V, E, seed=V, output='circuit')
+            self.assertEqual(sorted(c.to_nx().edges(data='weight')), sorted(g.edges(data='weight')))
+        self.assertEqual(gen_random_circuit(3, 11).number_of_edges(), 6)
+        self.assertNotEqual(list(gen_random_circuit(50, 70, seed=1).edges),
+                            list(gen_random_circuit(50, 70, seed=2).edges))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'random.bin')
+            c = gen_random_circuit(100, 140, save=path, seed=0, binary=True, output='circuit')
+            self.assertTrue((load_binary(path)[0].weight == c.weight).all())
+
+    def test_path_index(self):
+        """
+        Check the path-weight queries of PathIndex, one path and many paths at a time, and the ones on circuits and
+        retimed views, against a direct computation.
+        """
+        g = load_graph('../graphs/correlator1.dot')
+        g.add_edge('d0', 'd1', weight=0)
+        graphs = [g, gen_random_circuit(10, 25, seed=0)]
+        for g in graphs:
+            index = PathIndex(g)
+            paths = [p for u in g for v in g for p in nx.all_simple_paths(g, u, v, cutoff=5)] + [[next(iter(g))], []]
+            expected_w = [sum(min(x['weight'] for x in nx.MultiDiGraph(g)[u][v].values()) for u, v in zip(p, p[1:]))
+                          for p in paths]
+            expected_d = [sum(d(g, v) for v in p) for p in paths]
+            self.assertEqual(list(index.w_paths(paths)), expected_w)
+            self.assertEqual(list(index.d_paths(paths)), expected_d)
+            self.assertEqual([w_path(g, p) for p in paths], expected_w)
+            self.assertEqual([w_path(index, p) for p in paths], expected_w)
+            self.assertEqual([d_path(index, p) for p in paths], expected_d)
+            self.assertEqual([d_path(Circuit.from_nx(g), p) for p in paths], expected_d)
+            c = Circuit.from_nx(g)
+            self.assertEqual([w_path(c, p) for p in paths], expected_w)
+            self.assertIs(c.lightest_edges(), c.lightest_edges())
+            view = RetimedView(c, np.random.default_rng(0).integers(-3, 4, c.number_of_nodes()))
+            self.assertEqual([w_path(view, p) for p in paths], [w_path(view.to_nx(), p) for p in paths])
+            self.assertEqual([w_path(view.circuit(), p) for p in paths], [w_path(view.to_nx(), p) for p in paths])
+        self.assertRaises(ValueError, PathIndex(graphs[0]).w_path, ['h', 'p0'])
+        self.assertRaises(ValueError, w_path, Circuit.from_nx(graphs[0]), ['h', 'p0'])
+
+    def test_profiling(self):
+        """
+        Check that the instrumented algorithms report their phases and counters inside a profiling block only.
+        """
+        g = load_graph('../graphs/correlator1.dot')
+        with profiling() as p1:
+            opt1(g)
+        with profiling() as p2:
+            opt2(g)
+            with profiling() as inner:
+                cp(g)
+        opt1(g)
+        for p, phases, counters in [(p1, ['wd', 'constraints', 'bellman_ford', 'retime', 'from_nx'],
+                                     ['probes', 'relaxations', 'bellman_ford_rounds', 'graph_copies']),
+                                    (p2, ['wd', 'feas', 'retime'], ['probes', 'feas_iterations', 'graph_copies'])]:
+            stats = json.loads(json.dumps(p.as_dict()))
+            for name in phases:
+                self.assertGreater(stats['phases'][name]['calls'], 0)
+                self.assertLessEqual(stats['phases'][name]['time'], stats['total'])
+            for name in counters:
+                self.assertGreater(stats['counters'][name], 0)
+            check = 'bellman_ford' if p is p1 else 'feas'
+            self.assertEqual(stats['counters']['probes'], stats['phases'][check]['calls'])
+            self.assertGreater(stats['peak_rss'], 0)
+        self.assertEqual(p1.counters['graph_copies'], 1)
+        self.assertEqual(list(inner.phases), ['from_nx', 'cp'])
+
+    def test_kary_search(self):
+        """
+        Check that the parallel k-ary search over the clock periods finds the same optimum as the binary search, and
+        that the profile counts the work of its probes.
+        """
+        graphs = [load_graph('../graphs/correlator1.dot'), load_graph('../graphs/correlator2.dot')]
+        graphs += [gen_random_circuit(15, 30, seed=i) for i in range(10)]
+        for g in graphs:
+            expected = cp(opt1(g))
+            for k in [2, 3, 5]:
+                gr, r = opt1(g, search_processes=k, return_retiming=True)
+                self.assertEqual(cp(gr), expected)
+                self.assertTrue(check_if_synchronous_circuit(gr))
+                gr, r = opt2(g, search_processes=k, return_retiming=True)
+                self.assertEqual(cp(gr), expected)
+                self.assertEqual(list(retime(g, r).edges(data='weight')), list(gr.edges(data='weight')))
+        # The counters of the probes run by the worker processes are added to the profile of the search.
+        with profiling() as p1:
+            opt1(graphs[0], search_processes=3)
+        with profiling() as p2:
+            opt2(graphs[0], search_processes=3)
+        self.assertGreater(p1.counters['relaxations'], 0)
+        self.assertGreater(p2.counters['feas_iterations'], 0)
+
+    def test_shared_circuit(self):
+        """
+        Check that worker processes attached to a circuit in shared memory see the same circuit and matrices, and that
+        no segment outlives its owner.
+        """
+        before = set(os.listdir('/dev/shm'))
+        for i in range(3):
+            c = gen_random_circuit(40, 80, seed=i, output='circuit')
+            W, D, reach = all_pairs_wd(c)
+            expected = cp(c), c.number_of_edges(), int(W[reach].sum()), int(D[reach].sum())
+            with share_circuit(c, (W, D, reach)) as shared:
+                with ProcessPoolExecutor(2) as pool:
+                    self.assertEqual(list(pool.map(shared_circuit_summary, [shared.descriptor] * 2)), [expected] * 2)
+        with mock.patch('shared.shared_memory', None), share_circuit(c, (W, D, reach)) as shared:
+            with ProcessPoolExecutor(2) as pool:
+                self.assertEqual(list(pool.map(shared_circuit_summary, [shared.descriptor] * 2)), [expected] * 2)
+        c = gen_random_circuit(300, 600, seed=0, output='circuit')
+        for a, b in zip(wd_dense(c), wd_johnson(c, processes=3, chunk=16)):
+            self.assertTrue((a == b).all())
+        self.assertEqual(set(os.listdir('/dev/shm')) - before, set())
+
+    def test_workload_generators(self):
+        """
+        Check that the generated pipelines, filters, systolic arrays and state machines are synchronous circuits of the
+        requested size, reproducible from their seed, and that they can be written straight to disk.
+        """
+        families = [
+            (lambda seed, **kw: gen_pipeline(6, 4, seed=seed, **kw), 1 + 6 * 4),
+            (lambda seed, **kw: gen_fir(5, seed=seed, **kw), 1 + 2 * 5),
+            (lambda seed, **kw: gen_iir(3, seed=seed, **kw), 1 + 2 * 4 + 2 * 3),
+            (lambda seed, **kw: gen_systolic(3, 5, seed=seed, **kw), 1 + 3 * 5),
+            (lambda seed, **kw: gen_fsm(30, seed=seed, **kw), 1 + 30),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            for i, (gen, n) in enumerate(families):
+                for seed in range(5):
+                    g = gen(seed)
+                    self.assertEqual(g.number_of_nodes(), n)
+                    self.assertEqual(g.nodes['h']['weight'], 0)
+                    self.assertTrue(check_if_synchronous_circuit(g))
+                    self.assertEqual(list(g.edges(data='weight')), list(gen(seed).edges(data='weight')))
+                    self.assertEqual(cp(opt1(g)), cp(opt2(g)))
+                path = os.path.join(directory, f'{i}.bin')
+                c = gen(0, save=path, binary=True, output='circuit')
+                stored, _ = load_binary(path)
+                self.assertEqual(stored.nodes, c.nodes)
+                self.assertTrue((stored.weight == c.weight).all())
+                path = os.path.join(directory, f'{i}.dot')
+                g = gen(0, save=path)
+                self.assertEqual(sorted(load_graph(path).edges(data='weight')), sorted(g.edges(data='weight')))
+        # Retiming brings the clock period of an FIR filter down to the delay of a multiplier plus an adder.
+        g = gen_fir(8, seed=0)
+        delays = [g.nodes[f'm{i}']['weight'] + g.nodes[f'a{i}']['weight'] for i in range(8)]
+        self.assertLessEqual(cp(opt2(g)), max(delays))
+
+    def test_service(self):
+        """
+        Check that the retiming server streams the progress and the results of the submitted circuits, that it reuses
+        the matrices W and D of the circuits it has already seen, that it rejects the requests beyond its size limit
+        only, and that it cleans up when terminated.
+        """
+        before = set(os.listdir('/dev/shm'))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'retiming.sock')
+            binary = os.path.join(directory, 'fir.bin')
+            fir = gen_fir(6, seed=0, save=binary, binary=True)
+            server = Process(target=serve, kwargs={'path': path, 'processes': 2})
+            server.start()
+            try:
+                while not os.path.exists(path):
+                    time.sleep(0.05)
+                jobs = [job_from_file('../graphs/correlator1.dot', algorithm='opt1'), job_from_file(binary),
+                        job_from_file('../graphs/correlator1.dot', period=13),
+                        job_from_file('../graphs/correlator1.dot', period=12), {'data': 'digraph {'},
+                        {'path': os.path.abspath('../graphs/correlator1.dot')},
+                        job_from_file('../graphs/correlator1.dot', format='x/y')]
+                events = list(submit(jobs, path))
+                results = {e['id']: e for e in events if e['event'] in ('result', 'error')}
+                self.assertEqual(results[0]['clock_period'], 13)
+                self.assertEqual(results[1]['clock_period'], cp(opt2(fir)))
+                self.assertTrue(results[2]['feasible'])
+                self.assertFalse(results[3]['feasible'])
+                self.assertEqual(results[4]['event'], 'error')
+                self.assertEqual(results[5]['event'], 'error')
+                self.assertNotIn('loaded', [e['event'] for e in events if e['id'] == 5])
+                self.assertEqual([e['event'] for e in events if e['id'] == 6], ['error'])
+                g = load_graph('../graphs/correlator1.dot')
+                self.assertEqual(cp(retime(g, results[0]['retiming'])), 13)
+                for i in range(6):
+                    self.assertEqual([e['event'] for e in events if e['id'] == i][0], 'queued')
+                # A request that is valid JSON but not an object is rejected, without losing the other jobs.
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock, sock.makefile('rb') as f:
+                    sock.connect(path)
+                    job = job_from_file('../graphs/correlator1.dot', algorithm='opt1', id=0)
+                    sock.sendall(json.dumps(job).encode() + b'\n[1, 2]\n')
+                    sock.shutdown(socket.SHUT_WR)
+                    events = [json.loads(line) for line in f]
+                self.assertEqual([e['event'] for e in events if 'id' not in e], ['error'])
+                self.assertEqual(events[-1]['event'], 'result')
+                self.assertEqual(events[-1]['clock_period'], 13)
+                events = list(submit([job_from_file('../graphs/correlator1.dot'), {'stats': True}], path))
+                self.assertIn({'event': 'wd', 'reused': True, 'id': 0}, events)
+                self.assertEqual(events[-1]['event'], 'result')
+                self.assertEqual(events[-1]['clock_period'], 13)
+            finally:
+                server.terminate()
+                server.join()
+            self.assertEqual(server.exitcode, 0)
+            self.assertFalse(os.path.exists(path))
+            # Jobs beyond the default limit of 64 KiB of asyncio streams, and beyond the limit of the server.
+            large = os.path.join(directory, 'large.dot')
+            g = gen_random_circuit(2000, 3000, seed=0, save=large)
+            self.assertGreater(os.path.getsize(large), 64 << 10)
+            server = Process(target=serve, kwargs={'path': path, 'processes': 2, 'max_request': 1 << 20})
+            server.start()
+            try:
+                while not os.path.exists(path):
+                    time.sleep(0.05)
+                jobs = [job_from_file(large, period=cp(g)), {'data': 'x' * (2 << 20)}, job_from_file(large, period=1)]
+                events = list(submit(jobs, path))
+                self.assertEqual([e['event'] for e in events if 'id' not in e], ['error'])
+                results = {e['id']: e for e in events if e['event'] == 'result'}
+                self.assertTrue(results[0]['feasible'])
+                self.assertFalse(results[2]['feasible'])
+            finally:
+                server.terminate()
+                server.join()
+        self.assertEqual({x for x in set(os.listdir('/dev/shm')) - before if x.startswith('psm')}, set())
+
+    def test_command_line_options(self):
+        """
+        Check that the options ignored by the memory-bounded and the per-component versions of OPT1 and OPT2 are
+        rejected rather than silently dropped.
+        """
+        import main
+        parser = main.build_parser()
+        for argv in (['--scc', 'random'], ['--memory-budget', '1', '--wd-method', 'johnson', 'random'],
+                     ['--cache', 'cache', '--sweep', 'random'], ['--scc', 'bench']):
+            main.check_options(parser, parser.parse_args(argv))
+        for argv in (['--scc', '--cache', 'cache', 'random'], ['--scc', '--search-jobs', '2', 'file', 'x.dot'],
+                     ['--memory-budget', '1', '--sweep', 'random'], ['--memory-budget', '1', '--show-wd', 'batch', 'x'],
+                     ['--memory-budget', '1', '--scc', 'random']):
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                main.check_options(parser, parser.parse_args(argv))
+
+    def test_lightweight_core(self):
+        """
+        Check that neither the retiming core nor the command-line interface load the optional heavy dependencies at
+        startup, and that NetworkX is only loaded when a graph is asked for.
+        """
+        heavy = ['asyncio', 'big_o', 'matplotlib', 'networkx', 'pydot', 'tqdm']
+        code = ('import sys, algos, batch, bench, bounded, cache, circuit, generators, storage, utils; '
+                'sys.argv = ["main.py"]; import main; '
+                'print(" ".join(m for m in %r if m in sys.modules)); '
+                'utils.load_circuit("../graphs/correlator1.dot"); '
+                'print(" ".join(m for m in %r if m in sys.modules)); '
+                'utils.load_graph("../graphs/correlator1.dot"); '
+                'print(" ".join(m for m in %r if m in sys.modules))') % (heavy, heavy, heavy)
+        output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+        self.assertEqual(output.split('\n')[:3], ['', '', 'networkx'])
+
+    def test_scc(self):
+        """
+        Check the strongly connected components against NetworkX, and that retiming them one by one gives a legal
+        circuit with the same clock period as OPT1 and OPT2 on the whole circuit.
+        """
+        for seed in range(10):
+            # Random blocks joined by feed-forward edges.
+            rng = np.random.default_rng(seed)
+            blocks = [gen_random_circuit(10, 20, seed=rng, output='circuit') for _ in range(4)]
+            nodes = [f'b{i}_{v}' for i, b in enumerate(blocks) for v in b.nodes]
+            src = [b.src + 10 * i for i, b in enumerate(blocks)]
+            dst = [b.dst + 10 * i for i, b in enumerate(blocks)]
+            weight = [b.weight for b in blocks]
+            u, v = np.sort(rng.choice(4, (12, 2)), axis=1).T
+            forward = u < v
+            src.append(u[forward] * 10 + rng.integers(0, 10, forward.sum()))
+            dst.append(v[forward] * 10 + rng.integers(0, 10, forward.sum()))
+            weight.append(rng.integers(0, 2, forward.sum()))
+            c = Circuit(nodes, np.concatenate([b.delay for b in blocks]), np.concatenate(src), np.concatenate(dst),
+                        np.concatenate(weight), multigraph=False)
+            g = c.to_nx()
+            labels, count = strongly_connected_components(c)
+            components = list(nx.strongly_connected_components(g))
+            self.assertEqual(count, len(components))
+            for component in components:
+                self.assertEqual(len({labels[c.index[x]] for x in component}), 1)
+            self.assertTrue((labels[c.src] <= labels[c.dst]).all())
+            expected = cp(opt2(g))
+            self.assertEqual(cp(opt1(g)), expected)
+            for algorithm in ['opt1', 'opt2']:
+                for processes in [1, 2]:
+                    gr, r, stats = opt_scc(g, algorithm, processes=processes, return_retiming=True,
+                                           return_stats=True)
+                    self.assertTrue(check_if_synchronous_circuit(gr))
+                    self.assertEqual(cp(gr), expected)
+                    self.assertEqual(list(retime(g, r).edges(data='weight')), list(gr.edges(data='weight')))
+                    self.assertEqual(stats['components'], count)
+        for g in [load_graph('../graphs/correlator1.dot'), load_graph('../graphs/correlator2.dot')]:
+            self.assertEqual(cp(opt_scc(g)), cp(opt2(g)))
+
+    def test_period_sweep(self):
+        """
+        Check that the incremental sweep of the clock periods finds the same minimum as the binary search of OPT1, and
+        that the feasibility frontier contains every achievable period down to it, each with a legal retiming.
+        """
+        graphs = [load_graph('../graphs/correlator1.dot'), load_graph('../graphs/correlator2.dot')]
+        graphs += [gen_random_circuit(30, 60, seed=seed) for seed in range(10)]
+        graphs += [gen_fsm(20, seed=0), gen_iir(4, seed=0), gen_systolic(3, 3, seed=0)]
+        for g in graphs:
+            expected = cp(opt1(g))
+            gr, r = opt1(g, sweep=True, return_retiming=True)
+            self.assertTrue(check_if_synchronous_circuit(gr))
+            self.assertEqual(cp(gr), expected)
+            W, D, reach = all_pairs_wd(Circuit.from_nx(g))
+            D_range = np.unique(D[reach])
+            frontier = feasibility_frontier(g)
+            periods = list(frontier)
+            self.assertEqual(periods, sorted(periods, reverse=True))
+            self.assertEqual(periods[0], cp(g))
+            self.assertEqual(periods[-1], expected)
+            self.assertEqual(periods, [p for p in D_range[::-1].tolist() if expected <= p <= cp(g)])
+            for period, r in frontier.items():
+                gr = retime(g, r)
+                self.assertTrue(check_if_synchronous_circuit(gr))
+                self.assertLessEqual(cp(gr), period)
+        c = Circuit.from_nx(graphs[0])
+        W, D, reach = all_pairs_wd(c)
+        sweep = PeriodSweep(PrunedConstraints(W, D, reach, c.delay), *circuit_constraints(c))
+        self.assertIsNotNone(sweep.advance(13))
+        self.assertIsNone(sweep.advance(12))
+        self.assertEqual(sweep.period, 13)
+        with self.assertRaises(ValueError):
+            sweep.advance(13)
+
+    def test_pruned_constraints(self):
+        """
+        Check that the constraints of Theorem 7 pruned once for all the periods are feasible for the same periods as
+        the ones built for every period.
+        """
+        graphs = [load_graph('../graphs/correlator1.dot'), load_graph('../graphs/correlator2.dot')]
+        graphs += [gen_random_circuit(20, 40, seed=seed) for seed in range(10)]
+        for g in graphs:
+            c = Circuit.from_nx(g)
+            W, D, reach = all_pairs_wd(c)
+            tails, heads, weights = circuit_constraints(c)
+            constraints = PrunedConstraints(W, D, reach, c.delay, high=cp(g))
+            self.assertEqual(constraints.removed + len(constraints), constraints.total)
+            for period in np.unique(D[reach]).tolist():
+                if not constraints.low <= period <= cp(g):
+                    continue
+                expected = th7_constraints(W, D, reach, c.delay, period)
+                pruned = constraints.at(period)
+                self.assertLessEqual(pruned[0].size, expected[0].size)
+                x = bellman_ford(c.number_of_nodes(), *(np.concatenate(a) for a in zip((tails, heads, weights),
+                                                                                       pruned)))
+                y = bellman_ford(c.number_of_nodes(), *(np.concatenate(a) for a in zip((tails, heads, weights),
+                                                                                       expected)))
+                self.assertEqual(x is None, y is None)
+        # The host of the correlators has no delay, so none of its pairs is ever needed.
+        c = Circuit.from_nx(graphs[0])
+        constraints = PrunedConstraints(*all_pairs_wd(c), c.delay)
+        host = c.index['h']
+        self.assertGreater(constraints.removed, 0)
+        self.assertFalse(((constraints.heads == host) | (constraints.tails == host)).any())
+
+    def test_retimed_view(self):
+        """
+        Check that a retimed view has the same register counts, clock period and validity as the retimed copy of the
+        graph, without copying it.
+        """
+        for g in [load_graph('../graphs/correlator1.dot'), load_graph('../graphs/correlator2.dot')] + \
+                [gen_random_circuit(30, 60, seed=seed) for seed in range(5)]:
+            c = Circuit.from_nx(g)
+            with profiling() as p:
+                gr, r = opt2(g, return_retiming=True, view=True)
+            self.assertIsInstance(gr, RetimedView)
+            self.assertNotIn('graph_copies', p.counters)
+            expected = retime(g, r)
+            self.assertEqual(list(gr.to_nx().edges(data='weight')), list(expected.edges(data='weight')))
+            self.assertEqual([gr.weight_of(e) for e in range(c.number_of_edges())], gr.weight.tolist())
+            self.assertEqual(cp(gr), cp(expected))
+            self.assertEqual(check_if_synchronous_circuit(gr), check_if_synchronous_circuit(expected))
+            self.assertEqual(cp(opt1(c, view=True)), cp(gr))
+            # Retiming a view composes the retimings.
+            undo = {v: -x for v, x in r.items()}
+            self.assertEqual(retime(gr, undo).weight.tolist(), c.weight.tolist())
+            self.assertEqual(retime(c, r, view=True).weight.tolist(), gr.weight.tolist())
+            path = list(nx.shortest_path(g, *list(g.nodes)[:2])) if nx.has_path(g, *list(g.nodes)[:2]) else []
+            if len(path) > 1:
+                self.assertEqual(w_path(gr, path), w_path(expected, path))
+                self.assertEqual(d_path(gr, path), d_path(expected, path))
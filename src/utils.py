@@ -1,13 +1,21 @@
 #!/usr/bin/env python3
 
-from pprint import pprint
-import networkx as nx
-from networkx.drawing.nx_pydot import read_dot, write_dot
-import matplotlib.pyplot as plt
+import re
 import numpy as np
+from circuit import Circuit, RetimedView, as_circuit, zero_weight_cycle
+
+_DOT_ID = r'"(?:[^"\\]|\\.)*"|-?[\w.]+'
+_DOT_HEADER = re.compile(r'\s*(strict\s+)?digraph\b[^{]*\{\s*$')
+_DOT_STATEMENT = re.compile(rf'\s*({_DOT_ID})\s*(?:->\s*({_DOT_ID})\s*)?(?:\[([^\]]*)\])?\s*;?\s*$')
+_DOT_ATTRIBUTE = re.compile(rf'(\w+)\s*=\s*({_DOT_ID})')
+# The statements exactly as written by save_graph, which are matched first.
+_DOT_NODE = re.compile(rf'({_DOT_ID}) \[weight=(-?\d+)(?:, ([^\]]*))?\]')
+_DOT_EDGE = re.compile(rf'({_DOT_ID}) -> ({_DOT_ID}) \[(?:key=({_DOT_ID}), )?weight=(-?\d+)(?:, ([^\]]*))?\]')
 
 
 def draw_graph(g, weights=False):
+    import matplotlib.pyplot as plt
+    import networkx as nx
     g = nx.DiGraph(g)
     pos = nx.circular_layout(g)
     edge_weights = nx.get_edge_attributes(g, 'weight')
@@ -21,7 +29,139 @@ def add_weighted_node(g, n, weight):
     g.add_node(n, weight=weight)
 
 
-def load_graph(path):
+def _dot_id(s):
+    if s[0] == '"':
+        return re.sub(r'\\(.)', r'\1', s[1:-1])
+    return s
+
+
+def _dot_attributes(s):
+    if not s:
+        return {}
+    attributes = _DOT_ATTRIBUTE.findall(s)
+    if len(attributes) != s.count('=') and '"' not in s:
+        raise ValueError(f'Unsupported DOT attributes {s!r}')
+    return dict(attributes)
+
+
+class _DotGraph:
+    """
+    The vertices and edges of a DOT file, gathered statement by statement into the arguments of
+    :class:`circuit.Circuit`. The attributes other than ``weight`` and ``key`` are kept as written in the file, quotes
+    included, like pydot does.
+    """
+
+    def __init__(self, multigraph):
+        self.multigraph = multigraph
+        self.index = {}
+        self.delay = []
+        self.node_attributes = []
+        self.src, self.dst, self.weight, self.keys = [], [], [], []
+        self.edge_attributes = []
+        self.edges = {}
+
+    def add_node(self, u, attributes):
+        if u in ('graph', 'node', 'edge'):
+            raise ValueError(f'Unsupported DOT statement for {u!r}')
+        if 'weight' not in attributes:
+            raise ValueError(f'Vertex {u!r} has no weight')
+        delay = int(_dot_id(attributes.pop('weight')))
+        if u in self.index:
+            self.delay[self.index[u]] = delay
+            self.node_attributes[self.index[u]].update(attributes)
+        else:
+            self.index[u] = len(self.delay)
+            self.delay.append(delay)
+            self.node_attributes.append(attributes)
+
+    def add_edge(self, u, v, attributes):
+        if u not in self.index or v not in self.index or 'weight' not in attributes:
+            raise ValueError(f'Edge {u!r} -> {v!r} has no weight or joins undeclared vertices')
+        weight = int(_dot_id(attributes.pop('weight')))
+        key = attributes.pop('key', None)
+        if not self.multigraph:
+            # Strict graphs keep the last of the repeated edges, as NetworkX does.
+            if (u, v) in self.edges:
+                self.weight[self.edges[u, v]] = weight
+                self.edge_attributes[self.edges[u, v]].update(attributes)
+                return
+            self.edges[u, v] = len(self.weight)
+        self.src.append(self.index[u])
+        self.dst.append(self.index[v])
+        self.weight.append(weight)
+        self.keys.append(_dot_id(key) if key is not None else None)
+        self.edge_attributes.append(attributes)
+
+    def circuit_arguments(self):
+        keys = self.keys
+        if not self.multigraph or all(k is None for k in keys):
+            keys = None
+        elif any(k is None for k in keys):
+            raise ValueError('Either all the edges or none of them should have a key')
+        return list(self.index), self.delay, self.src, self.dst, self.weight, keys, self.multigraph
+
+
+def _dot_statement(line):
+    """
+    :param line: A node or edge statement.
+    :return: The tail vertex, the head vertex (``None`` for a node statement) and the attributes, as written.
+    """
+    m = _DOT_EDGE.match(line)
+    if m is not None:
+        u, v, key, x, rest = m.groups()
+        attributes = {'weight': x} if key is None else {'key': key, 'weight': x}
+        attributes.update(_dot_attributes(rest))
+        return u, v, attributes
+    m = _DOT_NODE.match(line)
+    if m is not None:
+        u, x, rest = m.groups()
+        return u, None, dict({'weight': x}, **_dot_attributes(rest))
+    m = _DOT_STATEMENT.match(line)
+    if m is None:
+        raise ValueError(f'Unsupported DOT statement {line!r}')
+    u, v, attributes = m.groups()
+    return u, v, _dot_attributes(attributes)
+
+
+def _parse_dot(path):
+    """
+    Parse, one line at a time, the subset of DOT written by :func:`save_graph`: a single (strict) digraph with one
+    node or edge statement per line, whose ``weight`` attributes are converted to integers while parsing.
+
+    +------------------+------------------+
+    | Time complexity  | :math:`O(V + E)` |
+    +------------------+------------------+
+    | Space complexity | :math:`O(V + E)` |
+    +------------------+------------------+
+
+    :param path: The DOT file.
+    :return: A :class:`_DotGraph` with the vertices and edges of the file, and their other attributes (e.g. the
+        ``label`` ones).
+    :raise ValueError: If the file is not in the supported subset of DOT.
+    """
+    graph = None
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if graph is None:
+                m = _DOT_HEADER.match(line)
+                if m is None:
+                    raise ValueError(f'Unsupported DOT header {line!r}')
+                graph = _DotGraph(m.group(1) is None)
+                continue
+            if line.strip() == '}':
+                return graph
+            u, v, attributes = _dot_statement(line)
+            if v is None:
+                graph.add_node(_dot_id(u), attributes)
+            else:
+                graph.add_edge(_dot_id(u), _dot_id(v), attributes)
+    raise ValueError('Truncated DOT file')
+
+
+def _read_dot(path):
+    from networkx.drawing.nx_pydot import read_dot
     g = read_dot(path)
     for v in g.nodes:
         g.nodes[v]['weight'] = int(g.nodes[v]['weight'])
@@ -30,8 +170,50 @@ def load_graph(path):
     return g
 
 
+def load_circuit(path):
+    """
+    Load a synchronous circuit straight into its compact representation, without building a NetworkX graph. Files
+    outside the subset of DOT written by :func:`save_graph` are parsed with pydot.
+
+    :param path: The DOT file.
+    :return: The :class:`circuit.Circuit`.
+    """
+    try:
+        nodes, delay, src, dst, weight, keys, multigraph = _parse_dot(path).circuit_arguments()
+    except ValueError:
+        return Circuit.from_nx(_read_dot(path))
+    return Circuit(nodes, delay, src, dst, weight, keys=keys, multigraph=multigraph)
+
+
+def load_graph(path):
+    """
+    Load a synchronous circuit as a NetworkX graph. Files outside the subset of DOT written by :func:`save_graph` are
+    parsed with pydot.
+
+    :param path: The DOT file.
+    :return: A NetworkX (Multi)DiGraph, whose vertices are identified by strings, with integer ``weight`` attributes.
+    """
+    import networkx as nx
+    try:
+        graph = _parse_dot(path)
+        nodes, delay, src, dst, weight, keys, multigraph = graph.circuit_arguments()
+    except ValueError:
+        return _read_dot(path)
+    g = nx.MultiDiGraph() if multigraph else nx.DiGraph()
+    g.add_nodes_from((v, dict(a, weight=x)) for v, x, a in zip(nodes, delay, graph.node_attributes))
+    src = [nodes[i] for i in src]
+    dst = [nodes[i] for i in dst]
+    attributes = (dict(a, weight=x) for a, x in zip(graph.edge_attributes, weight))
+    if keys is not None:
+        g.add_edges_from(zip(src, dst, keys, attributes))
+    else:
+        g.add_edges_from(zip(src, dst, attributes))
+    return g
+
+
 def save_graph(g, path):
-    g = g.copy()
+    from networkx.drawing.nx_pydot import write_dot
+    g = g.to_nx() if isinstance(g, (Circuit, RetimedView)) else g.copy()
     for v in g.nodes:
         g.nodes[v]['label'] = f'{v};{g.nodes[v]["weight"]}'
     for e in g.edges:
@@ -39,29 +221,89 @@ def save_graph(g, path):
     write_dot(g, path)
 
 
-def __reconstruct_edges(g, u, v):
+class PathIndex:
     """
-    Compute all paths between two nodes and fix the labelling for MultiDiGraphs.
-
-    :param g: A NetworkX (Multi)DiGraph representing a synchronous circuit.
-    :param u: The first of the two nodes.
-    :param v: The second of the two nodes.
-    :return: The list of paths with the labels fixed.
+    Index of a synchronous circuit answering path-weight queries without searching the graph: :math:`w(p)` and
+    :math:`d(p)` cost :math:`O(|p|)` with the lightest edges indexed by :meth:`circuit.Circuit.lightest_edges`, while
+    many paths are scored at once with vectorized operations, the minimum register count over the parallel edges of
+    each ordered pair of vertices being kept in a sorted array of pair codes for that purpose (:math:`O(|p| \log E)`
+    per path).
     """
-    edges = list(filter(lambda p: len(p) == 2, nx.all_simple_paths(g, u, v)))
-    if isinstance(g, nx.MultiDiGraph):
-        key = list(map(lambda e: e[2], g.edges))[0]
-        if isinstance(key, str):
-            edges = [edges[i] + [f'{i}'] for i in range(len(edges))]
-        elif isinstance(key, int):
-            edges = [edges[i] + [i] for i in range(len(edges))]
-        else:
-            raise NotImplementedError('Keys should be either strings or integers')
-    elif isinstance(g, nx.DiGraph):
-        pass
-    else:
-        raise NotImplementedError('This function only works on (Multi)DiGraph')
-    return edges
+
+    def __init__(self, g):
+        """
+        :param g: A NetworkX (Multi)DiGraph, a :class:`circuit.Circuit` or a :class:`circuit.RetimedView`.
+        """
+        c = as_circuit(g)
+        self.circuit = c
+        n = c.number_of_nodes()
+        code = c.src.astype(np.int64) * n + c.dst
+        order = np.argsort(code, kind='stable')
+        code = code[order]
+        starts = np.flatnonzero(np.concatenate(([True], code[1:] != code[:-1])))[:code.size]
+        self.pairs = code[starts]
+        self.weight = np.minimum.reduceat(c.weight[order].astype(np.int64), starts) if code.size else code
+        self.delay = c.delay.astype(np.int64)
+
+    def _vertices(self, path):
+        index = self.circuit.index
+        return np.fromiter((index[v] for v in path), dtype=np.int64, count=len(path))
+
+    def _hop_weights(self, u, v):
+        code = u * self.circuit.number_of_nodes() + v
+        i = np.searchsorted(self.pairs, code)
+        found = i < self.pairs.size
+        found[found] = self.pairs[i[found]] == code[found]
+        if not found.all():
+            raise ValueError('The path uses a pair of vertices not joined by any edge')
+        return self.weight[i]
+
+    def w_path(self, path):
+        """
+        :param path: A path as the list of its vertices.
+        :return: :math:`w(p)`, the number of registers along the path (taking the lightest of the parallel edges).
+        """
+        return _lightest_path_weight(self.circuit, path)
+
+    def d_path(self, path):
+        """
+        :param path: A path as the list of its vertices.
+        :return: :math:`d(p)`, the total delay of the vertices of the path.
+        """
+        return int(self.delay[self._vertices(path)].sum())
+
+    def _flatten(self, paths):
+        lengths = np.fromiter((len(p) for p in paths), dtype=np.int64, count=len(paths))
+        x = self._vertices([v for p in paths for v in p])
+        ends = np.cumsum(lengths)
+        return x, lengths, ends
+
+    def w_paths(self, paths):
+        """
+        Compute :math:`w(p)` for many paths at once.
+
+        :param paths: A sequence of paths, each one as the list of its vertices.
+        :return: The ``int64`` array of the register counts of the paths.
+        """
+        x, lengths, ends = self._flatten(paths)
+        hop = np.ones(x.size, dtype=bool)
+        hop[ends[lengths > 0] - 1] = False
+        hop = np.flatnonzero(hop)
+        weights = np.zeros(x.size, dtype=np.int64)
+        weights[hop] = self._hop_weights(x[hop], x[hop + 1])
+        prefix = np.concatenate(([0], np.cumsum(weights)))
+        return np.diff(prefix[np.concatenate(([0], ends))])
+
+    def d_paths(self, paths):
+        """
+        Compute :math:`d(p)` for many paths at once, with a prefix sum of the delays along the concatenated paths.
+
+        :param paths: A sequence of paths, each one as the list of its vertices.
+        :return: The ``int64`` array of the total delays of the paths.
+        """
+        x, _, ends = self._flatten(paths)
+        prefix = np.concatenate(([0], np.cumsum(self.delay[x])))
+        return np.diff(prefix[np.concatenate(([0], ends))])
 
 
 def w(g, e):
@@ -72,43 +314,78 @@ def d(g, v):
     return g.nodes[v]['weight']
 
 
+def _lightest_path_weight(c, p):
+    """
+    :param c: A :class:`circuit.Circuit`.
+    :param p: A path as the list of its vertices.
+    :return: :math:`w(p)`, in :math:`O(|p|)` time once the lightest edges of the circuit are indexed.
+    """
+    lightest = c.lightest_edges()
+    x = [c.index[v] for v in p]
+    try:
+        return sum(lightest[u, v] for u, v in zip(x, x[1:]))
+    except KeyError:
+        raise ValueError('The path uses a pair of vertices not joined by any edge') from None
+
+
 def w_path(g, p):
+    """
+    :param g: A NetworkX (Multi)DiGraph, a :class:`circuit.Circuit`, a :class:`circuit.RetimedView` or a
+        :class:`PathIndex`.
+    :param p: A path as the list of its vertices.
+    :return: :math:`w(p)`, taking the lightest of the parallel edges between consecutive vertices.
+    """
+    if isinstance(g, PathIndex):
+        return g.w_path(p)
+    if isinstance(g, Circuit):
+        return _lightest_path_weight(g, p)
+    if isinstance(g, RetimedView):
+        # w_r(p) = w(p) + r(v_k) - r(v_0): the retiming shifts all the parallel edges alike, so the lightest edges of
+        # the base circuit are still the lightest ones.
+        return _lightest_path_weight(g.base, p) + (int(g.r[g.index[p[-1]]] - g.r[g.index[p[0]]]) if p else 0)
     wp = 0
-    for i in range(len(p) - 1):
-        u = p[i]
-        v = p[i+1]
-        edges = __reconstruct_edges(g, u, v)
-        wp += min(map(lambda e: g.edges[e]['weight'], edges))
+    for u, v in zip(p, p[1:]):
+        if g.is_multigraph():
+            wp += min(x['weight'] for x in g[u][v].values())
+        else:
+            wp += g[u][v]['weight']
     return wp
 
 
 def d_path(g, path):
+    if isinstance(g, PathIndex):
+        return g.d_path(path)
+    if isinstance(g, (Circuit, RetimedView)):
+        return int(g.delay[[g.index[v] for v in path]].astype(np.int64).sum())
     return sum(map(lambda v: g.nodes[v]['weight'], path))
 
 
-def check_if_synchronous_circuit(g):
+def check_if_synchronous_circuit(g, return_cycle=False):
+    """
+    Check whether a graph is a synchronous circuit.
+
+    +------------------+------------------+
+    | Time complexity  | :math:`O(V + E)` |
+    +------------------+------------------+
+    | Space complexity | :math:`O(V + E)` |
+    +------------------+------------------+
+
+    :param g: A NetworkX (Multi)DiGraph, a :class:`circuit.Circuit` or a :class:`circuit.RetimedView`.
+    :param return_cycle: Whether to return, when condition W2 is violated, a cycle with no registers as well.
+    :return: Whether the graph is a synchronous circuit, followed, if requested, by the list of the vertices of a
+        zero-weight cycle in the order of its edges (``None`` if there is none).
+    """
+    c = as_circuit(g)
     # D1: the propagation delay d(v) is non-negative for each vertex v
-    for v in g.nodes:
-        if g.nodes[v]['weight'] < 0:
-            return False
     # W1: the register count w(e) is a non-negative integer for each edge e
-    for e in g.edges:
-        if g.edges[e]['weight'] < 0:
-            return False
-    # W2: in any directed cycle of G, there is some edge with strictly positive register count
-    for nodes in nx.simple_cycles(g):
-        cost = 0
-        for i in range(len(nodes)):
-            u = nodes[i]
-            v = nodes[(i + 1) % len(nodes)]
-            edges = __reconstruct_edges(g, u, v)
-            min_cost = min(map(lambda e: g.edges[e]['weight'], edges))
-            cost += min_cost
-            if min_cost > 0:
-                break
-        if cost == 0:
-            return False
-    return True
+    if (c.delay < 0).any() or (c.weight < 0).any():
+        return (False, None) if return_cycle else False
+    # W2: in any directed cycle of G, there is some edge with strictly positive register count, i.e. the sub-graph of
+    # the edges with no registers is acyclic
+    cycle = zero_weight_cycle(c)
+    if return_cycle:
+        return cycle is None, [c.nodes[v] for v in cycle] if cycle is not None else None
+    return cycle is None
 
 
 def print_wd(m):